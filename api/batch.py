@@ -0,0 +1,56 @@
+# api/batch.py
+# Work shared between the items of a /plan/batch request.
+# A partner plans for hundreds of guests at once, mostly in the same few cities
+# and with overlapping sight lists. The endpoint geocodes every city and fetches
+# every forecast once, solves identical items once, and for the OSRM costs
+# fetches one /table matrix per city, cost and mode that the items cut their
+# sub-matrices from - when that takes fewer /table requests than fetching each
+# item's matrix on its own.
+import json
+import math
+from typing import Any, Dict, List, Optional, Sequence
+
+from planner.matrix_provider import MAX_TABLE_COORDS
+from api.plan_cache import COORD_PRECISION
+
+MAX_BATCH_ITEMS = 500
+BUSY_RETRIES = 3          # An item waits for the solver queue this often before it is answered with 429
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def ndjson(record: Dict[str, Any]) -> bytes:
+    """One NDJSON line."""
+    return (json.dumps(record, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+
+
+def table_requests(n: int, max_coords: int = MAX_TABLE_COORDS) -> int:
+    """/table requests OSRMTableProvider sends for n sights (square blocks above max_coords)."""
+    if n == 0:
+        return 0
+    if n <= max_coords:
+        return 1
+    return math.ceil(n / (max_coords // 2)) ** 2
+
+
+def sight_union(sight_lists: Sequence[Sequence]) -> Optional[List]:
+    """
+    All sights of the lists in first-seen order, or None if one name stands for
+    different places: matrices are indexed by Sight, and Sight hashes by name.
+    """
+    union: Dict[str, Any] = {}
+    places: Dict[str, tuple] = {}
+    for sights in sight_lists:
+        for sight in sights:
+            place = (round(sight.location.y, COORD_PRECISION), round(sight.location.x, COORD_PRECISION))
+            if sight.name not in union:
+                union[sight.name] = sight
+                places[sight.name] = place
+            elif places[sight.name] != place:
+                return None
+    return list(union.values())
+
+
+def worth_sharing(sight_lists: Sequence[Sequence], union: Sequence, max_coords: int = MAX_TABLE_COORDS) -> bool:
+    """True if one matrix of the union takes fewer /table requests than one matrix per list."""
+    return (len(sight_lists) > 1
+            and table_requests(len(union), max_coords) < sum(table_requests(len(s), max_coords) for s in sight_lists))
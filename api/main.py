@@ -1,20 +1,73 @@
 # main.py
+import asyncio
 import re
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from typing import List, Optional, Dict, Any # Import Dict, Any for forecast_data
 
-from meteostat import Point
 from pydantic import BaseModel, Field
-import osmnx as ox
 from planner.base_planner import DayPlanner
 from planner.genai import narrate
-from planner.data_loader import load_sights_from_csv
 from planner.sights import Sight
-from planner.weather import get_weather_forecast
+from planner.weather import get_weather_forecast, prefetch_forecasts
+from planner.matrix_provider import OSRMTableProvider, PrecomputedMatrixProvider, get_matrix_provider
+from planner.city_bundle import CityBundle, city_slug, load_bundles
+from planner.geocoding import GeocodingError, get_geocoder
+from planner.incremental import haversine_path_length, replan_with_delta
+from planner.tracing import REGISTRY, inc, span
+from planner.route_cache import get_leg_cache
+from planner.forecast_cache import get_forecast_cache
+from planner.net import get_osrm_client
+from planner.profiling import RequestProfile, profiling_requested, request_hash
 from shapely.geometry import Point
-
-app = FastAPI(title="CityTour-Planning API")
+from api.solver_service import SolverBusyError, SolverUnavailableError, solver_service_from_env
+from api.plan_store import PlanStore
+from api.plan_cache import plan_cache_from_env, plan_cache_key
+from api.batch import BUSY_RETRIES, MAX_BATCH_ITEMS, NDJSON_MEDIA_TYPE, ndjson, sight_union, worth_sharing
+
+solver_service = solver_service_from_env()
+# Precomputed planning data (build-city-bundle) by city slug, loaded at start-up
+city_bundles: Dict[str, CityBundle] = {}
+# Recent plans by plan_id, the base of /plan/incremental
+plan_store = PlanStore()
+# Finished /plan responses by canonical request hash; None if PLAN_CACHE=off
+plan_cache = plan_cache_from_env()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    city_bundles.update(load_bundles())
+    if city_bundles:
+        print(f"Loaded city bundles: {sorted(city_bundles)}")
+    get_geocoder().warm({b.city: b.center for b in city_bundles.values()})
+    if city_bundles:
+        # Warm the forecast cache with this week for every served city, without delaying start-up
+        asyncio.get_running_loop().run_in_executor(
+            None, prefetch_forecasts, {b.city: b.center_point for b in city_bundles.values()})
+    yield
+    solver_service.shutdown()
+
+
+app = FastAPI(title="CityTour-Planning API", lifespan=lifespan)
+REGISTRY.describe("http_request_seconds", "Wall time of the API requests by route and status.")
+REGISTRY.describe("osrm_requests_total", "OSRM HTTP requests by response status.")
+REGISTRY.describe("planner_solver_results_total", "Solved weather groups by TSP engine and status.")
+REGISTRY.describe("plan_cache_requests_total", "/plan lookups in the plan cache by result.")
+REGISTRY.describe("plan_batch_items_total", "/plan/batch items by response status.")
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # Root span of the request: the phases of /plan below become its children in the trace
+    with span("http", method=request.method, path=request.url.path) as record:
+        response = await call_next(request)
+        record["attrs"]["status"] = response.status_code
+    route = request.scope.get("route")  # The route template keeps the label set small
+    REGISTRY.observe("http_request_seconds", record["duration_s"],
+                     route=getattr(route, "path", "unmatched"), status=response.status_code)
+    return response
 
 class NarrateRequest(BaseModel):
     slot: str
@@ -45,6 +98,8 @@ class PlanRequest(BaseModel):
     mode: str = "walking"
     sights: List[SightIn] # New: list of sights chosen by the UI
     forecast_data: Optional[Dict[str, Any]] = None # New: to pass forecast data if already generated
+    time_budget_ms: Optional[float] = Field(default=None, gt=0) # Solver budget per weather group (anytime mode)
+    cost: str = "haversine" # What the solver minimises: 'haversine', 'distance' or 'duration' (OSRM /table)
 
 # New Pydantic Model for the comprehensive plan response
 class PlanComparisonResponse(BaseModel):
@@ -55,6 +110,23 @@ class PlanComparisonResponse(BaseModel):
     iterative_time_seconds: float
     iterative_length_meters: float
     selected_plan_type: str # 'aware' or 'iterative'
+    iterative_optimality_gap: Optional[float] = None # Relative gap of the iterative tours (0.0 = optimal)
+    iterative_solver_stats: Optional[Dict[str, Any]] = None # Per-group engine, status and gap
+    timings: Optional[Dict[str, Any]] = None # Planning/routing seconds per strategy and overall wall time
+    plan_id: Optional[str] = None # Pass to /plan/incremental to change this plan without re-solving it
+    profile: Optional[Dict[str, Any]] = None # Set for profiled requests (X-Profile: 1 or ?profile=1)
+
+class IncrementalPlanRequest(BaseModel):
+    plan_id: str # plan_id of an earlier /plan or /plan/incremental response
+    add: List[SightIn] = Field(default_factory=list)
+    remove: List[str] = Field(default_factory=list) # Sight names
+
+class IncrementalPlanResponse(PlanComparisonResponse):
+    previous_plan_id: str
+    methods: Dict[str, Any] # Per strategy: "unchanged", "incremental" or "full", with the reason and touched slots
+
+class PlanBatchRequest(BaseModel):
+    items: List[PlanRequest] = Field(min_length=1, max_length=MAX_BATCH_ITEMS)
 
 # Helper function to convert SightIn to Sight object
 def convert_sight_in_to_sight(sight_in: SightIn) -> Sight:
@@ -92,6 +164,10 @@ def get_city_center(city: str) -> Point:
     lat, lon = CITY_CENTER_LOOKUP.get(slug, (48.8566, 2.3522)) # Default: Paris
     return Point(lon, lat)# Default: Paris
 
+def _tour_plan_from_out(plan_out: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[Sight]]:
+    """Slot -> Sight lists back from a serialized aware_plan/iterative_plan."""
+    return {slot: [convert_sight_in_to_sight(SightIn(**s)) for s in sights] for slot, sights in plan_out.items()}
+
 def point_to_dict(point):
     return {"lat": point.y, "lon": point.x}
 
@@ -161,16 +237,47 @@ def plan(req: PlanRequest):
     return result_out
 
 @app.post("/plan", response_model=PlanComparisonResponse)
-async def plan(req: PlanRequest):
+async def plan(req: PlanRequest, request: Request, response: Response):
+    if not profiling_requested(request.headers, request.query_params):
+        return await _plan(req, request, response)
+    profile = RequestProfile("plan", request_hash(req.model_dump()))
+    with profile.running():
+        result = await _plan(req, request, response, profile)
+    if profile.save() is not None:
+        response.headers["X-Profile-Path"] = str(profile.path)
+    result.profile = profile.summary()
+    return result
+
+
+async def _plan(req: PlanRequest, request: Request, response: Response,
+                profile: Optional[RequestProfile] = None) -> PlanComparisonResponse:
+    city_center_point = await _city_center(req.city)
+    sights_for_planner = [convert_sight_in_to_sight(s_in) for s_in in req.sights]
+    forecast = await _forecast(req, city_center_point)
+
+    cache_key = plan_cache_key(req.city, req.mode, req.cost, req.sights, forecast, req.time_budget_ms)
+    cached = _cached_plan(req, city_center_point, forecast, cache_key) if profile is None else None
+    response.headers["X-Plan-Cache"] = ("off" if plan_cache is None else "bypass" if profile is not None
+                                        else "hit" if cached else "miss")
+    inc("plan_cache_requests_total", result=response.headers["X-Plan-Cache"])
+    if cached is not None:
+        return cached
+
+    matrix_provider = _matrix_provider(req.city, req.cost, req.mode, sights_for_planner)
+    return await _solve_plan(req, city_center_point, forecast, sights_for_planner, matrix_provider, cache_key,
+                             is_disconnected=request.is_disconnected, profile=profile)
 
+
+async def _city_center(city: str) -> Point:
+    """Center of the plan: "Coords(lat, lon)", a bundled city or a geocoded name."""
     # Determine city_center_point
     city_center_point = None
 
     # Check if the city field is a coordinate string
-    if req.city.startswith("Coords("):
+    if city.startswith("Coords("):
         # Option 1: Extract coordinates directly from the "Coords(...)" string
         # This is good if the 'city' field is *always* exact
-        match = re.match(r"Coords\(([^,]+),\s*([^)]+)\)", req.city)
+        match = re.match(r"Coords\(([^,]+),\s*([^)]+)\)", city)
         if match:
             lat = float(match.group(1))
             lon = float(match.group(2))
@@ -178,7 +285,7 @@ async def plan(req: PlanRequest):
         else:
             # Fallback if the regex doesn't match, though it should if frontend sends it correctly
             # Or raise an error if the format is strictly expected
-            raise HTTPException(status_code=400, detail=f"Invalid 'Coords(...)' format in city field: {req.city}")
+            raise HTTPException(status_code=400, detail=f"Invalid 'Coords(...)' format in city field: {city}")
 
         # Option 2 (Alternative/Fallback): Calculate centroid from provided sights
         # This is more robust if you might have many sights or want a true center of the selected area
@@ -189,36 +296,100 @@ async def plan(req: PlanRequest):
         # else:
         #     raise HTTPException(status_code=400, detail="Cannot plan for coordinates without sights data.")
 
+    elif (bundle := city_bundles.get(city_slug(city))) is not None:
+        city_center_point = bundle.center_point  # Geocoded when the bundle was built
     else:
-        # It's a city name, so geocode it using OSMnx
+        # It's a city name, so geocode it (cached and shared with the CLI and frontend)
         try:
-            # osmnx.geocode returns (latitude, longitude)
+            # geocode returns (latitude, longitude)
             # Point expects (longitude, latitude)
-            lat, lon = ox.geocode(req.city)
+            with span("geocode"):
+                lat, lon = await get_geocoder().geocode_async(city)
             city_center_point = Point(lon, lat)
-        except ox._errors.InsufficientResponseError:
-            raise HTTPException(status_code=404,
-                                detail=f"Could not geocode city '{req.city}'. Please check spelling or try another city.")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error geocoding city '{req.city}': {e}")
+        except GeocodingError as e:
+            if e.not_found:
+                raise HTTPException(status_code=404,
+                                    detail=f"Could not geocode city '{city}'. Please check spelling or try another city.")
+            raise HTTPException(status_code=500, detail=f"Error geocoding city '{city}': {e}")
 
     # --- Ensure city_center_point was successfully determined ---
     if city_center_point is None:
         raise HTTPException(status_code=500, detail="Failed to determine a valid city center point for planning.")
+    return city_center_point
 
-    sights_for_planner = [convert_sight_in_to_sight(s_in) for s_in in req.sights]
 
+async def _forecast(req: PlanRequest, city_center_point: Point) -> Dict[str, Any]:
+    """The request's forecast_data, else the forecast for the center (cached per place and day)."""
     forecast = req.forecast_data
     if forecast is None:
         try:
-            from planner.weather_utils import get_weather_forecast # Ensure this import is here
-            forecast = get_weather_forecast(city_center_point)
+            with span("weather"):
+                # A cache miss fetches from Meteostat; keep that off the event loop
+                forecast = await asyncio.to_thread(get_weather_forecast, city_center_point)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Could not fetch weather forecast: {e}")
-
-    planner = DayPlanner()
-
-    plan_results = await planner.plan(sights_for_planner, city_center_point, req.mode, forecast)
+    return forecast
+
+
+def _cached_plan(req: PlanRequest, city_center_point: Point, forecast: Dict[str, Any],
+                 cache_key: str) -> Optional[Dict[str, Any]]:
+    """The cached response for cache_key with a fresh plan_id, or None."""
+    cached = plan_cache.get(cache_key) if plan_cache is not None else None
+    if cached is not None:
+        # Register the cached plan again so /plan/incremental works on it as well
+        cached["plan_id"] = plan_store.put({
+            "city": req.city, "city_center": city_center_point, "mode": req.mode, "cost": req.cost,
+            "forecast": forecast, "time_budget_ms": req.time_budget_ms,
+            "aware": _tour_plan_from_out(cached["aware_plan"]),
+            "iterative": _tour_plan_from_out(cached["iterative_plan"]),
+        })
+    return cached
+
+
+def _matrix_provider(city: str, cost: str, mode: str, sights: List[Sight]):
+    """Bundled sub-matrix over sights if the city has one, else the provider for cost (None: haversine)."""
+    try:
+        matrix_provider = None if cost == "haversine" else get_matrix_provider(cost, mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    bundle = city_bundles.get(city_slug(city))
+    if bundle is not None:
+        # Sub-matrix of the bundled one; None (keep computing) if it lacks a sight or this cost/mode
+        matrix_provider = bundle.matrix_provider(sights, cost, mode) or matrix_provider
+    return matrix_provider
+
+
+async def _run_solver(job, is_disconnected=None, busy_retries: int = 0):
+    """solver_service.run(job); a full queue or a stuck pool is answered with Retry-After."""
+    for attempt in range(busy_retries + 1):
+        try:
+            return await solver_service.run(job, is_disconnected=is_disconnected)
+        except SolverBusyError as e:
+            if attempt < busy_retries:
+                await asyncio.sleep(e.retry_after)
+                continue
+            raise HTTPException(status_code=429, detail=str(e),
+                                headers={"Retry-After": f"{e.retry_after:.0f}"})
+        except SolverUnavailableError as e:
+            raise HTTPException(status_code=503, detail=str(e),
+                                headers={"Retry-After": f"{e.retry_after:.0f}"})
+
+
+async def _solve_plan(req: PlanRequest, city_center_point: Point, forecast: Dict[str, Any],
+                      sights_for_planner: List[Sight], matrix_provider, cache_key: str,
+                      is_disconnected=None, profile: Optional[RequestProfile] = None,
+                      busy_retries: int = 0) -> PlanComparisonResponse:
+    """Solves both strategies in the solver pool, stores the plan for /plan/incremental and caches the response."""
+    worker_profiles = [] if profile is not None and profile.recorded else None
+
+    async def run_plan(executor):
+        planner = DayPlanner(executor=executor, worker_profiles=worker_profiles)
+        return await planner.plan(sights_for_planner, city_center_point, req.mode, forecast,
+                                  time_budget_ms=req.time_budget_ms, matrix_provider=matrix_provider)
+
+    plan_results = await _run_solver(run_plan, is_disconnected, busy_retries)
+    for raw_stats in worker_profiles or ():
+        profile.add_worker_stats(raw_stats)
 
     # --- CRITICAL CHANGES HERE ---
     # Access the "tour_plan" key within "aware_plan" and "iterative_plan"
@@ -234,7 +405,13 @@ async def plan(req: PlanRequest):
         for slot, sights_list in iterative_tour_plan_data.items() # Use the specific tour_plan data
     }
 
-    return PlanComparisonResponse(
+    plan_id = plan_store.put({
+        "city": req.city, "city_center": city_center_point, "mode": req.mode, "cost": req.cost,
+        "forecast": forecast, "time_budget_ms": req.time_budget_ms,
+        "aware": aware_tour_plan_data, "iterative": iterative_tour_plan_data,
+    })
+
+    result = PlanComparisonResponse(
         aware_plan=aware_plan_out,
         # Access times/lengths directly from the 'aware_plan' dictionary
         aware_time_seconds=plan_results["aware_plan"]["planning_time_seconds"],
@@ -242,10 +419,260 @@ async def plan(req: PlanRequest):
         iterative_plan=iterative_plan_out,
         iterative_time_seconds=plan_results["iterative_plan"]["planning_time_seconds"], # Note: using planning_time_seconds for iterative as well based on your structure
         iterative_length_meters=plan_results["iterative_plan"]["haversine_total_subtour_length_meters"],#["total_length_meters"],
-        selected_plan_type=plan_results["selected_plan_type"]
+        selected_plan_type=plan_results["selected_plan_type"],
+        iterative_optimality_gap=plan_results["iterative_plan"].get("optimality_gap"),
+        iterative_solver_stats=plan_results["iterative_plan"].get("solver_stats"),
+        timings=plan_results.get("timings"),
+        plan_id=plan_id
+    )
+    if plan_cache is not None:
+        plan_cache.put(cache_key, result.model_dump(exclude={"plan_id"}))
+    return result
+
+
+@app.post("/plan/batch")
+async def plan_batch(req: PlanBatchRequest):
+    """
+    Plans every item like /plan and streams one NDJSON line per item as soon as
+    it is done: {"index": i, "status": 200, "plan": {...}} or {"index": i,
+    "status": 4xx/5xx, "detail": "..."}, in completion order. A closing
+    {"done": true, ...} line counts the work that was shared between the items.
+    """
+    return StreamingResponse(_plan_batch_lines(req.items), media_type=NDJSON_MEDIA_TYPE)
+
+
+def _batch_ok(index: int, payload: Dict[str, Any]) -> bytes:
+    inc("plan_batch_items_total", status=200)
+    return ndjson({"index": index, "status": 200, "plan": payload})
+
+
+def _batch_error(index: int, error: BaseException) -> bytes:
+    status = error.status_code if isinstance(error, HTTPException) else 500
+    detail = error.detail if isinstance(error, HTTPException) else f"{type(error).__name__}: {error}"
+    inc("plan_batch_items_total", status=status)
+    return ndjson({"index": index, "status": status, "detail": detail})
+
+
+async def _shared_matrix(provider, sight_lists: List[List[Sight]]) -> Optional[List[PrecomputedMatrixProvider]]:
+    """
+    One /table matrix of the union of sight_lists and a sub-matrix provider per
+    list, or None when sharing would not save requests or the fetch failed.
+    """
+    union = sight_union(sight_lists)
+    if union is None or not worth_sharing(sight_lists, union):
+        return None
+    try:
+        with span("batch.matrix", sights=len(union), items=len(sight_lists)):
+            full = await asyncio.get_running_loop().run_in_executor(None, provider.matrix, union)
+    except Exception as e:
+        print(f"[batch] Shared matrix failed, items fetch their own: {e}")
+        return None
+    full = PrecomputedMatrixProvider(full, union)
+    return [PrecomputedMatrixProvider(full.matrix(sights), sights) for sights in sight_lists]
+
+
+async def _plan_batch_lines(items: List[PlanRequest]):
+    loop = asyncio.get_running_loop()
+    shared = {"items": len(items), "geocodes": 0, "forecasts": 0, "duplicates": 0, "cache_hits": 0,
+              "shared_matrices": 0}
+
+    # Each distinct city is geocoded once
+    cities = list(dict.fromkeys(item.city for item in items))
+    with span("batch.geocode", cities=len(cities)):
+        centers = dict(zip(cities, await asyncio.gather(*(_city_center(city) for city in cities),
+                                                        return_exceptions=True)))
+    shared["geocodes"] = len(cities)
+
+    # ... and each distinct center gets one forecast, fetched in threads
+    wanted: Dict[tuple, Point] = {}
+    for item in items:
+        center = centers[item.city]
+        if item.forecast_data is None and isinstance(center, Point):
+            wanted.setdefault((center.x, center.y), center)
+    with span("batch.weather", centers=len(wanted)):
+        fetched = await asyncio.gather(*(loop.run_in_executor(None, get_weather_forecast, center)
+                                         for center in wanted.values()), return_exceptions=True)
+    forecasts = dict(zip(wanted, fetched))
+    shared["forecasts"] = len(wanted)
+
+    # Identical items (same plan cache key) are planned once and answered together
+    leaders: Dict[str, int] = {}
+    followers: Dict[int, List[int]] = {}
+    prepared: Dict[int, tuple] = {}
+    for index, item in enumerate(items):
+        center = centers[item.city]
+        if isinstance(center, BaseException):
+            yield _batch_error(index, center)
+            continue
+        forecast = item.forecast_data
+        if forecast is None:
+            forecast = forecasts[(center.x, center.y)]
+            if isinstance(forecast, BaseException):
+                yield _batch_error(index, HTTPException(status_code=500,
+                                                        detail=f"Could not fetch weather forecast: {forecast}"))
+                continue
+        key = plan_cache_key(item.city, item.mode, item.cost, item.sights, forecast, item.time_budget_ms)
+        if key in leaders:
+            followers[leaders[key]].append(index)
+            shared["duplicates"] += 1
+            continue
+        leaders[key] = index
+        followers[index] = []
+        prepared[index] = (item, center, forecast, key)
+
+    # Cache hits are answered right away, the rest gets its matrix provider
+    pending: Dict[int, tuple] = {}
+    providers: Dict[int, Any] = {}
+    for index, (item, center, forecast, key) in prepared.items():
+        cached = _cached_plan(item, center, forecast, key)
+        inc("plan_cache_requests_total", result="off" if plan_cache is None else "hit" if cached else "miss")
+        if cached is not None:
+            shared["cache_hits"] += 1
+            for i in [index] + followers[index]:
+                yield _batch_ok(i, cached)
+            continue
+        sights = [convert_sight_in_to_sight(s_in) for s_in in item.sights]
+        try:
+            provider = _matrix_provider(item.city, item.cost, item.mode, sights)
+        except HTTPException as e:
+            for i in [index] + followers[index]:
+                yield _batch_error(i, e)
+            continue
+        pending[index] = (item, center, forecast, sights, key)
+        providers[index] = provider
+
+    # Items of one city, cost and mode that would each query OSRM /table share one matrix
+    groups: Dict[tuple, List[int]] = {}
+    for index, (item, _, _, _, _) in pending.items():
+        if isinstance(providers[index], OSRMTableProvider):
+            groups.setdefault((city_slug(item.city), item.cost, item.mode), []).append(index)
+    groups = {k: group for k, group in groups.items() if len(group) > 1}
+    sub_providers = await asyncio.gather(*(
+        _shared_matrix(providers[group[0]], [pending[i][3] for i in group]) for group in groups.values()))
+    for group, group_providers in zip(groups.values(), sub_providers):
+        if group_providers is not None:
+            shared["shared_matrices"] += 1
+            providers.update(zip(group, group_providers))
+
+    # Solves go through the solver pool like /plan; one batch keeps at most a
+    # worker's worth of items in flight so interactive requests still get in.
+    # A client that goes away cancels the stream and with it the tasks below.
+    slots = asyncio.Semaphore(solver_service.max_workers)
+
+    async def solve(index):
+        item, center, forecast, sights, key = pending[index]
+        async with slots:
+            result = await _solve_plan(item, center, forecast, sights, providers[index], key,
+                                       busy_retries=BUSY_RETRIES)
+        return result.model_dump()
+
+    tasks = {asyncio.ensure_future(solve(index)): index for index in pending}
+    try:
+        remaining = set(tasks)
+        while remaining:
+            finished, remaining = await asyncio.wait(remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                index = tasks[task]
+                error = task.exception()
+                for i in [index] + followers[index]:
+                    yield _batch_error(i, error) if error is not None else _batch_ok(i, task.result())
+    finally:
+        for task in tasks:
+            task.cancel()
+    yield ndjson({"done": True, **shared})
+
+
+async def _replan_strategy(executor, stored, strategy, added, removed, matrix_provider):
+    loop = asyncio.get_running_loop()
+    with span(f"replan.{strategy}"):
+        return await loop.run_in_executor(
+            executor, replan_with_delta, stored[strategy], stored["forecast"], stored["city_center"],
+            added, removed, strategy, stored["mode"], matrix_provider, stored["time_budget_ms"])
+
+
+@app.post("/plan/incremental", response_model=IncrementalPlanResponse)
+async def plan_incremental(req: IncrementalPlanRequest, request: Request):
+    """Adds/removes sights to/from a stored plan; only the affected slots are re-solved."""
+    stored = plan_store.get(req.plan_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired plan_id '{req.plan_id}', request /plan instead.")
+
+    added = [convert_sight_in_to_sight(s_in) for s_in in req.add]
+    removed = set(req.remove)
+    # The provider covers the removed sights too: the slot matrices are built before they are cut out
+    planned = {s.name: s for strategy in ("aware", "iterative") for sights in stored[strategy].values() for s in sights}
+    sights = list(planned.values()) + [s for s in added if s.name not in planned]
+    matrix_provider = _matrix_provider(stored["city"], stored["cost"], stored["mode"], sights)
+
+    async def run_replan(executor):
+        return await asyncio.gather(
+            _replan_strategy(executor, stored, "aware", added, removed, matrix_provider),
+            _replan_strategy(executor, stored, "iterative", added, removed, matrix_provider))
+
+    aware, iterative = await _run_solver(run_replan, request.is_disconnected)
+
+    plan_id = plan_store.put({**stored, "aware": aware["tour_plan"], "iterative": iterative["tour_plan"]})
+    aware_length = haversine_path_length(aware["tour_plan"])
+    iterative_length = haversine_path_length(iterative["tour_plan"])
+
+    def describe(result):
+        return {key: result[key] for key in ("method", "reason", "affected_slots", "elapsed_ms")}
+
+    return IncrementalPlanResponse(
+        aware_plan={slot: [convert_sight_to_sight_out(s) for s in sights_list]
+                    for slot, sights_list in aware["tour_plan"].items()},
+        aware_time_seconds=aware["elapsed_ms"] / 1000,
+        aware_length_meters=aware_length,
+        iterative_plan={slot: [convert_sight_to_sight_out(s) for s in sights_list]
+                        for slot, sights_list in iterative["tour_plan"].items()},
+        iterative_time_seconds=iterative["elapsed_ms"] / 1000,
+        iterative_length_meters=iterative_length,
+        selected_plan_type="aware", # Same default as /plan
+        plan_id=plan_id,
+        previous_plan_id=req.plan_id,
+        methods={"aware": describe(aware), "iterative": describe(iterative)},
     )
 
+def _cache_gauges():
+    """(name, help, labels, value) gauges read from the caches and the solver pool at scrape time."""
+    caches = {"osrm_legs": get_leg_cache(), "forecasts": get_forecast_cache(), "plans": plan_cache}
+    for name, cache in caches.items():
+        if cache is None:
+            continue
+        lookups = cache.hits + cache.misses
+        yield "cache_hits", "Cache hits since start-up.", {"cache": name}, cache.hits
+        yield "cache_misses", "Cache misses since start-up.", {"cache": name}, cache.misses
+        yield "cache_hit_ratio", "Hits / lookups since start-up.", {"cache": name}, cache.hits / lookups if lookups else 0.0
+    geocoder = get_geocoder()
+    geocoder_hits = geocoder.known_hits + geocoder.cache_hits
+    geocoder_lookups = geocoder_hits + geocoder.upstream_calls
+    yield "cache_hits", "Cache hits since start-up.", {"cache": "geocode"}, geocoder_hits
+    yield "cache_misses", "Cache misses since start-up.", {"cache": "geocode"}, geocoder.upstream_calls
+    yield ("cache_hit_ratio", "Hits / lookups since start-up.", {"cache": "geocode"},
+           geocoder_hits / geocoder_lookups if geocoder_lookups else 0.0)
+    yield "osrm_client_calls", "OSRM requests sent by this process.", {}, get_osrm_client().calls
+    yield "solver_in_flight", "Plans admitted to the solver pool.", {}, solver_service.in_flight
+    yield "solver_rejected", "Plans rejected with 429 since start-up.", {}, solver_service.rejected
+    yield "plan_store_entries", "Plans kept for /plan/incremental.", {}, len(plan_store)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text format: phase histograms, OSRM/solver counters and cache hit ratios."""
+    return PlainTextResponse(REGISTRY.render(_cache_gauges()),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/plan/cache/stats")
+def plan_cache_stats():
+    return plan_cache.stats() if plan_cache is not None else {"enabled": False}
+
 @app.post("/narrate")
-def narrate_endpoint(req: NarrateRequest):
-    narration = narrate(req.slot, req.city, req.sights, use_template=True)
-    return {"text": narration}
+def narrate_endpoint(req: NarrateRequest, request: Request, response: Response):
+    if not profiling_requested(request.headers, request.query_params):
+        return {"text": narrate(req.slot, req.city, req.sights, use_template=True)}
+    profile = RequestProfile("narrate", request_hash(req.model_dump()))
+    with profile.running():
+        narration = narrate(req.slot, req.city, req.sights, use_template=True)
+    if profile.save() is not None:
+        response.headers["X-Profile-Path"] = str(profile.path)
+    return {"text": narration, "profile": profile.summary()}
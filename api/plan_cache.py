@@ -0,0 +1,163 @@
+# api/plan_cache.py
+# Cache of finished /plan responses.
+# Identical requests (same city, mode, cost, sight set and forecast - the demo
+# mode sends exactly the same Paris request every time) are answered from here
+# instead of being solved and routed again. The key is a canonical hash of the
+# request, so the order of the sights or of the forecast slots does not matter.
+# Lookups go to a bounded in-memory LRU first and then to an optional SQLite
+# tier under cache/ that survives restarts and is shared by all API workers.
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+CACHE_DIR = Path("cache")
+DEFAULT_DB_PATH = CACHE_DIR / "plans.sqlite"
+DEFAULT_MAX_ENTRIES = 512              # in memory; a payload is a few kB
+DEFAULT_TTL_SECONDS = 24 * 3600        # routes and the solver change, don't serve stale plans forever
+COORD_PRECISION = 5                    # 5 decimals ~ 1 m
+
+Payload = Dict[str, Any]
+
+
+def sight_id(sight) -> str:
+    """Name, rounded position and weather suitability: everything of a sight the planners look at."""
+    suitability = ",".join(sorted(sight.weather_suitability or []))
+    return (f"{sight.name}@{sight.lat:.{COORD_PRECISION}f},{sight.lon:.{COORD_PRECISION}f}"
+            f"|{sight.category or ''}|{suitability}")
+
+
+def plan_cache_key(city: str, mode: str, cost: str, sights: Iterable, forecast: Optional[Mapping[str, Any]],
+                   time_budget_ms: Optional[float] = None) -> str:
+    """sha256 of the canonical request: the sorted sight-ID set, mode, cost, forecast and solver budget."""
+    canonical = json.dumps({
+        "city": " ".join(city.split()).casefold(),
+        "mode": mode,
+        "cost": cost,
+        "sights": sorted({sight_id(s) for s in sights}),
+        "forecast": forecast or {},
+        "time_budget_ms": time_budget_ms,
+    }, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    """
+    In-memory LRU of plan payloads with an optional SQLite tier.
+
+    Args:
+        path: SQLite file of the disk tier; None keeps the cache in memory only.
+        max_entries: Size of the in-memory LRU.
+        ttl_seconds: Lifetime of an entry in either tier.
+    """
+
+    def __init__(self,
+                 path: Optional[Path] = None,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.path = Path(path) if path is not None else None
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            with self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS plans ("
+                    " key TEXT PRIMARY KEY,"
+                    " payload TEXT NOT NULL,"
+                    " created_at REAL NOT NULL)"
+                )
+
+    def get(self, key: str) -> Optional[Payload]:
+        """The cached payload (a fresh copy, safe to modify) or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[0] <= self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return json.loads(entry[1])
+            if entry is not None:
+                del self._memory[key]
+            row = None
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT payload, created_at FROM plans WHERE key = ? AND created_at > ?",
+                    (key, now - self.ttl_seconds),
+                ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember_locked(key, row[0], row[1])
+        return json.loads(row[0])
+
+    def put(self, key: str, payload: Payload) -> None:
+        encoded = json.dumps(payload, separators=(",", ":"))
+        now = time.time()
+        with self._lock:
+            self._remember_locked(key, encoded, now)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO plans (key, payload, created_at) VALUES (?, ?, ?)",
+                        (key, encoded, now))
+                    self._conn.execute("DELETE FROM plans WHERE created_at < ?", (now - self.ttl_seconds,))
+
+    def _remember_locked(self, key: str, encoded: str, created_at: float) -> None:
+        self._memory[key] = (created_at, encoded)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk": str(self.path) if self.path is not None else None,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM plans")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+
+
+def plan_cache_from_env() -> Optional[PlanCache]:
+    """
+    Cache configured by PLAN_CACHE: "memory" (default) keeps plans in this
+    process only, a file path adds the SQLite tier and "off" disables caching
+    (returns None). PLAN_CACHE_SIZE sets the in-memory LRU size.
+    """
+    location = os.environ.get("PLAN_CACHE", "memory")
+    if location.lower() in ("off", "0", "false", ""):
+        return None
+    max_entries = int(os.environ.get("PLAN_CACHE_SIZE", DEFAULT_MAX_ENTRIES))
+    path = None if location.lower() == "memory" else Path(location)
+    return PlanCache(path, max_entries=max_entries)
@@ -0,0 +1,45 @@
+# api/plan_store.py
+# Recently returned plans by ID.
+# /plan hands out a plan_id; /plan/incremental looks the plan up here and only
+# applies the user's change to it instead of solving the whole set again. The
+# store is a bounded in-memory LRU with a TTL, plans are cheap to recompute if
+# one has been evicted (the client then falls back to /plan).
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+DEFAULT_MAX_PLANS = 1000
+DEFAULT_PLAN_TTL_SECONDS = 3600
+
+
+class PlanStore:
+    def __init__(self, max_entries: int = DEFAULT_MAX_PLANS, ttl_seconds: float = DEFAULT_PLAN_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._plans: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, plan: Dict[str, Any]) -> str:
+        """Stores a plan and returns its new ID."""
+        plan_id = uuid.uuid4().hex
+        with self._lock:
+            self._plans[plan_id] = (time.monotonic(), plan)
+            while len(self._plans) > self.max_entries:
+                self._plans.popitem(last=False)
+        return plan_id
+
+    def get(self, plan_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._plans.get(plan_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._plans[plan_id]
+                return None
+            self._plans.move_to_end(plan_id)
+            return entry[1]
+
+    def __len__(self) -> int:
+        return len(self._plans)
@@ -0,0 +1,140 @@
+# api/solver_service.py
+# Bounded process pool for the CPU-heavy part of /plan.
+# CBC solves and the heuristic engines run in worker processes, so the uvicorn
+# event loop stays responsive. Admission is limited to `max_workers + max_queue`
+# plans in flight; beyond that callers get SolverBusyError (HTTP 429) instead of
+# an ever-growing queue. A request that is cancelled (timeout or client gone)
+# drops its queued solves; solves already running are bounded by time_budget_ms.
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Awaitable, Callable, Optional
+
+
+class SolverBusyError(RuntimeError):
+    """The queue is full; retry after `retry_after` seconds (HTTP 429)."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SolverUnavailableError(RuntimeError):
+    """The pool is down or the request ran out of time (HTTP 503)."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SolverService:
+    """
+    Owns the worker pool and the admission counter.
+
+    Args:
+        max_workers: Solver processes (defaults to the CPU count).
+        max_queue: Plans allowed to wait for a worker on top of max_workers.
+        timeout_seconds: Per-request limit; None disables it.
+        retry_after: Seconds suggested to rejected clients.
+        executor_factory: Builds the pool; injectable so tests can use threads.
+    """
+
+    def __init__(self,
+                 max_workers: Optional[int] = None,
+                 max_queue: int = 16,
+                 timeout_seconds: Optional[float] = 60.0,
+                 retry_after: float = 2.0,
+                 executor_factory: Callable[[int], Any] = lambda n: ProcessPoolExecutor(max_workers=n)):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.timeout_seconds = timeout_seconds
+        self.retry_after = retry_after
+        self.executor_factory = executor_factory
+        self.in_flight = 0
+        self.rejected = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        """Started lazily so importing the API does not fork workers."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = self.executor_factory(self.max_workers)
+            return self._executor
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    async def run(self, job: Callable[[Any], Awaitable[Any]],
+                  is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None) -> Any:
+        """
+        Admits one request and awaits job(executor).
+
+        job receives the pool and should do its solving there (e.g.
+        DayPlanner(executor=...).plan(...)). is_disconnected, when given, is polled
+        and the job is cancelled as soon as the client goes away.
+        """
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                raise SolverBusyError(f"{self.in_flight} plans in flight (limit {self.capacity})",
+                                      self.retry_after)
+            self.in_flight += 1
+        try:
+            task = asyncio.ensure_future(job(self.executor))
+            watcher = asyncio.ensure_future(self._watch(task, is_disconnected)) if is_disconnected else None
+            try:
+                return await asyncio.wait_for(task, self.timeout_seconds)
+            except asyncio.TimeoutError:
+                raise SolverUnavailableError(f"Planning took longer than {self.timeout_seconds:.0f}s",
+                                             self.retry_after)
+            except BrokenProcessPool:
+                self._reset()
+                raise SolverUnavailableError("Solver workers crashed, pool restarted", self.retry_after)
+            finally:
+                if watcher is not None:
+                    watcher.cancel()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    @staticmethod
+    async def _watch(task: asyncio.Future, is_disconnected: Callable[[], Awaitable[bool]],
+                     interval: float = 0.5) -> None:
+        while not task.done():
+            if await is_disconnected():
+                print("[solver] client disconnected – cancelling plan")
+                task.cancel()
+                return
+            await asyncio.sleep(interval)
+
+    def _reset(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {"in_flight": self.in_flight, "capacity": self.capacity,
+                "workers": self.max_workers, "rejected": self.rejected}
+
+
+def solver_service_from_env() -> SolverService:
+    """SOLVER_WORKERS, SOLVER_QUEUE_LIMIT and SOLVER_TIMEOUT_S configure the service."""
+    workers = os.environ.get("SOLVER_WORKERS")
+    timeout = os.environ.get("SOLVER_TIMEOUT_S", "60")
+    return SolverService(
+        max_workers=int(workers) if workers else None,
+        max_queue=int(os.environ.get("SOLVER_QUEUE_LIMIT", "16")),
+        timeout_seconds=float(timeout) if float(timeout) > 0 else None,
+    )
@@ -8,10 +8,10 @@ import sys
 from pathlib import Path
 from planner.filtering import get_available_categories, filter_sights_by_category
 from planner.map_utils import generate_map
-from planner.osm import fetch_osm_sights
+from planner.city_bundle import city_slug, load_bundles
+from planner.geocoding import geocode
 from planner.sights import Sight # Need Sight to convert from API dicts back to objects
 
-import osmnx as ox
 from shapely.geometry import Point
 import math
 import pandas as pd # <-- Import pandas for the comparison table
@@ -80,6 +80,7 @@ def get_sights_for_city(_location_input: Union[str, Point], tags: Dict[str, Unio
     # Inside the function, you still refer to it as location_input (without the underscore).
     # So, we'll assign it to a local variable without the underscore for clarity and consistency.
     location_arg = _location_input
+    from planner.osm import fetch_osm_sights  # OSMnx/geopandas only when a city is fetched from OSM
 
     if isinstance(location_arg, Point):
         if radius_meters is None:
@@ -89,13 +90,21 @@ def get_sights_for_city(_location_input: Union[str, Point], tags: Dict[str, Unio
     else:
         return fetch_osm_sights(location=location_arg, tags=tags, refresh=refresh_data)
 
+@st.cache_resource(show_spinner=False)
+def get_city_bundles():
+    """Precomputed city bundles (build-city-bundle), loaded once per server process."""
+    return load_bundles()
+
 @st.cache_data(show_spinner=False)
 def get_city_center(city_name: str) -> Point:
     city_name_stripped = city_name.strip()
+    bundle = get_city_bundles().get(city_slug(city_name_stripped))
+    if bundle is not None:
+        return bundle.center_point
     if city_name_stripped in CITY_COORDS:
         lat, lon = CITY_COORDS[city_name_stripped]
     else:
-        lat, lon = ox.geocode(city_name_stripped)
+        lat, lon = geocode(city_name_stripped)
         CITY_COORDS[city_name_stripped] = (lat, lon) # Update cache
     return Point(lon, lat)
 
@@ -188,7 +197,7 @@ elif city_display_label:
     # For these, we need to geocode if not already in cache.
     try:
         city = city_display_label # Use the human-readable city name for geocoding
-        CITY_CENTER = get_city_center(city) # This will call ox.geocode if needed
+        CITY_CENTER = get_city_center(city) # Geocodes through the shared cache if needed
     except Exception as e:
         st.error(f"Error getting city center for '{city_display_label}': {e}. Please try another city or check its spelling.")
         city = None # Invalidate city if geocoding fails
@@ -241,8 +250,11 @@ else:
     if st.button("🔄 Refresh Data from OSM"):
         get_sights_for_city.clear()  # Clears the specific cache for this function
         st.rerun()  # Forces a rerun to re-execute the function
+    city_bundle = get_city_bundles().get(city_slug(city)) if not city.startswith("Coords(") else None
     with st.spinner(f"Fetching points of interest for {city}..."):
-        if isinstance(city, str) and not city.startswith("Coords("):  # It's a proper city name string
+        if city_bundle is not None:  # Sights were precomputed with build-city-bundle
+            all_sights = city_bundle.sights.to_sights()
+        elif isinstance(city, str) and not city.startswith("Coords("):  # It's a proper city name string
             all_sights = get_sights_for_city(_location_input=city, tags=TAGS, refresh_data=True)
         elif isinstance(CITY_CENTER, Point):  # It's a Point (from coords input or demo mode's geocoding)
             # Ensure radius is available when using a Point
@@ -334,14 +346,31 @@ st.write(f"**{len(final_sights)} sights selected for your plan (max {MAX_SIGHTS_
 def clean_sight_list_names(sight_list_names):
     return [s for s in sight_list_names if isinstance(s, str) and not (isinstance(s, float) and math.isnan(s))]
 
+def sight_to_api_dict(s):
+    return {"name": s.name, "lat": s.location.y, "lon": s.location.x, "category": s.category,
+            "weather_suitability": s.weather_suitability}
+
 safe_selected_names_current = clean_sight_list_names(selected_sight_names)
 safe_selected_names_last = clean_sight_list_names(st.session_state.get("last_selected_sights", []))
 
 if set(safe_selected_names_current) != set(safe_selected_names_last):
-    st.session_state["trigger_plan"] = False
+    previous_results = st.session_state.api_plan_results
     st.session_state["last_selected_sights"] = safe_selected_names_current
-    st.session_state.plan_auto_triggered = False
     st.session_state.api_plan_results = None # Clear old plan results
+    if st.session_state.trigger_plan and previous_results and previous_results.get("plan_id"):
+        # A plan is shown: send only the change, the API re-solves just the affected slots
+        added = [sight_to_api_dict(s) for s in final_sights if s.name not in set(safe_selected_names_last)]
+        removed = [name for name in safe_selected_names_last if name not in set(safe_selected_names_current)]
+        try:
+            response = requests.post(f"{FASTAPI_URL}/plan/incremental",
+                                     json={"plan_id": previous_results["plan_id"], "add": added, "remove": removed})
+            response.raise_for_status()
+            st.session_state.api_plan_results = response.json()
+        except requests.exceptions.RequestException:
+            pass  # Plan expired or API busy: the tour is planned from scratch below
+    else:
+        st.session_state["trigger_plan"] = False
+        st.session_state.plan_auto_triggered = False
 
 # --- Plan Tour Section ---
 st.subheader("Plan Your Tour")
@@ -392,11 +421,7 @@ if st.session_state.trigger_plan:
         st.stop()
 
     # --- API Call to get BOTH plans and metrics ---
-    sight_data_for_api = [
-        {"name": s.name, "lat": s.location.y, "lon": s.location.x, "category": s.category,
-         "weather_suitability": s.weather_suitability}
-        for s in final_sights
-    ]
+    sight_data_for_api = [sight_to_api_dict(s) for s in final_sights]
 
     plan_request_body = {
         "city": city,
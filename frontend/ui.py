@@ -1,41 +1,20 @@
 # frontend/ui.py
 from shapely.geometry import Point
 import streamlit as st
-import osmnx as ox
+from planner.geocoding import geocode, get_geocoder
 
 from typing import Dict, Tuple, Optional
 
 
 # Function to reverse geocode a point to a city name
-@st.cache_data(show_spinner=False)  # Cache this function as it makes external API calls
 def reverse_geocode_point_to_city(_point: Point) -> Optional[str]:
     """
     Attempts to reverse geocode a shapely Point to a human-readable city name.
-    Uses OSMnx's geocoding capabilities.
+    Goes through the shared geocoder, whose on-disk cache is keyed by the
+    rounded coordinates, so nearby clicks and reruns do not hit Nominatim again.
     """
-    try:
-        # ox.geocode_point_to_address expects (latitude, longitude)
-        # Shapely Point stores (longitude, latitude), so extract correctly
-        address = ox.geocode_point_to_address((_point.y, _point.x), amenities=False, distance=10000)  # Search within 500m
-
-        # The address string can be complex (e.g., "Eiffel Tower, 75007 Paris, France")
-        # Try to extract a common city/town component. This is a heuristic.
-        parts = [p.strip() for p in address.split(',')]
-
-        # Common pattern: city is often the second to last part, or a named part
-        if len(parts) >= 2:
-            # Check if one of the parts looks like a city name (e.g., not a postal code)
-            # This is a very basic heuristic, could be improved with more robust address parsing libraries
-            potential_city = parts[-2]
-            if not potential_city.isdigit() and len(potential_city) > 2:  # Simple check to avoid postal codes
-                return potential_city
-
-        # Fallback to the last part (often country or major region)
-        return parts[-1] if parts else None
-
-    except Exception as e:
-        # print(f"DEBUG: Reverse geocoding failed for {point}: {e}") # For debugging
-        return None
+    # Shapely Point stores (longitude, latitude), the geocoder expects (latitude, longitude)
+    return get_geocoder().reverse(_point.y, _point.x)
 
 def get_user_city_input(city_coords_cache: Dict[str, Tuple[float, float]]) -> Tuple[Optional[str], Optional[Point]]:
     """
@@ -74,7 +53,7 @@ def get_user_city_input(city_coords_cache: Dict[str, Tuple[float, float]]) -> Tu
                 lat, lon = city_coords_cache[city]
             else:
                 try:
-                    lat, lon = ox.geocode(city)
+                    lat, lon = geocode(city)
                     city_coords_cache[city] = (lat, lon)
                 except Exception as e:
                     st.error(f"Could not find coordinates for demo city '{city}': {e}. Please check its name.")
@@ -117,7 +96,7 @@ def get_user_city_input(city_coords_cache: Dict[str, Tuple[float, float]]) -> Tu
             if city_input:
                 city = city_input
                 try:
-                    lat, lon = ox.geocode(city)
+                    lat, lon = geocode(city)
                     city_coords_cache[city] = (lat, lon)
                     city_center = Point(lon, lat)
                 except Exception as e:
@@ -133,11 +112,10 @@ def get_user_city_input(city_coords_cache: Dict[str, Tuple[float, float]]) -> Tu
                 st.session_state.radius_for_point_query = radius
 
                 # Attempt to reverse geocode
-                try:
-                    location = (lat, lon) # Pass as tuple for reverse_geocode
-                    city = ox.geocode_to_gdf(location).at[0, 'name'] # Extract city name
+                city = reverse_geocode_point_to_city(city_center)
+                if city:
                     st.success(f"Detected city: **{city}**")
-                except Exception:
+                else:
                      city = f"Coords({lat:.6f}, {lon:.6f})"  # Fallback to "Coords(...)"
                      st.warning("Could not identify a city for these coordinates. Using raw coordinates.")
 
@@ -178,7 +156,7 @@ def get_user_city_input_old(city_coords_cache: dict) -> tuple[Optional[str], Opt
                 lat, lon = city_coords_cache[city]
             else:
                 try:  # Try to geocode if not in cache (e.g., "Paris, France" is not in CITY_COORDS by default)
-                    lat, lon = ox.geocode(city)
+                    lat, lon = geocode(city)
                     city_coords_cache[city] = (lat, lon)  # Add to cache for next time
                 except Exception:
                     st.error(f"Could not find coordinates for demo city '{city}'. Please check its name.")
@@ -208,7 +186,7 @@ def get_user_city_input_old(city_coords_cache: dict) -> tuple[Optional[str], Opt
                     if city in city_coords_cache:
                         lat, lon = city_coords_cache[city]
                     else:
-                        lat, lon = ox.geocode(city)
+                        lat, lon = geocode(city)
                         city_coords_cache[city] = (lat, lon)
                     city_center = Point(lon, lat)
                 except Exception:
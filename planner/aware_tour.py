@@ -32,6 +32,9 @@ def is_weather_suitable(sight, weather_condition):
 # planner/tour.py
 #from planner.weather import is_weather_suitable
 #from planner.utils import distance
+import numpy as np
+
+from .spatial_index import lat_lon, unit_vectors
 
 def split_day_into_slots():
     """Define time slots, can be extended as needed."""
@@ -47,20 +50,25 @@ def optimize_route(start_point, sights, mode="walking"):
     start_point: (lat, lon)
     sights: list of sight objects with .location attribute (shapely Point or tuple)
     Returns sights ordered by optimized visiting sequence.
+    Locations are read once into unit vectors; each step is one vectorised
+    distance scan with the visited sights masked out.
     """
     if not sights:
         return []
 
-    unvisited = sights[:]
+    vectors = unit_vectors([lat_lon(s.location) for s in sights])
+    unvisited = np.ones(len(sights), dtype=bool)
     route = []
-    current = start_point
-
-    while unvisited:
-        # Find nearest sight to current location
-        nearest = min(unvisited, key=lambda s: distance(current, s.location))
-        route.append(nearest)
-        current = (nearest.location.y, nearest.location.x)  # Assuming shapely Point(x=lon, y=lat)
-        unvisited.remove(nearest)
+    current = unit_vectors(lat_lon(start_point))[0]
+
+    for _ in range(len(sights)):
+        # Nearest unvisited sight; the chord between unit vectors orders like great-circle distance
+        dists = np.linalg.norm(vectors - current, axis=1)
+        dists[~unvisited] = np.inf
+        nearest = int(np.argmin(dists))
+        route.append(sights[nearest])
+        unvisited[nearest] = False
+        current = vectors[nearest]
 
     return route
 
@@ -5,9 +5,18 @@ from .postcard import generate_postcard #p
 from abc import ABC, abstractmethod
 import math
 from collections import defaultdict
-from .tour_planner_orchestrator import plan_citytour_iterative
-
+from .tour_planner_orchestrator import plan_citytour_iterative, sight_coordinates, tour_ranks
+from .matrix_provider import HaversineMatrixProvider #p
+from .optimize import solve_tsp_anytime #p
+from .spatial_index import SightIndex #p
+from .tracing import capture, replay, span #p
+from .profiling import profiled #p
+
+import asyncio
 import time
+from typing import Mapping
+
+import numpy as np
 
 class Planner(ABC):
     @abstractmethod
@@ -15,76 +24,121 @@ class Planner(ABC):
         pass
 
 # --- DayPlanner Class ---
+def _timed(fn, *args, **kwargs):
+    """Runs fn in the worker and returns (result, seconds spent in fn, trace events recorded there)."""
+    with capture() as events:
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        seconds = time.perf_counter() - start
+    return result, seconds, events
+
+
+def _plan_iterative(sights, city_center, weather_forecast, time_budget_ms, matrix_provider):
+    # solver_stats is filled in place, so hand it back explicitly (process pools copy arguments)
+    solver_stats = {}
+    tour_plan = plan_citytour_iterative(
+        sights=sights,
+        city_center=city_center,
+        weather_forecast=weather_forecast, # iterative might not strictly need weather but pass for consistency
+        time_budget_ms=time_budget_ms,
+        solver_stats=solver_stats,
+        matrix_provider=matrix_provider
+    )
+    return tour_plan, solver_stats
+
+
+def _plan_aware(sights, weather_forecast, city_center, mode):
+    return create_weather_aware_tour(sights, weather_forecast, city_center, mode=mode), {}
+
+
+def _plan_entry(tour_plan, tour_info, planning_seconds, routing_seconds):
+    return {
+        "tour_plan": tour_plan,
+        "planning_time_seconds": planning_seconds,
+        "routing_time_seconds": routing_seconds,
+        "total_length_meters": tour_info.get('total_subtour_length_meters', 0.0),
+        "total_duration_seconds": tour_info.get('total_duration_seconds', 0.0),
+        "full_route_geojson": tour_info.get('full_route_geojson'),
+        "message": tour_info.get('message'),
+        "haversine_total_length_meters": tour_info.get('haversine_total_length_meters', 0.0),
+        "haversine_subtour_lengths_meters": tour_info.get('haversine_subtour_lengths_meters', {}),
+        "haversine_total_subtour_length_meters": tour_info.get('haversine_total_subtour_length_meters', 0.0)
+    }
+
+
 class DayPlanner(Planner):
-    async def plan(self, sights, city_center, mode, weather_forecast):
+    def __init__(self, executor=None, worker_profiles=None):
+        """
+        executor: concurrent.futures executor the solvers run in. None uses the
+        event loop's default thread pool; a ProcessPoolExecutor keeps CPU-heavy
+        solving off the GIL (sights and matrix providers are picklable).
+        worker_profiles: optional list; if given, the solver jobs run under cProfile
+        and their raw stats are appended to it (see planner/profiling.py).
+        """
+        self.executor = executor
+        self.worker_profiles = worker_profiles
+
+    async def _run_strategy(self, name, solve, args, city_center, mode):
+        """Solves in the executor, then awaits the routing of that plan; returns (plan, extra, info, timings)."""
+        loop = asyncio.get_running_loop()
+        with span(f"planning.{name}"):
+            if self.worker_profiles is None:
+                (tour_plan, extra), planning_seconds, events = await loop.run_in_executor(
+                    self.executor, _timed, solve, *args)
+            else:
+                ((tour_plan, extra), planning_seconds, events), raw_stats = await loop.run_in_executor(
+                    self.executor, profiled, _timed, solve, *args)
+                self.worker_profiles.append(raw_stats)
+            replay(events)  # The worker's grouping/solve/balancing spans
+        start_routing = time.perf_counter()
+        with span(f"routing.{name}", mode=mode):
+            tour_info = await generate_information_full_day_tour(tour_plan, city_center, mode)
+        routing_seconds = time.perf_counter() - start_routing
+        return tour_plan, extra, tour_info, {"planning_seconds": planning_seconds,
+                                             "routing_seconds": routing_seconds}
+
+    async def plan(self, sights, city_center, mode, weather_forecast, time_budget_ms=None, matrix_provider=None):
         """
         Plans a full-day tour using both weather-aware and iterative strategies,
         and generates comprehensive information for each, including total route
         length and duration using efficient OSRM calls.
 
-        Returns a dictionary containing details for both plans suitable for table display.
-        """
-        results = {}
+        The two strategies are independent: each is solved in self.executor and
+        its routing is awaited as soon as it is ready, so the pipelines overlap
+        and the wall time is roughly that of the slower one.
 
-        # --- Weather-Aware Tour Planning and Information Generation ---
-        print("\n--- Measuring create_weather_aware_tour ---")
-        start_time_aware_planning = time.time()
-        tour_plan_aware = create_weather_aware_tour(sights, weather_forecast, city_center, mode=mode)
-        end_time_aware_planning = time.time()
-        elapsed_time_aware_planning = end_time_aware_planning - start_time_aware_planning
-        print(f"Time taken for weather-aware plan generation: {elapsed_time_aware_planning:.4f} seconds")
-
-        # Calculate full tour information for weather-aware plan using the efficient function
-        start_time_aware_routing = time.time()
-        aware_tour_info = await  generate_information_full_day_tour(tour_plan_aware, city_center, mode)
-        end_time_aware_routing = time.time()
-        elapsed_time_aware_routing = end_time_aware_routing - start_time_aware_routing
-        print(f"Time taken for weather-aware full route calculation: {elapsed_time_aware_routing:.4f} seconds")
-
-        results["aware_plan"] = {
-            "tour_plan": tour_plan_aware,
-            "planning_time_seconds": elapsed_time_aware_planning,
-            "routing_time_seconds": elapsed_time_aware_routing,
-            "total_length_meters": aware_tour_info.get('total_subtour_length_meters', 0.0),
-            "total_duration_seconds": aware_tour_info.get('total_duration_seconds', 0.0),
-            "full_route_geojson": aware_tour_info.get('full_route_geojson'),
-            "message": aware_tour_info.get('message'),
-            "haversine_total_length_meters": aware_tour_info.get('haversine_total_length_meters', 0.0),
-            "haversine_subtour_lengths_meters": aware_tour_info.get('haversine_subtour_lengths_meters', {}),
-            "haversine_total_subtour_length_meters": aware_tour_info.get('haversine_total_subtour_length_meters', 0.0)
-        }
+        time_budget_ms bounds the solver time per weather group of the iterative
+        plan (anytime mode); its optimality gap is reported in the result.
+        matrix_provider (planner/matrix_provider.py) lets the iterative plan optimise
+        on OSRM walking/cycling time or distance instead of haversine.
 
-        # --- Iterative Tour Planning and Information Generation ---
-        print("\n--- Measuring plan_citytour_iterative ---")
-        start_time_iterative_planning = time.time()
-        tour_plan_iterative = plan_citytour_iterative(
-            sights=sights,
-            city_center=city_center,
-            weather_forecast=weather_forecast # iterative might not strictly need weather but pass for consistency
+        Returns a dictionary containing details for both plans suitable for table display,
+        plus "timings": {"aware": {...}, "iterative": {...}, "wall_seconds": ...}.
+        """
+        start_time = time.perf_counter()
+        aware, iterative = await asyncio.gather(
+            self._run_strategy("aware", _plan_aware, (sights, weather_forecast, city_center, mode),
+                               city_center, mode),
+            self._run_strategy("iterative", _plan_iterative,
+                               (sights, city_center, weather_forecast, time_budget_ms, matrix_provider),
+                               city_center, mode),
         )
-        end_time_iterative_planning = time.time()
-        elapsed_time_iterative_planning = end_time_iterative_planning - start_time_iterative_planning
-        print(f"Time taken for iterative plan generation: {elapsed_time_iterative_planning:.4f} seconds")
-
-        # Calculate full tour information for iterative plan using the efficient function
-        start_time_iterative_routing = time.time()
-        iterative_tour_info = await generate_information_full_day_tour(tour_plan_iterative, city_center, mode)
-        end_time_iterative_routing = time.time()
-        elapsed_time_iterative_routing = end_time_iterative_routing - start_time_iterative_routing
-        print(f"Time taken for iterative full route calculation: {elapsed_time_iterative_routing:.4f} seconds")
-
-        results["iterative_plan"] = {
-            "tour_plan": tour_plan_iterative,
-            "planning_time_seconds": elapsed_time_iterative_planning,
-            "routing_time_seconds": elapsed_time_iterative_routing,
-            "total_length_meters": iterative_tour_info.get('total_subtour_length_meters', 0.0),
-            "total_duration_seconds": iterative_tour_info.get('total_duration_seconds', 0.0),
-            "full_route_geojson": iterative_tour_info.get('full_route_geojson'),
-            "message": iterative_tour_info.get('message'),
-            "haversine_total_length_meters": iterative_tour_info.get('haversine_total_length_meters', 0.0),
-            "haversine_subtour_lengths_meters": iterative_tour_info.get('haversine_subtour_lengths_meters', {}),
-            "haversine_total_subtour_length_meters": iterative_tour_info.get('haversine_total_subtour_length_meters', 0.0)
+        wall_seconds = time.perf_counter() - start_time
+
+        tour_plan_aware, _, aware_tour_info, aware_timings = aware
+        tour_plan_iterative, solver_stats, iterative_tour_info, iterative_timings = iterative
+
+        results = {
+            "aware_plan": _plan_entry(tour_plan_aware, aware_tour_info,
+                                      aware_timings["planning_seconds"], aware_timings["routing_seconds"]),
+            "iterative_plan": _plan_entry(tour_plan_iterative, iterative_tour_info,
+                                          iterative_timings["planning_seconds"], iterative_timings["routing_seconds"]),
         }
+        results["iterative_plan"]["optimality_gap"] = solver_stats.get("optimality_gap")
+        results["iterative_plan"]["solver_stats"] = solver_stats
+        results["timings"] = {"aware": aware_timings, "iterative": iterative_timings, "wall_seconds": wall_seconds}
+        print(f"DayPlanner timings: aware {aware_timings}, iterative {iterative_timings}, "
+              f"wall {wall_seconds:.4f} seconds")
 
         results["selected_plan_type"] = "aware" # Default selection, can be changed based on criteria
 
@@ -138,10 +192,99 @@ class DayPlanner(Planner):
         # If 'postcards' generation is still needed, ensure 'generate_postcard' is available.
         return flat_plan, main_weather, None, tour_plan_iterative # Returning None for postcards for now
 
-# Later, add:
-# class WeekPlanner(Planner):
-#     def plan(self, sights, city_center, mode):
-#         pass
+# --- WeekPlanner Class ---
+def split_tour_into_days(tour, distance_matrix, days: int):
+    """
+    Cuts a closed tour into `days` contiguous parts of (nearly) equal size.
+    Of all rotations of the cut positions the one removing the longest edges
+    is used, so every part stays a compact stretch of the tour.
+    """
+    dist = np.asarray(distance_matrix, dtype=np.float64)
+    tour = list(tour)
+    if days <= 1:
+        return [tour]
+    if len(tour) < days:
+        return [[i] for i in tour] + [[] for _ in range(days - len(tour))]
+    best_parts, best_cut = None, -1.0
+    for offset in range(len(tour) // days):
+        parts = [p.tolist() for p in np.array_split(np.roll(tour, -offset), days)]
+        cut = sum(dist[parts[i][-1], parts[(i + 1) % days][0]] for i in range(days))
+        if cut > best_cut:
+            best_parts, best_cut = parts, cut
+    return best_parts
+
+
+class WeekPlanner(Planner):
+    """
+    Multi-day itineraries from a per-day forecast series.
+
+    The cost matrix and the spatial index are built once for all sights and
+    shared by every day. One tour over all sights is cut into a compact part
+    per day, the parts are matched to the days whose forecast suits their
+    sights best, and each day is planned with plan_citytour_iterative,
+    warm-started from the order of the best tour known so far (the week tour,
+    then the solved days), so the day solves mostly just repair that order.
+    """
+
+    def __init__(self, time_budget_ms=None, engine="auto"):
+        self.time_budget_ms = time_budget_ms
+        self.engine = engine
+
+    def plan(self, sights, city_center, mode, weather_forecast, matrix_provider=None):
+        """
+        weather_forecast: day -> {slot: weather} (e.g. from prefetch_forecasts)
+            or a list of slot forecasts, one per day.
+        matrix_provider: as for DayPlanner.plan; haversine km if None. It is
+            queried once for all sights.
+        Returns {"days": [{"day", "forecast", "tour_plan", "solver_stats"}, ...],
+        "timings": {...}}. Routing is left to the caller (mode is kept for the
+        Planner interface), e.g. generate_information_full_day_tour per day.
+        """
+        start_time = time.perf_counter()
+        days = list(weather_forecast.items()) if isinstance(weather_forecast, Mapping) else list(enumerate(weather_forecast))
+        sights = list(sights)
+        if not days:
+            return {"days": [], "timings": {"total_seconds": 0.0}}
+
+        provider = (matrix_provider or HaversineMatrixProvider()).for_sights(sights)
+        index = SightIndex(sights, sight_coordinates(sights))
+        full = provider.matrix(sights) if sights else np.zeros((0, 0))
+        week_tour = solve_tsp_anytime(full, time_budget_ms=self.time_budget_ms, engine="heuristic").tour
+        matrix_seconds = time.perf_counter() - start_time
+
+        parts = split_tour_into_days(week_tour, full, len(days))
+        # Fraction of a day's slots each part's sights suit, maximised over the assignment
+        suitability = np.array([[sum(is_weather_suitable(sights[i], w) for i in part for w in forecast.values())
+                                 / max(1, len(forecast)) for _, forecast in days] for part in parts])
+        from scipy.optimize import linear_sum_assignment
+        part_rows, day_cols = linear_sum_assignment(-suitability)
+        part_for_day = dict(zip(day_cols, part_rows))
+        ranks = tour_ranks({"week": [sights[i] for i in week_tour]})
+
+        results, day_seconds = [], []
+        for d, (day, forecast) in enumerate(days):
+            day_start = time.perf_counter()
+            day_sights = [sights[i] for i in parts[part_for_day[d]]]
+            solver_stats = {}
+            tour_plan = plan_citytour_iterative(
+                sights=day_sights,
+                city_center=city_center,
+                weather_forecast=forecast,
+                engine=self.engine,
+                time_budget_ms=self.time_budget_ms,
+                solver_stats=solver_stats,
+                matrix_provider=provider,
+                index=index,
+                warm_start=ranks,
+            ) if day_sights else {slot: [] for slot in forecast}
+            ranks = tour_ranks(tour_plan, ranks)
+            results.append({"day": day, "forecast": forecast, "tour_plan": tour_plan, "solver_stats": solver_stats})
+            day_seconds.append(time.perf_counter() - day_start)
+
+        timings = {"matrix_seconds": matrix_seconds, "day_seconds": day_seconds,
+                   "total_seconds": time.perf_counter() - start_time}
+        print(f"WeekPlanner timings: {len(days)} days, {len(sights)} sights, {timings['total_seconds']:.4f} seconds")
+        return {"days": results, "timings": timings}
 
 
 
@@ -0,0 +1,183 @@
+# planner/city_bundle.py
+# Precomputed per-city planning bundle.
+# Everything /plan would otherwise redo per request for a city we serve - the
+# geocoded center, the sight collection, the pairwise haversine matrix and
+# optionally OSRM duration matrices per mode - is built offline once
+# (`python tourist_planner.py build-city-bundle --city ...`) and written into
+# one versioned .npz file that the API and frontend load at start-up.
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+from shapely.geometry import Point
+from slugify import slugify
+
+from .sight_collection import SightCollection #p
+from .tour_planner_orchestrator import build_distance_matrix, sight_coordinates #p
+from .matrix_provider import OSRMTableProvider, PrecomputedMatrixProvider #p
+
+BUNDLE_FORMAT_VERSION = 1
+BUNDLE_DIR = Path(os.environ.get("CITY_BUNDLE_DIR", "bundles"))
+BUNDLE_SUFFIX = ".citybundle.npz"
+# The full matrix is n^2 float64: 5000 sights are 200 MB, beyond that only the sights are bundled
+MAX_MATRIX_SIGHTS = 5000
+# A request sight is the bundled one of the same name only if it is where the bundle has it (~1 m)
+POSITION_TOLERANCE_DEG = 1e-5
+
+
+def city_slug(city: str) -> str:
+    """Convert 'Berlin, Germany' -> 'berlin'."""
+    first_part = city.split(",")[0].strip().lower()
+    # Fallback if slugify is outdated:
+    # slug = re.sub(r"[^\w]+", "_", city.lower()).strip("_")
+    # return slug
+    return slugify(first_part)
+
+
+def bundle_path(city: str, root: Path = BUNDLE_DIR) -> Path:
+    return Path(root) / f"{city_slug(city)}{BUNDLE_SUFFIX}"
+
+
+class CityBundle:
+    """
+    Planning data of one city.
+
+    Args:
+        city: Place name the bundle was built for, e.g. "Paris, France".
+        center: (lat, lon) of the geocoded city center.
+        sights: All sights of the city.
+        haversine_km: Optional n x n great-circle matrix over `sights`.
+        durations: Optional mode -> n x n OSRM duration matrix (seconds, symmetrised).
+        built_at: Unix time of the build.
+    """
+
+    def __init__(self, city: str, center: Tuple[float, float], sights: SightCollection,
+                 haversine_km: Optional[np.ndarray] = None,
+                 durations: Optional[Dict[str, np.ndarray]] = None,
+                 built_at: Optional[float] = None):
+        self.city = city
+        self.center = (float(center[0]), float(center[1]))
+        self.sights = sights
+        self.haversine_km = haversine_km
+        self.durations = dict(durations or {})
+        self.built_at = time.time() if built_at is None else built_at
+        self._positions = None
+
+    @property
+    def slug(self) -> str:
+        return city_slug(self.city)
+
+    @property
+    def center_point(self) -> Point:
+        return Point(self.center[1], self.center[0])  # Point(longitude, latitude)
+
+    def positions(self, sights: Sequence) -> Optional[np.ndarray]:
+        """
+        Row of every sight in the bundle matrices, None if any is missing.
+        Sights are looked up by name (like Sight.__eq__) and must also be at the
+        bundled location: a client sight that only shares the name of a bundled
+        POI, or a name the city has several times (chain cafés), is not matched.
+        """
+        if self._positions is None:
+            self._positions = {name: i for i, name in enumerate(self.sights.names)}
+        idx = [self._positions.get(s.name) for s in sights]
+        if any(i is None for i in idx):
+            return None
+        idx = np.asarray(idx, dtype=np.intp)
+        if len(idx) and not np.allclose(sight_coordinates(sights),
+                                        np.column_stack((self.sights.lat[idx], self.sights.lon[idx])),
+                                        rtol=0.0, atol=POSITION_TOLERANCE_DEG):
+            return None
+        return idx
+
+    def full_matrix(self, cost: str = "haversine", mode: str = "walking") -> Optional[np.ndarray]:
+        if cost == "haversine":
+            return self.haversine_km
+        if cost == "duration":
+            return self.durations.get(mode)
+        return None  # Road distances are not bundled
+
+    def matrix_provider(self, sights: Sequence, cost: str = "haversine",
+                        mode: str = "walking") -> Optional[PrecomputedMatrixProvider]:
+        """
+        Provider for the requested sights cut from the bundled matrix, or None
+        when the bundle has no matrix for cost/mode or does not contain every
+        sight at its bundled location.
+        Only the sub-matrix is kept, so it is cheap to hand to the solver pool.
+        """
+        full = self.full_matrix(cost, mode)
+        idx = None if full is None else self.positions(sights)
+        if idx is None:
+            return None
+        return PrecomputedMatrixProvider(full[np.ix_(idx, idx)], sights)
+
+    # --------- Serialisation ---------------------------------------------------
+    def save(self, path) -> Path:
+        path = Path(path)
+        meta = {"format_version": BUNDLE_FORMAT_VERSION, "city": self.city, "slug": self.slug,
+                "center": list(self.center), "built_at": self.built_at,
+                "n_sights": len(self.sights), "duration_modes": sorted(self.durations)}
+        arrays = {f"sights.{k}": v for k, v in self.sights.to_arrays().items()}
+        arrays["meta"] = np.array(json.dumps(meta))
+        if self.haversine_km is not None:
+            arrays["haversine_km"] = self.haversine_km
+        for mode, matrix in self.durations.items():
+            arrays[f"duration.{mode}"] = matrix
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.tmp{os.getpid()}")
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)  # a running API never sees a half-written bundle
+        return path
+
+    @classmethod
+    def load(cls, path) -> "CityBundle":
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("format_version") != BUNDLE_FORMAT_VERSION:
+                raise ValueError(f"{path} has bundle format {meta.get('format_version')}, "
+                                 f"expected {BUNDLE_FORMAT_VERSION}; rebuild it with build-city-bundle")
+            sights = SightCollection.from_arrays(
+                {k[len("sights."):]: data[k] for k in data.files if k.startswith("sights.")})
+            return cls(city=meta["city"], center=tuple(meta["center"]), sights=sights,
+                       haversine_km=data["haversine_km"] if "haversine_km" in data.files else None,
+                       durations={mode: data[f"duration.{mode}"] for mode in meta["duration_modes"]},
+                       built_at=meta["built_at"])
+
+    def __repr__(self):
+        return (f"CityBundle(city={self.city!r}, sights={len(self.sights)}, "
+                f"haversine={self.haversine_km is not None}, durations={sorted(self.durations)})")
+
+
+def build_city_bundle(city: str, center: Tuple[float, float], sights: SightCollection,
+                      modes: Iterable[str] = (), max_matrix_sights: int = MAX_MATRIX_SIGHTS,
+                      osrm_base_url: Optional[str] = None) -> CityBundle:
+    """
+    Precomputes the matrices for a city. The haversine matrix is always built
+    (up to max_matrix_sights); OSRM duration matrices only for the given modes.
+    """
+    haversine_km, durations = None, {}
+    if len(sights) <= max_matrix_sights:
+        haversine_km = build_distance_matrix(sights)
+        for mode in modes:
+            durations[mode] = OSRMTableProvider(mode=mode, metric="duration", base_url=osrm_base_url).matrix(sights)
+    else:
+        print(f"⚠️ {len(sights)} sights exceed max_matrix_sights={max_matrix_sights}; bundling sights only.")
+    return CityBundle(city, center, sights, haversine_km=haversine_km, durations=durations)
+
+
+def load_bundles(root: Path = BUNDLE_DIR) -> Dict[str, CityBundle]:
+    """All bundles in root by city slug; unreadable or outdated files are skipped."""
+    bundles = {}
+    for path in sorted(Path(root).glob(f"*{BUNDLE_SUFFIX}")):
+        try:
+            bundle = CityBundle.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Skipping city bundle {path}: {e}")
+            continue
+        bundles[bundle.slug] = bundle
+    return bundles
@@ -1,8 +1,6 @@
 from pathlib import Path
 
 import pandas as pd
-from shapely.geometry import Point
-from .sights import Sight #p
 
 '''def load_sights_from_csv(csv_path):
     df = pd.read_csv(csv_path)
@@ -33,62 +31,102 @@ from .sights import Sight #p
         )
         sights.append(sight)
     return sights'''
-import pandas as pd
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Sequence, Union
 from .sights import Sight #p
-from shapely.geometry import Point
-
-def load_sights_from_csv(path):
-    df = pd.read_csv(path)
-
-    sights = []
-    for _, row in df.iterrows():
-        try:
-            name = str(row["name"]) if pd.notna(row["name"]) else "Unnamed Sight"
-            category = str(row["category"]) if pd.notna(row["category"]) else "unknown"
-            description = str(row["description"]) if pd.notna(row.get("description", "")) else ""
-            # Defensive: check if columns exist
-            lat = row['latitude'] if 'latitude' in df.columns else row.get('lat', None)
-            lon = row['longitude'] if 'longitude' in df.columns else row.get('lon', None)
-            if lat is None or lon is None:
-                continue  # Skip invalid rows
-            location = Point(lon, lat)
-
-            weather = row.get("weather_suitability", "any")
-            if isinstance(weather, str):
-                weather_suitability = [w.strip() for w in weather.split(",")]
-            else:
-                weather_suitability = ["any"]
-
-            sights.append(Sight(
-                name=name,
-                category=category,
-                description=description,
-                location=location,
-                weather_suitability=weather_suitability
-            ))
-        except Exception as e:
-            print(f"⚠️ Skipping bad row: {row.to_dict()} ({e})")
-    return sights
-
-
-def save_sights_to_csv(sights, csv_path: Path, allow_overwrite_recommendations=False):
+from .sight_collection import SightCollection #p
+
+# Both delimiters occur in the data: older CSVs use ',', save_sights_to_csv writes '|'
+WEATHER_DELIMITER = "|"
+WEATHER_SPLIT_PATTERN = r"\s*[|,]\s*"
+
+# dtype hints for the text columns. Coordinates get none: a float64 hint makes one
+# malformed value abort the whole file, _coordinate_column coerces it to NaN instead
+CSV_DTYPES = {"name": "string", "category": "string", "weather_suitability": "string", "description": "string"}
+DEFAULT_CHUNK_ROWS = 200_000
+
+
+def _coordinate_column(df: pd.DataFrame, *candidates: str) -> Optional[pd.Series]:
+    for column in candidates:
+        if column in df.columns:
+            return pd.to_numeric(df[column], errors="coerce")
+    return None
+
+
+def sights_from_dataframe(df: pd.DataFrame) -> SightCollection:
+    """
+    Converts a sights table into a SightCollection with column operations.
+    Missing names/categories become "Unnamed Sight"/"unknown", missing weather
+    becomes "any", and rows without valid coordinates are skipped.
+    """
+    lat = _coordinate_column(df, "latitude", "lat")
+    lon = _coordinate_column(df, "longitude", "lon")
+    if lat is None or lon is None:
+        return SightCollection.empty()  # Invalid file: no coordinate columns
+    valid = lat.notna() & lon.notna()
+    if not valid.all():
+        print(f"⚠️ Skipping {int((~valid).sum())} row(s) without coordinates")
+        df, lat, lon = df[valid], lat[valid], lon[valid]
+
+    def text(column: str, default: str) -> pd.Series:
+        if column not in df.columns:
+            return pd.Series(default, index=df.index, dtype="string")
+        return df[column].astype("string").fillna(default)
+
+    weather = (text("weather_suitability", "any").str.strip()
+               .str.replace(WEATHER_SPLIT_PATTERN, WEATHER_DELIMITER, regex=True)
+               .replace("", "any"))
+    return SightCollection.from_columns(
+        names=text("name", "Unnamed Sight").to_numpy(dtype=object),
+        lat=lat.to_numpy(dtype=np.float64),
+        lon=lon.to_numpy(dtype=np.float64),
+        categories=text("category", "unknown").to_numpy(dtype=object),
+        weather_suitability=weather.to_numpy(dtype=object),
+        descriptions=text("description", "").to_numpy(dtype=object),
+        weather_delimiter=WEATHER_DELIMITER,
+    )
+
+
+def load_sights_collection(path, usecols: Optional[Sequence[str]] = None,
+                           dtype: Optional[Dict[str, str]] = None) -> SightCollection:
+    """
+    Reads a sights CSV into a SightCollection without a per-row loop.
+    usecols limits the parsed columns; dtype overrides the CSV_DTYPES hints.
+    """
+    return sights_from_dataframe(pd.read_csv(path, usecols=usecols, dtype={**CSV_DTYPES, **(dtype or {})}))
+
+
+def iter_sights_from_csv(path, chunksize: int = DEFAULT_CHUNK_ROWS, usecols: Optional[Sequence[str]] = None,
+                         dtype: Optional[Dict[str, str]] = None) -> Iterator[SightCollection]:
+    """Streams a large POI dump as SightCollection chunks of at most chunksize rows."""
+    with pd.read_csv(path, usecols=usecols, dtype={**CSV_DTYPES, **(dtype or {})}, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield sights_from_dataframe(chunk)
+
+
+def load_sights_from_csv(path, usecols: Optional[Sequence[str]] = None,
+                         dtype: Optional[Dict[str, str]] = None) -> List[Sight]:
+    """Sight objects for a CSV; see load_sights_collection for the columnar variant."""
+    return load_sights_collection(path, usecols=usecols, dtype=dtype).to_sights()
+
+
+def save_sights_to_csv(sights: Union[List[Sight], SightCollection], csv_path: Path,
+                       allow_overwrite_recommendations=False):
     if "sights_" in csv_path.name and not allow_overwrite_recommendations:
         raise ValueError(f"🚫 Refusing to overwrite recommended file: {csv_path}")
 
-    if not sights:
+    if not len(sights):
         print(f"⚠️ Not saving: zero sights to write.")
         return
 
-    data = [{
-        'name': s.name,
-        'longitude': s.location.x,
-        'latitude': s.location.y,
-        'category': s.category,
-        'weather_suitability': '|'.join(s.weather_suitability),
-        'description': s.description
-    } for s in sights]
-
-    df = pd.DataFrame(data)
+    collection = sights if isinstance(sights, SightCollection) else SightCollection.from_sights(sights)
+    df = pd.DataFrame({
+        'name': collection.names,
+        'longitude': collection.lon,
+        'latitude': collection.lat,
+        'category': np.asarray(collection.categories, dtype=object)[collection.category_codes],
+        'weather_suitability': collection.weather_strings(WEATHER_DELIMITER),
+        'description': collection.descriptions,
+    })
     df.to_csv(csv_path, index=False)
-    print(f"✅ Saved {len(sights)} sights to {csv_path}")
-
+    print(f"✅ Saved {len(collection)} sights to {csv_path}")
@@ -3,6 +3,7 @@
 import math
 from typing import List, Set
 from .sights import Sight #p
+from .sight_collection import SightCollection #p
 
 def is_valid_category(cat: str) -> bool:
     """
@@ -21,6 +22,10 @@ def get_available_categories(sights: List[Sight]) -> List[str]:
     """
     Return sorted list of unique, valid categories from sights.
     """
+    if isinstance(sights, SightCollection):
+        # Only look at the interned categories that are actually used
+        used = {sights.categories[c] for c in set(sights.category_codes.tolist())}
+        return sorted(str(c).strip() for c in used if is_valid_category(c))
     '''categories: Set[str] = set()
     for s in sights:
         if is_valid_category(s.category):
@@ -37,7 +42,11 @@ def get_available_categories(sights: List[Sight]) -> List[str]:
 def filter_sights_by_category(sights: List[Sight], selected_categories: List[str]) -> List[Sight]:
     """
     Filter the list of sights by the given categories.
+    A SightCollection is filtered on its category codes and stays a collection.
     """
+    if isinstance(sights, SightCollection):
+        valid = [c for c in selected_categories if is_valid_category(c)]
+        return sights.take(sights.in_categories(valid))
 
     filtered_sights = [
         s for s in sights
@@ -0,0 +1,114 @@
+# planner/forecast_cache.py
+# Persistent cache of slot forecasts ({"morning": ..., "afternoon": ..., "evening": ...}).
+# Keyed by the ~1 km grid cell of the location and the date, so every plan for
+# the same city and day is answered from a small SQLite file under cache/ instead
+# of Meteostat. Observed (past) days never change and are kept for long; days that
+# may still be updated expire after a few hours.
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from .geocoding import grid_cell #p
+
+CACHE_DIR = Path("cache")
+DEFAULT_DB_PATH = CACHE_DIR / "forecasts.sqlite"
+PAST_TTL_SECONDS = 365 * 24 * 3600     # observations are final
+CURRENT_TTL_SECONDS = 6 * 3600         # today and later: model data is refreshed
+UNKNOWN_TTL_SECONDS = 3600             # no data (yet) - retry now and then
+LOCATION_PRECISION = 2                 # 2 decimals ~ 1 km, finer than the station grid
+
+Forecast = Dict[str, str]
+
+
+def forecast_key(lat: float, lon: float, day: date) -> str:
+    return f"{grid_cell(lat, lon, LOCATION_PRECISION)}|{day.isoformat()}"
+
+
+class ForecastCache:
+    """SQLite-backed slot forecasts by rounded location and date."""
+
+    def __init__(self, path: Path = DEFAULT_DB_PATH):
+        self.path = path if str(path) == ":memory:" else Path(path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if isinstance(self.path, Path):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS forecasts ("
+                " key TEXT PRIMARY KEY,"
+                " forecast TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def ttl_for(day: date, forecast: Forecast) -> float:
+        if all(v == "unknown" for v in forecast.values()):
+            return UNKNOWN_TTL_SECONDS
+        return PAST_TTL_SECONDS if day < date.today() else CURRENT_TTL_SECONDS
+
+    def get(self, lat: float, lon: float, day: date) -> Optional[Forecast]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT forecast FROM forecasts WHERE key = ? AND expires_at > ?",
+                (forecast_key(lat, lon, day), time.time()),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, lat: float, lon: float, day: date, forecast: Forecast) -> None:
+        self.put_many(lat, lon, [(day, forecast)])
+
+    def put_many(self, lat: float, lon: float, entries: Iterable[Tuple[date, Forecast]]) -> None:
+        """Stores several (date, forecast) entries of one location in one transaction."""
+        now = time.time()
+        rows = [(forecast_key(lat, lon, day), json.dumps(forecast), now + self.ttl_for(day, forecast))
+                for day, forecast in entries]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO forecasts (key, forecast, expires_at) VALUES (?, ?, ?)", rows)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM forecasts").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM forecasts")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache: Optional[ForecastCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_forecast_cache() -> Optional[ForecastCache]:
+    """
+    Process-wide cache instance. The location can be set with WEATHER_CACHE;
+    set it to "off" to disable caching (returns None).
+    """
+    global _default_cache
+    location = os.environ.get("WEATHER_CACHE", str(DEFAULT_DB_PATH))
+    if location.lower() in ("off", "0", "false", ""):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None or _default_cache.path != Path(location):
+            _default_cache = ForecastCache(Path(location))
+        return _default_cache
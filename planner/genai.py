@@ -1,14 +1,13 @@
 # planner/genai.py
 from functools import lru_cache
 
-from transformers import pipeline
-
-# Load the LLM pipeline using Gemma
 from planner.narration_templates import TEMPLATES
 
 
 @lru_cache(maxsize=1)
 def get_narration_pipeline():
+    # Load the LLM pipeline using Gemma; transformers is only imported for LLM narration
+    from transformers import pipeline
     return pipeline(
         "text-generation",
         model="google/gemma-2-2b-it",
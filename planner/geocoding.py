@@ -0,0 +1,297 @@
+# planner/geocoding.py
+# Shared geocoding layer for the API, the CLI and the Streamlit frontend.
+# Lookups go through three levels: a warm in-memory set of known cities (no I/O
+# at all), a persistent SQLite cache under cache/ and finally Nominatim (via
+# OSMnx for forward lookups). Failures are cached too, for a shorter time, so a
+# misspelt city is not sent upstream on every request. Concurrent lookups of the
+# same name share one upstream call instead of racing each other.
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+import httpx
+
+from .tracing import span
+
+CACHE_DIR = Path("cache")
+DEFAULT_DB_PATH = CACHE_DIR / "geocode.sqlite"
+DEFAULT_TTL_SECONDS = 180 * 24 * 3600   # city centers practically never move
+NOT_FOUND_TTL_SECONDS = 24 * 3600       # unknown names, e.g. typos
+ERROR_TTL_SECONDS = 60                  # network errors / rate limits: just stop the hammering
+REVERSE_PRECISION = 3                   # 3 decimals ~ 100 m, clicks nearby share one lookup
+NOMINATIM_URL = os.environ.get("NOMINATIM_URL", "https://nominatim.openstreetmap.org")
+
+LatLon = Tuple[float, float]
+
+
+def grid_cell(lat: float, lon: float, decimals: int) -> str:
+    """
+    Index of the 10**-decimals degree grid cell around (lat, lon), for cache keys.
+    Every point of a cell gets the same key; formatting with f"{lat:.2f}" rounds
+    and can split points a few metres apart (13.405 -> "13.40", 13.4052 -> "13.41").
+    """
+    scale = 10 ** decimals
+    return f"{math.floor(lat * scale)},{math.floor(lon * scale)}"
+
+# Warm set: resolved without touching the cache file or the network
+KNOWN_CITIES: Dict[str, LatLon] = {
+    "paris": (48.8566, 2.3522),
+    "paris, france": (48.8566, 2.3522),
+    "berlin": (52.52, 13.405),
+    "berlin, germany": (52.52, 13.405),
+    "rome": (41.9028, 12.4964),
+    "rome, italy": (41.9028, 12.4964),
+}
+
+
+class GeocodingError(LookupError):
+    """A name could not be geocoded; not_found distinguishes unknown names from upstream errors."""
+
+    def __init__(self, message: str, not_found: bool = True):
+        super().__init__(message)
+        self.not_found = not_found
+
+
+def normalize_query(query: str) -> str:
+    """'  Paris,France ' and 'paris, france' share one cache entry."""
+    text = unicodedata.normalize("NFKC", query).casefold()
+    return ", ".join(" ".join(part.split()) for part in text.split(",") if part.strip())
+
+
+def osmnx_geocode(query: str) -> LatLon:
+    """ox.geocode; OSMnx (and its geopandas stack) is imported on the first upstream lookup only."""
+    import osmnx as ox
+    return ox.geocode(query)
+
+
+def _is_not_found(error: Exception) -> bool:
+    """OSMnx raises InsufficientResponseError for names Nominatim does not know."""
+    from osmnx._errors import InsufficientResponseError
+    return isinstance(error, InsufficientResponseError)
+
+
+def nominatim_reverse(lat: float, lon: float) -> Optional[str]:
+    """City (or town/village) name around a point from Nominatim's /reverse, None if there is none."""
+    import osmnx as ox
+    response = httpx.get(f"{NOMINATIM_URL.rstrip('/')}/reverse",
+                         params={"lat": lat, "lon": lon, "format": "jsonv2", "zoom": 10},
+                         headers={"User-Agent": ox.settings.http_user_agent}, timeout=10.0)
+    response.raise_for_status()
+    address = response.json().get("address", {})
+    for field in ("city", "town", "village", "municipality", "county"):
+        if address.get(field):
+            return address[field]
+    return None
+
+
+class Geocoder:
+    """
+    Forward (name -> (lat, lon)) and reverse ((lat, lon) -> city name) lookups.
+
+    Args:
+        path: SQLite cache file; ":memory:" keeps the cache per process.
+        forward: Callable name -> (lat, lon); raises OSMnx's InsufficientResponseError for unknown names.
+        reverse: Callable (lat, lon) -> name or None.
+        known: Extra warm entries on top of KNOWN_CITIES.
+        ttl_seconds / not_found_ttl_seconds / error_ttl_seconds: Lifetime of
+            results, of "not found" answers and of other failures.
+    """
+
+    def __init__(self,
+                 path: Path = DEFAULT_DB_PATH,
+                 forward: Callable[[str], LatLon] = osmnx_geocode,
+                 reverse: Callable[[float, float], Optional[str]] = nominatim_reverse,
+                 known: Optional[Mapping[str, LatLon]] = None,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 not_found_ttl_seconds: float = NOT_FOUND_TTL_SECONDS,
+                 error_ttl_seconds: float = ERROR_TTL_SECONDS):
+        self.path = path if str(path) == ":memory:" else Path(path)
+        self.forward = forward
+        self.reverse_lookup = reverse
+        self.known: Dict[str, LatLon] = {}
+        self.warm(KNOWN_CITIES)
+        self.warm(known or {})
+        self.ttl_seconds = ttl_seconds
+        self.not_found_ttl_seconds = not_found_ttl_seconds
+        self.error_ttl_seconds = error_ttl_seconds
+        self.known_hits = 0
+        self.cache_hits = 0
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+
+        if isinstance(self.path, Path):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocodes ("
+                " key TEXT PRIMARY KEY,"
+                " lat REAL,"
+                " lon REAL,"
+                " name TEXT,"
+                " error TEXT,"
+                " not_found INTEGER NOT NULL DEFAULT 0,"
+                " expires_at REAL NOT NULL)"
+            )
+
+    def warm(self, entries: Mapping[str, LatLon]) -> None:
+        """Adds name -> (lat, lon) entries that resolve without any I/O (e.g. bundled cities)."""
+        for name, (lat, lon) in entries.items():
+            self.known[normalize_query(name)] = (float(lat), float(lon))
+
+    # --------- Cache rows ------------------------------------------------------
+    def _get_row(self, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT lat, lon, name, error, not_found FROM geocodes WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+            if row is not None:
+                self.cache_hits += 1
+        return row
+
+    def _put_row(self, key: str, ttl: float, lat=None, lon=None, name=None, error=None, not_found=False):
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO geocodes (key, lat, lon, name, error, not_found, expires_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, lat, lon, name, error, int(not_found), time.time() + ttl),
+                )
+
+    @staticmethod
+    def _raise_cached(row, query: str):
+        raise GeocodingError(f"Could not geocode '{query}': {row[3]}", not_found=bool(row[4]))
+
+    def _coalesced(self, key: str, lookup: Callable):
+        """Runs lookup() once per key at a time; concurrent callers wait for its result."""
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+        try:
+            result = lookup()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    # --------- Forward ---------------------------------------------------------
+    def geocode(self, query: str) -> LatLon:
+        """(lat, lon) for a place name; raises GeocodingError (also for cached failures)."""
+        key = normalize_query(query)
+        if key in self.known:
+            with self._lock:
+                self.known_hits += 1
+            return self.known[key]
+        row = self._get_row(f"fwd|{key}")
+        if row is not None:
+            return (row[0], row[1]) if row[3] is None else self._raise_cached(row, query)
+        return self._coalesced(f"fwd|{key}", lambda: self._geocode_upstream(query, f"fwd|{key}"))
+
+    def _geocode_upstream(self, query: str, key: str) -> LatLon:
+        row = self._get_row(key)  # A lookup that finished just before we became the owner
+        if row is not None:
+            return (row[0], row[1]) if row[3] is None else self._raise_cached(row, query)
+        with self._lock:
+            self.upstream_calls += 1
+        try:
+            with span("geocode.upstream"):
+                lat, lon = self.forward(query)
+        except Exception as e:
+            if _is_not_found(e):
+                self._put_row(key, self.not_found_ttl_seconds, error=str(e) or "not found", not_found=True)
+                raise GeocodingError(f"Could not geocode '{query}': {e}") from e
+            self._put_row(key, self.error_ttl_seconds, error=f"{type(e).__name__}: {e}")
+            raise GeocodingError(f"Could not geocode '{query}': {e}", not_found=False) from e
+        self._put_row(key, self.ttl_seconds, lat=float(lat), lon=float(lon))
+        return float(lat), float(lon)
+
+    async def geocode_async(self, query: str) -> LatLon:
+        """geocode() for the event loop: warm/cached names answer inline, upstream calls run in a thread."""
+        key = normalize_query(query)
+        if key in self.known:
+            with self._lock:
+                self.known_hits += 1
+            return self.known[key]
+        return await asyncio.to_thread(self.geocode, query)
+
+    # --------- Reverse ---------------------------------------------------------
+    def reverse(self, lat: float, lon: float) -> Optional[str]:
+        """City name around (lat, lon), None if there is none or the lookup failed."""
+        key = f"rev|{grid_cell(lat, lon, REVERSE_PRECISION)}"
+        row = self._get_row(key)
+        if row is None:
+            try:
+                return self._coalesced(key, lambda: self._reverse_upstream(lat, lon, key))
+            except GeocodingError:
+                return None
+        return row[2] if row[3] is None else None
+
+    def _reverse_upstream(self, lat: float, lon: float, key: str) -> Optional[str]:
+        row = self._get_row(key)
+        if row is not None:
+            return row[2] if row[3] is None else None
+        with self._lock:
+            self.upstream_calls += 1
+        try:
+            with span("geocode.reverse_upstream"):
+                name = self.reverse_lookup(lat, lon)
+        except Exception as e:
+            self._put_row(key, self.error_ttl_seconds, error=f"{type(e).__name__}: {e}")
+            raise GeocodingError(f"Could not reverse geocode ({lat}, {lon}): {e}", not_found=False) from e
+        # "No city here" is a definite answer as well, but may change as OSM is edited
+        self._put_row(key, self.ttl_seconds if name else self.not_found_ttl_seconds, name=name)
+        return name
+
+    def clear(self) -> None:
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM geocodes")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_default_geocoder: Optional[Geocoder] = None
+_default_geocoder_lock = threading.Lock()
+
+
+def get_geocoder() -> Geocoder:
+    """
+    Process-wide geocoder. The cache location can be set with GEOCODE_CACHE;
+    "off" keeps results in memory only.
+    """
+    global _default_geocoder
+    location = os.environ.get("GEOCODE_CACHE", str(DEFAULT_DB_PATH))
+    path = ":memory:" if location.lower() in ("off", "0", "false", "") else Path(location)
+    with _default_geocoder_lock:
+        if _default_geocoder is None or str(_default_geocoder.path) != str(path):
+            _default_geocoder = Geocoder(path)
+        return _default_geocoder
+
+
+def geocode(query: str) -> LatLon:
+    """Drop-in for ox.geocode that goes through the shared cache."""
+    return get_geocoder().geocode(query)
@@ -1,16 +1,19 @@
-import time
+from __future__ import annotations
 
-import folium
-from typing import List, Dict, Any, Tuple, Optional
+import asyncio
 
-import requests
+from typing import TYPE_CHECKING, List, Dict, Any, Tuple, Optional
 
-from .net import get_with_backoff    #p
+from .net import get_with_backoff, get_json_async, OSRM_BASE_URL, OSRM_PROFILE_MAP    #p
+from .route_cache import get_leg_cache #p
 
 from typing import Union
 from shapely.geometry import Point
 from .sights import Sight # p
 from .tour_planner_orchestrator import haversine
+
+if TYPE_CHECKING:
+    import folium  # Imported by the map functions themselves, routing for /plan does not need it
 ICON_MAP = {
     "Cafe": {"icon": "coffee", "prefix": "fa", "color": "darkgreen"},
     "Restaurant": {"icon": "cutlery", "prefix": "fa", "color": "darkpurple"},
@@ -25,13 +28,6 @@ ICON_MAP = {
     "default": {"icon": "star", "prefix": "fa", "color": "gray"}
 }
 
-# Define a mapping for OSRM profiles
-OSRM_PROFILE_MAP = {
-    "walking": "foot",
-    "cycling": "bike",
-    "driving": "car"
-}
-
 
 # get_route_details (used by original get_total_tour_length)
 # This is the helper for the original get_total_tour_length,
@@ -46,9 +42,16 @@ def get_route_details(start_location: Point, end_location: Point, mode: str = "w
         print(f"Error: Invalid Point objects for routing: start={start_location}, end={end_location}")
         return None
 
-    coordinates = f"{start_location.x},{start_location.y};{end_location.x},{end_location.y}"
     profile = OSRM_PROFILE_MAP.get(mode, "foot")
-    base = f"http://router.project-osrm.org/route/v1/{profile}/"
+    leg = [(start_location.x, start_location.y), (end_location.x, end_location.y)]
+    cache = get_leg_cache()
+    if cache is not None:
+        cached = cache.get(profile, leg)
+        if cached is not None:
+            return {"distance": cached["distance"], "duration": cached["duration"]}
+
+    coordinates = f"{start_location.x},{start_location.y};{end_location.x},{end_location.y}"
+    base = f"{OSRM_BASE_URL}/route/v1/{profile}/"
     url = f"{base}{coordinates}?overview=false&alternatives=false&steps=false"
 
     try:
@@ -59,35 +62,20 @@ def get_route_details(start_location: Point, end_location: Point, mode: str = "w
         route = data["routes"][0]
         distance = route.get("distance")
         duration = route.get("duration")
+        if cache is not None and distance is not None and duration is not None:
+            cache.put(profile, leg, distance, duration)
         return {"distance": distance, "duration": duration}
     except Exception as e:
         print(f"Warning: Could not get route details from {start_location} to {end_location}: {e}")
         return None
 
-def get_with_backoff(url: str, max_retries: int = 5, initial_delay: float = 1.0) -> Dict[str, Any]:
-    """
-    Fetches data from a URL with exponential backoff for retries.
-    """
-    for i in range(max_retries):
-        try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            if i < max_retries - 1:
-                delay = initial_delay * (2 ** i)
-                print(f"Request failed: {e}. Retrying in {delay:.2f} seconds...")
-                time.sleep(delay)
-            else:
-                raise # Re-raise the last exception if all retries fail
-    return {} # Should not be reached, but for type hinting
-
 def add_sight_markers(fmap: folium.Map, sights: List[Sight], color: str = "blue") -> None:
     """
     Adds markers for a list of Sight objects to an existing folium map.
     Markers use specific icons based on sight category, falling back to a default.
     The 'color' argument to this function is used for the icon's base color.
     """
+    import folium
     for s in sights:
         if isinstance(s.location, Point):
             # Get icon settings based on sight category
@@ -124,13 +112,48 @@ def get_osrm_route(coords: List[Tuple[float, float]], mode: str = "walking") ->
         return None
 
     profile = OSRM_PROFILE_MAP.get(mode, "foot")
-    base = f"http://router.project-osrm.org/route/v1/{profile}/"
+    cached = _cached_route(profile, coords)
+    if cached is not None:
+        return cached
+
+    data = get_with_backoff(_route_url(profile, coords))
+    return _route_from_response(data, profile, coords)
+
+
+async def get_osrm_route_async(coords: List[Tuple[float, float]], mode: str = "walking") -> Union[dict, None]:
+    """
+    Non-blocking get_osrm_route for use inside the event loop: same cache and
+    response handling, fetched through the shared pooled async client.
+    """
+    if len(coords) < 2:
+        return None
+
+    profile = OSRM_PROFILE_MAP.get(mode, "foot")
+    cached = _cached_route(profile, coords)
+    if cached is not None:
+        return cached
+
+    data = await get_json_async(_route_url(profile, coords))
+    return _route_from_response(data, profile, coords)
 
+
+def _cached_route(profile: str, coords: List[Tuple[float, float]]) -> Optional[dict]:
+    # Served from the persistent leg cache when this exact stop sequence was routed before
+    cache = get_leg_cache()
+    if cache is not None:
+        cached = cache.get(profile, coords, need_geometry=True)
+        if cached is not None:
+            return _route_feature(cached["geometry"], cached["distance"], cached["duration"])
+    return None
+
+
+def _route_url(profile: str, coords: List[Tuple[float, float]]) -> str:
+    base = f"{OSRM_BASE_URL}/route/v1/{profile}/"
     coord_str = ";".join(f"{lon},{lat}" for lon, lat in coords)
-    url = f"{base}{coord_str}?overview=full&geometries=geojson"
+    return f"{base}{coord_str}?overview=full&geometries=geojson"
 
-    data = get_with_backoff(url)
 
+def _route_from_response(data: dict, profile: str, coords: List[Tuple[float, float]]) -> Optional[dict]:
     # DEBUG LINE (keep for now, or remove if you're confident)
     # print(f"DEBUG: OSRM data for {coords}: {data}")
 
@@ -147,10 +170,22 @@ def get_osrm_route(coords: List[Tuple[float, float]], mode: str = "walking") ->
     distance = route.get("distance", 0.0)
     duration = route.get("duration", 0.0)
 
+    cache = get_leg_cache()
+    if cache is not None:
+        # The full sequence with its geometry, plus every leg's distance/duration
+        entries = [(coords, distance, duration, route_coords)]
+        for (start, end), leg in zip(zip(coords, coords[1:]), route.get("legs", [])):
+            entries.append(([start, end], leg.get("distance", 0.0), leg.get("duration", 0.0), None))
+        cache.put_many(profile, entries)
+
     # return the geojson feature with populated properties
+    return _route_feature(route_coords, distance, duration)
+
+
+def _route_feature(route_coords, distance: float, duration: float) -> dict:
     return {
         "type": "Feature",
-        "geometry": {"type": "LineString", "coordinates": route_coords},
+        "geometry": {"type": "LineString", "coordinates": [list(c) for c in route_coords]},
         "properties": {
             "distance": distance,
             "duration": duration
@@ -170,6 +205,7 @@ def add_route_and_markers_to_map(
     """
     if not sights:
         return  # nothing to add
+    import folium
 
     add_sight_markers(fmap, sights, color=color) # This will now apply category-specific icons
 
@@ -188,6 +224,7 @@ def add_route_and_markers_to_map(
 
 def plot_full_day_tour(tour_plan: Dict[str, List[Sight]], city_center: Point, mode: str = "walking") -> folium.Map: # Add mode here    # city_center is a shapely Point object
     # city_center is a shapely Point object
+    import folium
     city_center_latlon = (city_center.y, city_center.x)
     fmap = folium.Map(location=city_center_latlon, zoom_start=14)
 
@@ -203,6 +240,8 @@ def plot_full_day_tour(tour_plan: Dict[str, List[Sight]], city_center: Point, mo
     return fmap
 
 def plot_route_with_sights(sights: List[Sight], city_center: Point, mode: str = "walking", route_color: str = "blue") -> folium.Map:
+    import folium
+
     def create_map(center: Point, sights: List[Sight], zoom: int = 14) -> folium.Map:
         """
         Creates a Folium map centered on the city_center with sights marked.
@@ -242,6 +281,15 @@ def plot_route_with_sights(sights: List[Sight], city_center: Point, mode: str =
     return fmap
 
 
+async def _route_or_none(coords: List[Tuple[float, float]], mode: str) -> Optional[dict]:
+    """One failing leg (timeout, open circuit, ...) must not fail the whole plan."""
+    try:
+        return await get_osrm_route_async(coords, mode=mode)
+    except Exception as e:
+        print(f"Warning: Could not route {len(coords)} points ({mode}): {e}")
+        return None
+
+
 async def generate_information_full_day_tour(
         tour_plan: Dict[str, List[Sight]],
         city_center: Point,
@@ -275,7 +323,6 @@ async def generate_information_full_day_tour(
     # Initialize results for the overall tour
     total_length_meters = 0.0
     total_duration_seconds = 0.0
-    full_route_geojson_coords = [] # To build the full day's route coordinates
     message = "Tour information generated successfully."
 
     # Initialize results for individual subtours
@@ -301,9 +348,22 @@ async def generate_information_full_day_tour(
         all_tour_points.append(city_center) # Return to city center
 
     coords_for_osrm_full_tour = [(p.x, p.y) for p in all_tour_points]
+    subtour_coords = {
+        slot: [(s.location.x, s.location.y) for s in tour_plan.get(slot, []) if s.location]
+        for slot in ordered_slots
+    }
 
+    # Fetch the full-day route and all slot subtours concurrently instead of one after another
+    routed_slots = [slot for slot in ordered_slots if len(subtour_coords[slot]) >= 2]
+    routes = await asyncio.gather(
+        _route_or_none(coords_for_osrm_full_tour, mode),
+        *(_route_or_none(subtour_coords[slot], mode) for slot in routed_slots)
+    )
+    full_tour_route_info = routes[0]
+    slot_routes = dict(zip(routed_slots, routes[1:]))
+
+    full_route_geojson = None
     if len(coords_for_osrm_full_tour) >= 2:
-        full_tour_route_info = get_osrm_route(coords_for_osrm_full_tour, mode=mode)
         if full_tour_route_info:
             total_length_meters = full_tour_route_info['properties'].get("distance", 0.0)
             total_duration_seconds = full_tour_route_info['properties'].get("duration", 0.0)
@@ -316,19 +376,10 @@ async def generate_information_full_day_tour(
     total_subtour_length_meters = 0.0
     # --- Calculate individual subtour lengths and total subtour length ---
     for slot in ordered_slots:
-        sights_in_slot = tour_plan.get(slot, [])
-        slot_points = [s.location for s in sights_in_slot if s.location]
+        slot_points = subtour_coords[slot]
 
         if len(slot_points) >= 2: # Need at least 2 points for a route within the slot
-            coords_for_osrm_subtour = [(p.x, p.y) for p in slot_points]
-            print(
-                f"DEBUG: Calling get_osrm_route with coords: {coords_for_osrm_subtour}, mode: {mode}")  # Add this line
-            slot_route_info = get_osrm_route(coords_for_osrm_subtour, mode=mode) # Pass the converted list
-            if slot_route_info:
-                current_slot_length = slot_route_info['properties'].get("distance", 0.0)
-                print(f"DEBUG: Length for slot {slot}: {current_slot_length}")  # Add this line
-            else:
-                current_slot_length = 0.0
+            slot_route_info = slot_routes.get(slot)
             if slot_route_info:
                 current_slot_length = slot_route_info['properties'].get("distance", 0.0)
                 current_slot_duration = slot_route_info['properties'].get("duration", 0.0)
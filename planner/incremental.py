@@ -0,0 +1,174 @@
+# planner/incremental.py
+# Incremental re-planning.
+# Adding or removing one sight changes one slot, so re-solving the whole day is
+# wasted work. A removed sight is cut out of its slot; an added one goes to the
+# slot and position where it costs least (cheapest insertion over the slots
+# whose weather suits it). Only the changed slots are then repaired with
+# 2-opt/Or-opt. If a repaired slot ends up clearly worse than before (gap to
+# its spanning-tree bound) or the slots get unbalanced, the plan is solved from
+# scratch instead.
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from .aware_tour import is_weather_suitable
+from .base_planner import create_weather_aware_tour
+from .optimize import one_tree_lower_bound, or_opt, tour_length, two_opt
+from .tour_planner_orchestrator import build_distance_matrix, haversine, plan_citytour_iterative
+
+REPLAN_GAP_TOLERANCE = 0.10       # allowed rise of a slot's optimality gap before re-solving
+MAX_SLOT_IMBALANCE = 2.0          # largest slot vs. the average slot size
+MAX_INCREMENTAL_FRACTION = 0.25   # deltas touching more of the plan are re-solved right away
+
+
+def slot_matrix(sights: Sequence, matrix_provider=None) -> np.ndarray:
+    """
+    Cost matrix of a slot plus a free node 0 at zero cost to every sight: a
+    closed tour through node 0 is an open path through the slot, so the
+    closed-tour tools in planner/optimize.py apply unchanged.
+    """
+    n = len(sights)
+    dist = np.zeros((n + 1, n + 1))
+    if n > 1:
+        dist[1:, 1:] = matrix_provider.matrix(sights) if matrix_provider is not None else build_distance_matrix(sights)
+    return dist
+
+
+def path_gap(dist: np.ndarray, tour: Sequence[int]) -> float:
+    """Relative gap of a slot path (tour through the free node 0) to its MST lower bound."""
+    length = tour_length(dist, tour)
+    if length <= 0:
+        return 0.0
+    return max(0.0, (length - one_tree_lower_bound(dist)) / length)
+
+
+def repair_slot(dist: np.ndarray) -> List[int]:
+    """2-opt/Or-opt repair of a slot path in its current order (dist from slot_matrix); returns the tour."""
+    return or_opt(dist, two_opt(dist, list(range(len(dist)))))
+
+
+def haversine_path_length(tour_plan: Dict[str, List]) -> float:
+    """Sum of the slot path lengths, the haversine_total_subtour_length_meters of get_route."""
+    return sum(haversine(a.location, b.location)
+               for slot in tour_plan.values() for a, b in zip(slot, slot[1:]))
+
+
+def _costs_from(sight, sights: Sequence, matrix_provider=None) -> np.ndarray:
+    """Row of sight against sights in the slot_matrix costs."""
+    if not sights:
+        return np.zeros(0)
+    if matrix_provider is not None:
+        return matrix_provider.costs_from(sight, sights)
+    return build_distance_matrix([sight, *sights])[0, 1:]
+
+
+def _cheapest_insertion(tour_plan: Dict[str, List], matrices: Dict[str, np.ndarray], sight,
+                        forecast: Dict[str, str], matrix_provider=None):
+    """
+    (slot, position, slot_matrix of the slot with the sight inserted) of the
+    cheapest insertion. The slot matrices in `matrices` are extended by the
+    sight's costs, which are fetched once for all candidate slots.
+    """
+    slots = [slot for slot in tour_plan if is_weather_suitable(sight, forecast.get(slot, "any"))] or list(tour_plan)
+    row = _costs_from(sight, [s for slot in slots for s in tour_plan[slot]], matrix_provider)
+    best = None
+    offset = 0
+    for slot in slots:
+        members = tour_plan[slot]
+        new = len(members) + 1
+        dist = np.zeros((new + 1, new + 1))
+        dist[:new, :new] = matrices[slot]
+        dist[1:new, new] = dist[new, 1:new] = row[offset:offset + len(members)]
+        offset += len(members)
+        path = list(range(new))  # 0 is the free node, so both path ends are included
+        nxt = path[1:] + path[:1]
+        costs = dist[path, new] + dist[new, nxt] - dist[path, nxt]
+        pos = int(np.argmin(costs))
+        key = (float(costs[pos]), len(members))  # ties go to the smaller slot
+        if best is None or key < best[0]:
+            best = (key, slot, pos, dist)
+    _, slot, pos, dist = best
+    new = len(dist) - 1
+    order = list(range(pos + 1)) + [new] + list(range(pos + 1, new))
+    return slot, pos, dist[np.ix_(order, order)]
+
+
+def _full_solve(sights: List, forecast: Dict[str, str], city_center, strategy: str, mode: str,
+                matrix_provider, time_budget_ms: Optional[float]) -> Dict[str, List]:
+    if strategy == "aware":
+        return create_weather_aware_tour(sights, forecast, city_center, mode=mode)
+    return plan_citytour_iterative(sights=sights, city_center=city_center, weather_forecast=forecast,
+                                   time_budget_ms=time_budget_ms, matrix_provider=matrix_provider)
+
+
+def replan_with_delta(tour_plan: Dict[str, List],
+                      forecast: Dict[str, str],
+                      city_center,
+                      added: Iterable = (),
+                      removed: Iterable[str] = (),
+                      strategy: str = "iterative",
+                      mode: str = "walking",
+                      matrix_provider=None,
+                      time_budget_ms: Optional[float] = None,
+                      gap_tolerance: float = REPLAN_GAP_TOLERANCE) -> Dict:
+    """
+    Applies added sights and removed sight names to a slot plan.
+
+    strategy names the planner used for the fallback full solve ("iterative"
+    or "aware"). Returns {"tour_plan", "method" ("unchanged", "incremental" or
+    "full"), "reason", "affected_slots", "elapsed_ms"}.
+    """
+    start = time.perf_counter()
+    plan = {slot: list(sights) for slot, sights in tour_plan.items()}
+    planned = {s.name for sights in plan.values() for s in sights}
+    removed = {name for name in removed if name in planned}
+    added = [s for s in {s.name: s for s in added if s.name not in planned}.values()]
+
+    def result(method, reason=None, affected=()):
+        return {"tour_plan": plan, "method": method, "reason": reason, "affected_slots": sorted(affected),
+                "elapsed_ms": (time.perf_counter() - start) * 1000}
+
+    if not added and not removed:
+        return result("unchanged")
+
+    remaining = [s for sights in plan.values() for s in sights if s.name not in removed]
+    reason = None
+    if len(added) + len(removed) > MAX_INCREMENTAL_FRACTION * max(1, len(planned)):
+        reason = f"{len(added) + len(removed)} changes exceed {MAX_INCREMENTAL_FRACTION:.0%} of the plan"
+    elif not plan:
+        reason = "empty plan"
+
+    affected = set()
+    if reason is None:
+        matrices = {slot: slot_matrix(sights, matrix_provider) for slot, sights in plan.items()}
+        gaps_before = {slot: path_gap(dist, list(range(len(dist)))) for slot, dist in matrices.items()}
+        for slot, sights in plan.items():
+            if any(s.name in removed for s in sights):
+                keep = [0] + [i + 1 for i, s in enumerate(sights) if s.name not in removed]
+                plan[slot] = [s for s in sights if s.name not in removed]
+                matrices[slot] = matrices[slot][np.ix_(keep, keep)]
+                affected.add(slot)
+        for sight in added:
+            slot, pos, matrices[slot] = _cheapest_insertion(plan, matrices, sight, forecast, matrix_provider)
+            plan[slot].insert(pos, sight)
+            affected.add(slot)
+
+        for slot in affected:
+            tour = repair_slot(matrices[slot])
+            plan[slot] = [plan[slot][i - 1] for i in tour[1:]]
+            gap_after = path_gap(matrices[slot], tour)
+            if gap_after > gaps_before[slot] + gap_tolerance:
+                reason = f"slot '{slot}' gap rose from {gaps_before[slot]:.2f} to {gap_after:.2f}"
+                break
+
+        sizes = [len(sights) for sights in plan.values()]
+        average = sum(sizes) / len(sizes)
+        if reason is None and max(sizes) > 2 and max(sizes) > MAX_SLOT_IMBALANCE * average:
+            reason = f"unbalanced slots {sizes}"
+
+    if reason is None:
+        return result("incremental", affected=affected)
+
+    plan = _full_solve(remaining + added, forecast, city_center, strategy, mode, matrix_provider, time_budget_ms)
+    return result("full", reason, affected=plan.keys())
@@ -0,0 +1,187 @@
+# planner/matrix_provider.py
+# Cost matrices for the TSP engines.
+# The solvers only see an n x n ndarray, so they can optimise on haversine
+# distance or on real walking/cycling/driving distance or time from OSRM's
+# /table service. Providers are asked once per sight set (for_sights) and the
+# weather groups then take sub-matrices of that result.
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .net import OSRM_BASE_URL, OSRM_PROFILE_MAP, get_with_backoff #p
+from .tour_planner_orchestrator import build_distance_matrix, haversine_matrix, sight_coordinates #p
+
+# The public demo server rejects /table requests with more than 100 coordinates
+MAX_TABLE_COORDS = 100
+
+# Rough speeds (m/s) and detour factor used when OSRM cannot route a pair
+FALLBACK_SPEEDS = {"walking": 1.4, "cycling": 4.2, "driving": 8.3}
+DETOUR_FACTOR = 1.3
+
+
+class MatrixProvider(ABC):
+    @abstractmethod
+    def matrix(self, sights: Sequence) -> np.ndarray:
+        """Cost matrix (n x n) the solvers optimise on."""
+
+    def for_sights(self, sights: Sequence) -> "MatrixProvider":
+        """
+        Computes the matrix for the whole sight set once and returns a provider
+        that answers every subset with a sub-matrix (no further work or requests).
+        """
+        return PrecomputedMatrixProvider(self.matrix(sights), sights)
+
+    def costs_from(self, sight, sights: Sequence) -> np.ndarray:
+        """Costs from sight to each of sights (its row of the matrix; every matrix here is symmetric)."""
+        return self.matrix([sight, *sights])[0, 1:]
+
+
+class HaversineMatrixProvider(MatrixProvider):
+    """Great-circle distance in kilometres (the default)."""
+
+    def matrix(self, sights: Sequence) -> np.ndarray:
+        return build_distance_matrix(sights)
+
+
+class PrecomputedMatrixProvider(MatrixProvider):
+    """Wraps a full matrix; subsets are looked up by sight (Sight hashes by name)."""
+
+    def __init__(self, full_matrix: np.ndarray, sights: Sequence):
+        self.full_matrix = np.asarray(full_matrix, dtype=np.float64)
+        self.index = {s: i for i, s in enumerate(sights)}
+
+    def matrix(self, sights: Sequence) -> np.ndarray:
+        idx = np.fromiter((self.index[s] for s in sights), dtype=np.intp, count=len(sights))
+        return self.full_matrix[np.ix_(idx, idx)]
+
+    def costs_from(self, sight, sights: Sequence) -> np.ndarray:
+        idx = np.fromiter((self.index[s] for s in sights), dtype=np.intp, count=len(sights))
+        return self.full_matrix[self.index[sight], idx]
+
+    def for_sights(self, sights: Sequence) -> "MatrixProvider":
+        if all(s in self.index for s in sights):
+            return self
+        raise KeyError("Precomputed matrix does not cover all requested sights.")
+
+
+class OSRMTableProvider(MatrixProvider):
+    """
+    Road-network matrices from OSRM's /table service.
+
+    One request covers the whole sight set when it fits into `max_coords`,
+    larger sets are split into source/destination blocks so that no request
+    exceeds the server's coordinate limit.
+
+    Args:
+        mode: "walking", "cycling" or "driving".
+        metric: "duration" (seconds) or "distance" (metres) - what matrix() returns.
+        base_url: OSRM server, e.g. a local stand-in (defaults to OSRM_BASE_URL).
+        max_coords: Coordinate limit per request.
+        fetch: Callable url -> parsed JSON; injectable for recorded fixtures.
+    """
+
+    def __init__(self,
+                 mode: str = "walking",
+                 metric: str = "duration",
+                 base_url: Optional[str] = None,
+                 max_coords: int = MAX_TABLE_COORDS,
+                 fetch: Callable[[str], dict] = get_with_backoff):
+        if metric not in ("duration", "distance"):
+            raise ValueError("metric must be 'duration' or 'distance'")
+        if max_coords < 2:
+            raise ValueError("max_coords must be at least 2")
+        self.mode = mode
+        self.metric = metric
+        self.profile = OSRM_PROFILE_MAP.get(mode, "foot")
+        self.base_url = (base_url or OSRM_BASE_URL).rstrip("/")
+        self.max_coords = max_coords
+        self.fetch = fetch
+        self.requests_made = 0
+
+    def matrix(self, sights: Sequence) -> np.ndarray:
+        """
+        The chosen metric, symmetrised ((A + A.T) / 2): road legs differ slightly
+        per direction, but 2-opt reverses segments and assumes symmetric costs.
+        """
+        distances, durations = self.tables(sight_coordinates(sights))
+        chosen = durations if self.metric == "duration" else distances
+        return (chosen + chosen.T) / 2.0
+
+    def tables(self, coords: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (distances in metres, durations in seconds) for (lat, lon) rows.
+        Unroutable pairs are filled with a haversine-based estimate.
+        """
+        coords = np.asarray(coords, dtype=np.float64)
+        n = len(coords)
+        distances = np.full((n, n), np.nan)
+        durations = np.full((n, n), np.nan)
+        if n == 0:
+            return distances, durations
+
+        if n <= self.max_coords:
+            blocks = [np.arange(n)]
+        else:
+            block_size = self.max_coords // 2
+            blocks = [np.arange(i, min(i + block_size, n)) for i in range(0, n, block_size)]
+
+        for src in blocks:
+            for dst in blocks:
+                self._fetch_block(coords, src, dst, distances, durations)
+
+        self._fill_unroutable(coords, distances, durations)
+        np.fill_diagonal(distances, 0.0)
+        np.fill_diagonal(durations, 0.0)
+        return distances, durations
+
+    def _fetch_block(self, coords: np.ndarray, src: np.ndarray, dst: np.ndarray,
+                     distances: np.ndarray, durations: np.ndarray) -> None:
+        same = src is dst
+        points = src if same else np.concatenate([src, dst])
+        coord_str = ";".join(f"{coords[i, 1]:.6f},{coords[i, 0]:.6f}" for i in points)  # OSRM wants lon,lat
+        url = f"{self.base_url}/table/v1/{self.profile}/{coord_str}?annotations=distance,duration"
+        if not same:
+            sources = ";".join(str(i) for i in range(len(src)))
+            destinations = ";".join(str(i) for i in range(len(src), len(points)))
+            url += f"&sources={sources}&destinations={destinations}"
+
+        data = self.fetch(url)
+        self.requests_made += 1
+        if data.get("code") != "Ok":
+            raise RuntimeError(f"OSRM /table failed: {data.get('code')} {data.get('message', '')}")
+
+        block = np.ix_(src, dst)
+        distances[block] = _to_array(data.get("distances"), len(src), len(dst))
+        durations[block] = _to_array(data.get("durations"), len(src), len(dst))
+
+    def _fill_unroutable(self, coords: np.ndarray, distances: np.ndarray, durations: np.ndarray) -> None:
+        missing = np.isnan(distances) | np.isnan(durations)
+        if not missing.any():
+            return
+        estimate_m = haversine_matrix(coords) * 1000 * DETOUR_FACTOR
+        speed = FALLBACK_SPEEDS.get(self.mode, FALLBACK_SPEEDS["walking"])
+        distances[np.isnan(distances)] = estimate_m[np.isnan(distances)]
+        durations[np.isnan(durations)] = (estimate_m / speed)[np.isnan(durations)]
+
+
+def _to_array(rows: Optional[List[List[Optional[float]]]], n_rows: int, n_cols: int) -> np.ndarray:
+    """OSRM returns null for unroutable pairs; those become NaN."""
+    if rows is None:
+        return np.full((n_rows, n_cols), np.nan)
+    return np.array([[np.nan if v is None else v for v in row] for row in rows], dtype=np.float64)
+
+
+MATRIX_PROVIDERS: Dict[str, Callable[[str], MatrixProvider]] = {
+    "haversine": lambda mode: HaversineMatrixProvider(),
+    "distance": lambda mode: OSRMTableProvider(mode=mode, metric="distance"),
+    "duration": lambda mode: OSRMTableProvider(mode=mode, metric="duration"),
+}
+
+
+def get_matrix_provider(cost: str, mode: str = "walking") -> MatrixProvider:
+    """Provider for a cost name: "haversine", "distance" (road metres) or "duration" (seconds)."""
+    try:
+        return MATRIX_PROVIDERS[cost](mode)
+    except KeyError:
+        raise ValueError(f"Unknown cost '{cost}'. Available: {sorted(MATRIX_PROVIDERS)}")
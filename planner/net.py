@@ -1,24 +1,264 @@
-# planner/net.py  (new tiny helper)
-import time, requests
-from requests.exceptions import HTTPError
+# planner/net.py  (shared HTTP client for all OSRM traffic)
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
 
-def get_with_backoff(url: str,
-                     max_retries: int = 5,
-                     backoff: float = 1.5) -> dict:
+import httpx
+
+from .tracing import inc #p
+
+# Point this at a local OSRM instance (or a stand-in) to avoid the public demo server
+OSRM_BASE_URL = os.environ.get("OSRM_BASE_URL", "http://router.project-osrm.org")
+
+# Define a mapping for OSRM profiles
+OSRM_PROFILE_MAP = {
+    "walking": "foot",
+    "cycling": "bike",
+    "driving": "car"
+}
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without touching the network while the breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds; then lets one probe through (half-open), closes
+    again if it succeeds and re-opens if it fails. Other callers are rejected
+    while the probe is in flight, so a recovering server is not hit by every
+    queued request at once.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """Raises CircuitOpenError if the call may not go out; True if the caller is the half-open probe."""
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"OSRM circuit open after {self.failures} failures, "
+                                       f"retry in {self.reset_timeout:.0f}s")
+            if self._probing:
+                raise CircuitOpenError("OSRM circuit half-open, waiting for the probe request")
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def release_probe(self) -> None:
+        """The probe ended without an answer about the server (cancelled, rejected request): let another one try."""
+        with self._lock:
+            self._probing = False
+
+
+def _backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[str] = None) -> float:
+    """Full-jitter exponential back-off, honouring a numeric Retry-After header."""
+    if retry_after:
+        try:
+            return min(cap, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class OSRMClient:
     """
-    GET `url` with exponential back-off for 429 / 5xx answers.
-    Returns response.json().
+    Pooled HTTP client with keep-alive connections, a concurrency limit,
+    jittered exponential back-off for 429/5xx answers and transport errors,
+    and a circuit breaker shared by the async and the blocking entry points.
     """
-    for attempt in range(max_retries):
-        resp = requests.get(url, timeout=20)
+
+    def __init__(self,
+                 max_connections: int = 20,
+                 max_concurrency: int = 8,
+                 max_attempts: int = 5,
+                 backoff: float = 0.5,
+                 max_backoff: float = 8.0,
+                 timeout: float = 20.0,
+                 breaker: Optional[CircuitBreaker] = None,
+                 transport=None):
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections)
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.transport = transport  # e.g. httpx.MockTransport for a stand-in server
+        self.calls = 0
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sync_client: Optional[httpx.Client] = None
+        self._sync_semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._sync_lock = threading.Lock()
+
+    # ---------- retry policy, shared by both entry points ---------- #
+    def _classify(self, resp: httpx.Response, probe: bool):
+        """
+        (body, None, None) for a 200 answer, (None, error, Retry-After) for a
+        retryable status; any other status raises without a retry.
+        """
+        inc("osrm_requests_total", status=resp.status_code)
         if resp.status_code == 200:
-            return resp.json()
-
-        # 429 or 5xx → sleep & retry
-        if resp.status_code in (429, 502, 503, 504):
-            sleep = backoff ** attempt          # 1.5, 2.25, 3.37, …
-            print(f"[OSRM] {resp.status_code} – retrying in {sleep:,.1f}s")
-            time.sleep(sleep)
-            continue
-        resp.raise_for_status()                # other errors → raise
-    raise HTTPError(f"OSRM failed after {max_retries} retries")
+            self.breaker.record_success()
+            return resp.json(), None, None
+        if resp.status_code not in RETRY_STATUS:
+            if probe:
+                self.breaker.release_probe()
+            resp.raise_for_status()
+        self.breaker.record_failure()
+        return None, httpx.HTTPStatusError(f"OSRM answered {resp.status_code}",
+                                           request=resp.request, response=resp), resp.headers.get("Retry-After")
+
+    def _transport_failure(self, error: httpx.TransportError) -> Exception:
+        inc("osrm_requests_total", status="transport_error")
+        self.breaker.record_failure()
+        return error
+
+    def _retry_delay(self, attempt: int, last_error: Exception, retry_after: Optional[str]) -> Optional[float]:
+        """Seconds to wait before the next attempt, None after the last one."""
+        if attempt >= self.max_attempts - 1:
+            return None
+        delay = _backoff_delay(attempt, self.backoff, self.max_backoff, retry_after)
+        print(f"[OSRM] {last_error} – retrying in {delay:,.1f}s")
+        return delay
+
+    # ---------- async ---------- #
+    def _async_resources(self):
+        # An AsyncClient belongs to one event loop; build a fresh one per loop
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._loop is not loop:
+            self._async_client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout,
+                                                   transport=self.transport)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._async_client, self._semaphore
+
+    async def get_json(self, url: str) -> Dict[str, Any]:
+        """GET `url` and return the parsed JSON body."""
+        client, semaphore = self._async_resources()
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_attempts):
+            probe = self.breaker.before_call()
+            try:
+                async with semaphore:
+                    self.calls += 1
+                    resp = await client.get(url)
+            except httpx.TransportError as e:
+                last_error, retry_after = self._transport_failure(e), None
+            except BaseException:
+                if probe:
+                    self.breaker.release_probe()
+                raise
+            else:
+                body, last_error, retry_after = self._classify(resp, probe)
+                if last_error is None:
+                    return body
+            delay = self._retry_delay(attempt, last_error, retry_after)
+            if delay is not None:
+                await asyncio.sleep(delay)
+        raise RuntimeError(f"OSRM failed after {self.max_attempts} attempts: {last_error}")
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    # ---------- blocking (CLI, map rendering, /table provider) ---------- #
+    def _client(self) -> httpx.Client:
+        with self._sync_lock:
+            if self._sync_client is None:
+                self._sync_client = httpx.Client(limits=self.limits, timeout=self.timeout,
+                                                 transport=self.transport)
+            return self._sync_client
+
+    def get_json_sync(self, url: str) -> Dict[str, Any]:
+        """Blocking twin of get_json; same pool limits, retry policy and breaker."""
+        client = self._client()
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_attempts):
+            probe = self.breaker.before_call()
+            try:
+                with self._sync_semaphore:
+                    self.calls += 1
+                    resp = client.get(url)
+            except httpx.TransportError as e:
+                last_error, retry_after = self._transport_failure(e), None
+            except BaseException:
+                if probe:
+                    self.breaker.release_probe()
+                raise
+            else:
+                body, last_error, retry_after = self._classify(resp, probe)
+                if last_error is None:
+                    return body
+            delay = self._retry_delay(attempt, last_error, retry_after)
+            if delay is not None:
+                time.sleep(delay)
+        raise RuntimeError(f"OSRM failed after {self.max_attempts} attempts: {last_error}")
+
+    def close(self) -> None:
+        with self._sync_lock:
+            if self._sync_client is not None:
+                self._sync_client.close()
+                self._sync_client = None
+
+
+_client: Optional[OSRMClient] = None
+_client_lock = threading.Lock()
+
+
+def get_osrm_client() -> OSRMClient:
+    """Process-wide client, so every caller shares one connection pool and breaker."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OSRMClient()
+        return _client
+
+
+async def get_json_async(url: str) -> Dict[str, Any]:
+    return await get_osrm_client().get_json(url)
+
+
+def get_with_backoff(url: str) -> Dict[str, Any]:
+    """
+    GET `url` with jittered exponential back-off for 429 / 5xx answers.
+    Returns response.json(). Blocking; async code should use get_json_async.
+    """
+    return get_osrm_client().get_json_sync(url)
@@ -1,6 +1,11 @@
 import time
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
-from mip import Model, CBC, MAXIMIZE, MINIMIZE, BINARY, INTEGER, xsum, OptimizationStatus
+import numpy as np
+
+# python-mip (and its CBC library) is only loaded when the exact engine runs;
+# the heuristic engine, which serves nearly every request, does not need it.
 
 N_CITIES = 4
 
@@ -15,6 +20,7 @@ def get_distance_matrix():
 def solve_tsp_no_input():
     n = N_CITIES
     distance_matrix = get_distance_matrix()
+    from mip import Model, CBC, MINIMIZE, BINARY, INTEGER, xsum, OptimizationStatus
 
     # Create the model, explicitly using CBC
     m = Model(solver_name=CBC)
@@ -106,10 +112,16 @@ def solve_tsp_no_input():
         print("No optimal solution found.")
         # Depending on your needs, you might raise an exception or return an empty list
         return []
-# Modified solve_tsp function to accept distance_matrix
-def solve_tsp(distance_matrix: list[list[float]]): # Add type hint for clarity
+# Exact MTZ model, kept as the opt-in "exact" engine for small groups
+def _solve_mtz(distance_matrix, max_seconds: Optional[float] = None) -> Tuple[List[int], str, float]:
+    """
+    Builds and solves the MTZ model with CBC.
+    Returns (tour, status, lower_bound); status is "optimal", "feasible"
+    (stopped by max_seconds with an incumbent) or "failed".
+    """
     # n will now be derived from the input distance_matrix
     n = len(distance_matrix)
+    from mip import Model, CBC, MINIMIZE, BINARY, INTEGER, xsum, OptimizationStatus
 
     m = Model(solver_name=CBC)
 
@@ -123,7 +135,7 @@ def solve_tsp(distance_matrix: list[list[float]]): # Add type hint for clarity
     for i in range(n):
         u[i] = m.add_var(name=f"u_{i}", var_type=INTEGER, lb=1.0, ub=float(n))
 
-    m.objective = xsum(distance_matrix[i][j] * x[(i, j)] for i in range(n) for j in range(n) if i != j)
+    m.objective = xsum(float(distance_matrix[i][j]) * x[(i, j)] for i in range(n) for j in range(n) if i != j)
     m.sense = MINIMIZE  # Set the sense of optimization here
 
     for j in range(n):
@@ -139,7 +151,10 @@ def solve_tsp(distance_matrix: list[list[float]]): # Add type hint for clarity
 
     # --- Start timing the optimization here ---
     start_time_optimize = time.time()
-    status = m.optimize()
+    if max_seconds is not None:
+        status = m.optimize(max_seconds=max(max_seconds, 0.01))
+    else:
+        status = m.optimize()
     end_time_optimize = time.time()
     elapsed_time_optimize = end_time_optimize - start_time_optimize
     # --- End timing the optimization here ---
@@ -148,8 +163,8 @@ def solve_tsp(distance_matrix: list[list[float]]): # Add type hint for clarity
 
     print(f"Optimization status: {status}")
 
-    if status == OptimizationStatus.OPTIMAL:
-        print(f"Optimal objective value: {m.objective_value}")
+    if status in (OptimizationStatus.OPTIMAL, OptimizationStatus.FEASIBLE):
+        print(f"Objective value: {m.objective_value} (bound {m.objective_bound})")
 
         tour = []
         current_city = 0 # Assuming start at city 0
@@ -170,13 +185,343 @@ def solve_tsp(distance_matrix: list[list[float]]): # Add type hint for clarity
 
         # This part of the code now returns the tour of indices
         # The calling function (optimise_routes) will need to map these indices back to actual sights
-        return tour
+        result_status = "optimal" if status == OptimizationStatus.OPTIMAL else "feasible"
+        return tour, result_status, float(m.objective_bound)
     else:
-        print("No optimal solution found.")
-        return [] # Or raise an error, depending on desired behavior
+        print("No solution found.")
+        return [], "failed", 0.0 # Or raise an error, depending on desired behavior
+
+
+def solve_tsp_exact(distance_matrix, deadline: Optional[float] = None) -> List[int]:
+    """Exact engine; with a deadline (time.perf_counter() value) CBC returns its incumbent."""
+    max_seconds = None if deadline is None else deadline - time.perf_counter()
+    tour, _, _ = _solve_mtz(distance_matrix, max_seconds=max_seconds)
+    return tour
+
+
+# --------- Heuristic engine ----------------------------------------------------
+# Nearest-neighbour construction followed by 2-opt and Or-opt local search on a
+# NumPy distance matrix. Tours are closed and start at index 0, exactly like the
+# tours returned by the MIP model, so callers can switch engines freely.
+
+def _as_distance_array(distance_matrix) -> np.ndarray:
+    """Returns the matrix as a float64 ndarray (no copy if it already is one)."""
+    return np.asarray(distance_matrix, dtype=np.float64)
+
+
+def tour_length(distance_matrix, tour: Sequence[int]) -> float:
+    """Length of the closed tour (including the edge back to the start)."""
+    if len(tour) < 2:
+        return 0.0
+    dist = _as_distance_array(distance_matrix)
+    idx = np.asarray(tour)
+    return float(dist[idx, np.roll(idx, -1)].sum())
+
+
+def nearest_neighbour_tour(distance_matrix, start: int = 0) -> List[int]:
+    """Greedy construction: always move to the closest unvisited node."""
+    dist = _as_distance_array(distance_matrix)
+    n = len(dist)
+    if n == 0:
+        return []
+
+    visited = np.zeros(n, dtype=bool)
+    tour = [start]
+    visited[start] = True
+    current = start
+    for _ in range(n - 1):
+        candidates = np.where(visited, np.inf, dist[current])
+        current = int(np.argmin(candidates))
+        tour.append(current)
+        visited[current] = True
+    return tour
+
+
+def _expired(deadline: Optional[float]) -> bool:
+    return deadline is not None and time.perf_counter() >= deadline
+
+
+def two_opt(distance_matrix, tour: Sequence[int], deadline: Optional[float] = None) -> List[int]:
+    """
+    Improves a closed tour with 2-opt moves until no improving move is left
+    or `deadline` (a time.perf_counter() value) passes.
+    For every first edge all second edges are evaluated at once with NumPy.
+    """
+    dist = _as_distance_array(distance_matrix)
+    route = np.array(tour, dtype=np.intp)
+    n = len(route)
+    if n < 4:
+        return route.tolist()
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(n - 2):
+            if _expired(deadline):
+                return route.tolist()
+            a, b = route[i], route[i + 1]
+            # When i == 0 the last edge (route[-1], route[0]) touches a, skip it
+            j = np.arange(i + 2, n if i > 0 else n - 1)
+            if j.size == 0:
+                continue
+            c = route[j]
+            d = route[(j + 1) % n]
+            delta = dist[a, c] + dist[b, d] - dist[a, b] - dist[c, d]
+            k = int(np.argmin(delta))
+            if delta[k] < -1e-12:
+                jk = j[k]
+                route[i + 1:jk + 1] = route[i + 1:jk + 1][::-1]
+                improved = True
+    return route.tolist()
+
+
+def or_opt(distance_matrix, tour: Sequence[int], max_segment: int = 3,
+           deadline: Optional[float] = None) -> List[int]:
+    """
+    Improves a closed tour by relocating segments of 1..max_segment nodes
+    (optionally reversed) to their cheapest position. The start node stays first.
+    Stops early once `deadline` passes.
+    """
+    dist = _as_distance_array(distance_matrix)
+    route = list(tour)
+    n = len(route)
+    if n < 4:
+        return route
+
+    improved = True
+    while improved:
+        improved = False
+        for seg_len in range(1, min(max_segment, n - 2) + 1):
+            for i in range(1, n - seg_len + 1):
+                if _expired(deadline):
+                    return route
+                segment = route[i:i + seg_len]
+                prev_node, next_node = route[i - 1], route[(i + seg_len) % n]
+                removal_gain = (dist[prev_node, segment[0]] + dist[segment[-1], next_node]
+                                - dist[prev_node, next_node])
+
+                rest = np.array(route[:i] + route[i + seg_len:], dtype=np.intp)
+                rest_next = np.roll(rest, -1)
+                base = dist[rest, rest_next]
+                cost_forward = dist[rest, segment[0]] + dist[segment[-1], rest_next] - base
+                cost_reversed = dist[rest, segment[-1]] + dist[segment[0], rest_next] - base
+                # Re-inserting after route[i - 1] is the current position
+                cost_forward[i - 1] = np.inf
+
+                best_forward = int(np.argmin(cost_forward))
+                best_reversed = int(np.argmin(cost_reversed))
+                if cost_forward[best_forward] <= cost_reversed[best_reversed]:
+                    pos, cost, insert = best_forward, cost_forward[best_forward], segment
+                else:
+                    pos, cost, insert = best_reversed, cost_reversed[best_reversed], segment[::-1]
+
+                if cost < removal_gain - 1e-12:
+                    rest_list = rest.tolist()
+                    route = rest_list[:pos + 1] + insert + rest_list[pos + 1:]
+                    improved = True
+                    break
+            if improved:
+                break
+    return route
+
+
+def _warm_start_tour(initial_tour: Optional[Sequence[int]], n: int) -> Optional[List[int]]:
+    """initial_tour rotated to start at node 0, or None if it is not a permutation of range(n)."""
+    if initial_tour is None or len(initial_tour) != n or sorted(initial_tour) != list(range(n)):
+        return None
+    tour = list(initial_tour)
+    start = tour.index(0)
+    return tour[start:] + tour[:start]
+
+
+def solve_tsp_heuristic(distance_matrix, deadline: Optional[float] = None,
+                        initial_tour: Optional[Sequence[int]] = None) -> List[int]:
+    """
+    Fast default engine: nearest-neighbour start, then alternating 2-opt and
+    Or-opt until neither finds an improvement. Near-optimal in milliseconds
+    for groups of 100+ sights. With a deadline it is an anytime algorithm:
+    every intermediate tour is complete, so the best one so far is returned.
+    initial_tour warm-starts the local search from a known (e.g. previous) tour
+    instead of nearest neighbour; a good one leaves little to improve.
+    """
+    dist = _as_distance_array(distance_matrix)
+    n = len(dist)
+    if n <= 3:
+        return list(range(n))
+
+    tour = _warm_start_tour(initial_tour, n) or nearest_neighbour_tour(dist)
+    best = tour_length(dist, tour)
+    while not _expired(deadline):
+        tour = or_opt(dist, two_opt(dist, tour, deadline=deadline), deadline=deadline)
+        length = tour_length(dist, tour)
+        if length >= best - 1e-12:
+            break
+        best = length
+    return tour
+
+
+# --------- Engine selection ----------------------------------------------------
+TSP_ENGINES: Dict[str, Callable[..., List[int]]] = {
+    "heuristic": solve_tsp_heuristic,
+    "exact": solve_tsp_exact,
+}
+
+# Groups up to this size may use the exact MIP when the time budget allows it
+EXACT_MAX_SIGHTS = 8
+# Below this budget CBC start-up alone is too expensive, stay heuristic
+EXACT_MIN_BUDGET_MS = 500
+
+
+def register_tsp_engine(name: str, solver: Callable[..., List[int]]) -> None:
+    """Registers an additional engine under `name` (e.g. an OR-Tools backend)."""
+    TSP_ENGINES[name] = solver
+
+
+def choose_tsp_engine(n: int,
+                      time_budget_ms: Optional[float] = None,
+                      exact_max_sights: int = EXACT_MAX_SIGHTS) -> str:
+    """Picks the engine name for a group of `n` sights."""
+    if n <= exact_max_sights and (time_budget_ms is None or time_budget_ms >= EXACT_MIN_BUDGET_MS):
+        return "exact"
+    return "heuristic"
+
+
+def solve_tsp(distance_matrix, engine: str = "heuristic") -> List[int]:
+    """
+    Solves a closed TSP over `distance_matrix` (list of lists or ndarray) and
+    returns the visiting order as indices starting at 0.
+
+    Args:
+        distance_matrix: Square matrix of pairwise distances.
+        engine: "heuristic" (default), "exact" (MTZ model with CBC), "auto"
+                or any name added with register_tsp_engine.
+    """
+    n = len(distance_matrix)
+    if engine == "auto":
+        engine = choose_tsp_engine(n)
+    try:
+        solver = TSP_ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"Unknown TSP engine '{engine}'. Available: {sorted(TSP_ENGINES)}")
+
+    tour = solver(distance_matrix)
+    if len(tour) != n and engine != "heuristic":
+        # The exact model can stop without a full tour, never lose sights because of that
+        print(f"Engine '{engine}' returned an incomplete tour, falling back to heuristic.")
+        tour = solve_tsp_heuristic(distance_matrix)
+    return tour
+
+
+# --------- Anytime mode ----------------------------------------------------------
+def one_tree_lower_bound(distance_matrix) -> float:
+    """
+    Held-Karp 1-tree bound: minimum spanning tree over nodes 1..n-1 plus the two
+    cheapest edges at node 0. Every closed tour is at least this long, which lets
+    us report an optimality gap for heuristic tours. O(n^2) Prim on NumPy rows.
+    """
+    dist = _as_distance_array(distance_matrix)
+    n = len(dist)
+    if n < 3:
+        return tour_length(dist, list(range(n)))
+
+    rest = dist[1:, 1:]
+    in_tree = np.zeros(n - 1, dtype=bool)
+    in_tree[0] = True
+    best_edge = rest[0].copy()
+    mst = 0.0
+    for _ in range(n - 2):
+        candidates = np.where(in_tree, np.inf, best_edge)
+        k = int(np.argmin(candidates))
+        mst += candidates[k]
+        in_tree[k] = True
+        best_edge = np.minimum(best_edge, rest[k])
+
+    two_cheapest = np.partition(dist[0, 1:], 1)[:2].sum()
+    return float(mst + two_cheapest)
+
+
+@dataclass
+class TSPResult:
+    tour: List[int]
+    length: float
+    lower_bound: float
+    engine: str
+    status: str          # "optimal", "feasible", "local_optimum" or "timeout"
+    elapsed_ms: float
+
+    @property
+    def gap(self) -> float:
+        """Relative optimality gap (0.0 = proven optimal)."""
+        if self.length <= 0:
+            return 0.0
+        return max(0.0, (self.length - self.lower_bound) / self.length)
+
+    def to_dict(self) -> Dict[str, Any]:
+        info = asdict(self)
+        info.pop("tour")
+        info["gap"] = self.gap
+        return info
+
+
+def solve_tsp_anytime(distance_matrix,
+                      time_budget_ms: Optional[float] = None,
+                      engine: str = "auto",
+                      initial_tour: Optional[Sequence[int]] = None) -> TSPResult:
+    """
+    Solves within `time_budget_ms` (None = no limit) and returns the best tour
+    found together with its length, a lower bound and the resulting gap.
+    initial_tour warm-starts the heuristic engine (ignored by the others).
+    """
+    start = time.perf_counter()
+    deadline = None if time_budget_ms is None else start + time_budget_ms / 1000.0
+    dist = _as_distance_array(distance_matrix)
+    n = len(dist)
+    if engine == "auto":
+        engine = choose_tsp_engine(n, time_budget_ms)
+
+    if n <= 3:
+        tour = list(range(n))
+        length = tour_length(dist, tour)
+        return TSPResult(tour, length, length, engine, "optimal", (time.perf_counter() - start) * 1000)
+
+    tour, status, lower_bound = [], "failed", 0.0
+    if engine == "exact":
+        max_seconds = None if deadline is None else deadline - time.perf_counter()
+        tour, status, lower_bound = _solve_mtz(dist, max_seconds=max_seconds)
+    elif engine in TSP_ENGINES:
+        warm = {"initial_tour": initial_tour} if initial_tour is not None and engine == "heuristic" else {}
+        tour = TSP_ENGINES[engine](dist, deadline=deadline, **warm)
+        status = "timeout" if _expired(deadline) else "local_optimum"
+    else:
+        raise ValueError(f"Unknown TSP engine '{engine}'. Available: {sorted(TSP_ENGINES)}")
+
+    if len(tour) != n:
+        print(f"Engine '{engine}' returned no complete tour in time, using the heuristic.")
+        engine = "heuristic"
+        tour = solve_tsp_heuristic(dist, deadline=deadline)
+        status = "timeout" if _expired(deadline) else "local_optimum"
+
+    if status != "optimal":
+        lower_bound = max(lower_bound, one_tree_lower_bound(dist))
+    length = tour_length(dist, tour)
+    return TSPResult(tour, length, lower_bound, engine, status, (time.perf_counter() - start) * 1000)
+
+
+def summarise_solver_stats(group_results: Dict[str, TSPResult]) -> Dict[str, Any]:
+    """Plan-level summary: per-group details plus the overall (length-weighted) gap."""
+    total_length = sum(r.length for r in group_results.values())
+    total_bound = sum(min(r.lower_bound, r.length) for r in group_results.values())
+    return {
+        "groups": {w: r.to_dict() for w, r in group_results.items()},
+        "optimality_gap": (total_length - total_bound) / total_length if total_length > 0 else 0.0,
+        "timed_out_groups": [w for w, r in group_results.items() if r.status in ("timeout", "feasible")],
+        "solve_time_ms": sum(r.elapsed_ms for r in group_results.values()),
+    }
+
+
 # Example usage (if you run this script directly)
 if __name__ == "__main__":
-    found_tour = solve_tsp()
+    found_tour = solve_tsp_no_input()
     if found_tour:
         print(f"Final Tour: {found_tour}")
         # You could also calculate the total distance from the tour here
@@ -1,30 +1,15 @@
 from __future__ import annotations
-import json
-from pathlib import Path
-from typing import List, Dict, Optional, Union
+from typing import Dict, Iterator, List, Optional, Union
 import math
+import numpy as np
 import osmnx as ox
 import pandas as pd
+import shapely
 from shapely.geometry import Point
 from .sights import Sight   #p @dataclass(frozen=True)
-
-CACHE_DIR = Path("cache")
-CACHE_DIR.mkdir(exist_ok=True)
-
-# Helper function to generate a cache file path based on a query identifier.
-# This identifier can be a city name or a string representation of coordinates and radius.
-def _cache_path(query_identifier: str) -> Path:
-    """
-    Generates a safe filename for caching based on a query identifier.
-    Converts the identifier into a URL-friendly slug.
-    """
-    # Replace common characters that might cause issues in filenames
-    slug = query_identifier.lower().replace(" ", "_").replace(",", "").replace("(", "").replace(")", "").replace(".", "_").replace("-", "_").replace("/", "_")
-    # Limit slug length to avoid excessively long filenames, while maintaining uniqueness
-    if len(slug) > 100:
-        import hashlib
-        slug = hashlib.sha256(query_identifier.encode()).hexdigest()[:100] # Use a hash if too long
-    return CACHE_DIR / f"pois_{slug}.json"
+from .sight_collection import SightCollection #p
+from .poi_tiles import BBox, POITileStore, radius_bbox, tiles_for_bbox #p
+from osmnx._errors import InsufficientResponseError
 
 # Helper function to safely convert a value to a string, handling None and NaN.
 def safe_str(val) -> str:
@@ -59,182 +44,208 @@ def fetch_osm_sights(
 ) -> List[Sight]:
     """
     Fetches points of interest (sights) using OSMnx, either from a place name or around a central point.
-    Results are cached to JSON files.
+    Results are cached per map tile (planner/poi_tiles.py), so overlapping queries share data.
 
     Args:
         location (Union[str, Point]): A city name (str) or a shapely Point object (lon, lat).
         tags (Dict[str, List[str]]): OSM tags to query for (e.g., {"amenity": ["restaurant", "cafe"]}).
-        refresh (bool): Whether to clear the OSMnx cache and refetch data, bypassing local JSON cache.
+        refresh (bool): Whether to refetch the tiles of this query, bypassing the tile and OSMnx caches.
         radius_meters (Optional[int]): Radius in meters to query around the point if 'location' is a Point.
                                        Required if location is a Point.
 
     Returns:
         List[Sight]: A list of Sight objects.
     """
-    # Determine the query identifier for caching
-    query_identifier: str
-    if isinstance(location, str):
-        query_identifier = location
-    elif isinstance(location, Point):
-        if radius_meters is None:
-            raise ValueError("radius_meters must be provided when 'location' is a shapely.geometry.Point.")
-        # Create a unique identifier for point-based queries (latitude, longitude, radius)
-        query_identifier = f"point_{location.y:.6f}_{location.x:.6f}_radius_{radius_meters}"
-    else:
+    collection = fetch_osm_collection(location, tags, refresh=refresh, radius_meters=radius_meters)
+    return collection.to_sights()
+
+
+def fetch_osm_collection(
+    location: Union[str, Point],
+    tags: Dict[str, List[str]],
+    refresh: bool = False,
+    radius_meters: Optional[int] = 1000
+) -> SightCollection:
+    """
+    Same query as fetch_osm_sights, returned as a SightCollection. On a tile cache
+    hit the columns are memory-mapped and names/descriptions are decoded lazily,
+    so even large cities open in milliseconds; convert only what you need.
+    Returns an empty collection if the query fails.
+    """
+    if isinstance(location, Point) and radius_meters is None:
+        raise ValueError("radius_meters must be provided when 'location' is a shapely.geometry.Point.")
+    if not isinstance(location, (str, Point)):
         raise ValueError("Location must be a string (city name) or a shapely.geometry.Point.")
 
+    # Answered from the tile store: only tiles that are missing or past their TTL
+    # (all tiles of this query if refresh) are fetched from OSM.
+    store = get_tile_store()
+    try:
+        if isinstance(location, str):
+            boundary = ox.geocode_to_gdf(location).geometry.union_all()
+            collection = store.query_polygon(boundary, tags, refresh=refresh)
+        else:
+            collection = store.query_radius(location.y, location.x, radius_meters, tags, refresh=refresh)
+    except Exception as e:
+        print(f"Error fetching features for {location} (type: {type(location).__name__}): {e}")
+        return SightCollection.empty()
 
-    cache_file = _cache_path(query_identifier)
+    if not len(collection):
+        print(f"No OSM features found for query. Location: {location} (type: {type(location).__name__}), Tags: {tags}, Radius: {radius_meters}m.")
+    return collection
 
-    # If refresh is False and cache file exists, load from cache
-    if cache_file.exists() and not refresh:
-        try:
-            with cache_file.open() as f:
-                raw_data = json.load(f)
-            # Deserialize cached data into Sight objects
-            return [
-                Sight(
-                    #id=rec.get("id"),  # Include id from cache
-                    name=rec["name"],
-                    location=Point(rec["lon"], rec["lat"]),  # Reconstruct Point (lon, lat)
-                    category=rec["category"],
-                    weather_suitability=tuple(rec["weather_suitability"]),
-                    description=rec.get("description", "")
-                )
-                for rec in raw_data
-            ]
-        except (json.JSONDecodeError, KeyError) as e:
-            print(f"Error reading cache file {cache_file}: {e}. Will refetch data.")
-            # If cache is corrupted or malformed, proceed to refetch
-            pass
-
-    # --- Query OSMnx ----------------------------------------------------------------
-    # Clear OSMnx cache if refresh is True. This clears OSMnx's internal cache, not our JSON cache.
-    if refresh:
-        ox.settings.log_console = True
-        try:
-            # Attempt the most current method first
-            ox.downloader.clear_cache(ox.settings.cache_folder, response=True, parsed=True)
-        except AttributeError:
-            try:
-                # Fallback to a previous common method
-                ox.utils_geo.clear_cache(ox.settings.cache_folder, response=True, parsed=True)
-            except AttributeError:
-                try:
-                    # Fallback to an even older method (less likely to work if previous failed)
-                    ox.utils.clear_cache(ox.settings.cache_folder, response=True, parsed=True)
-                except AttributeError:
-                    print("Warning: Could not find a suitable OSMnx cache clearing function. "
-                          "Please ensure your OSMnx version is up-to-date or check its documentation "
-                          "for the correct cache clearing method.")
-                    # If all attempts fail, we proceed without clearing OSMnx's internal cache,
-                    # but our JSON cache will still be bypassed due to `refresh=True`.
-
-    gdf = pd.DataFrame()  # Initialize empty GeoDataFrame
 
+def _fetch_bbox(bbox: BBox, tags: Dict[str, List[str]], refresh: bool = False) -> SightCollection:
+    """
+    POIs in a (west, south, east, north) box, the fetch function of the tile store.
+    refresh bypasses OSMnx's HTTP cache for this request only.
+    """
+    use_cache = ox.settings.use_cache
+    ox.settings.use_cache = use_cache and not refresh
+    try:
+        gdf = ox.features.features_from_bbox(bbox, tags=tags)
+    except InsufficientResponseError:
+        return SightCollection.empty()  # no features in this area, an empty tile is still cached
+    finally:
+        ox.settings.use_cache = use_cache
+    return sights_from_features(gdf, tags)
+
+
+_tile_store: Optional[POITileStore] = None
+
+
+def get_tile_store() -> POITileStore:
+    """Process-wide tile store backed by OSMnx bbox queries."""
+    global _tile_store
+    if _tile_store is None:
+        _tile_store = POITileStore(fetch=_fetch_bbox)
+    return _tile_store
+
+
+# --------- Vectorised extraction ---------------------------------------------
+# Most rows per chunk yielded by iter_osm_sights
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def _is_filled(values: pd.Series) -> pd.Series:
+    """True where a tag value is present and not an empty string."""
+    return values.notna() & (values.astype(str).str.strip() != "")
+
+
+def _first_list_match(value, tag_values) -> Optional[str]:
+    """Category from a list-valued tag cell (rare: merged OSM elements)."""
+    for item in value:
+        if tag_values is True:
+            if item is not None and str(item).strip() != "":
+                return str(item)
+        elif str(item) in tag_values:
+            return str(item)
+    return None
+
+
+def _tag_categories(features: pd.DataFrame, tag_key: str, tag_values) -> pd.Series:
+    """
+    Category per row from one tag column, NaN where the tag does not match.
+    tag_values True matches any non-empty value, a list matches its members.
+    """
+    column = features[tag_key]
+    is_list = column.map(lambda v: isinstance(v, list))
+    scalars = column.where(~is_list)
+    if tag_values is True:
+        matched = _is_filled(scalars)
+    elif isinstance(tag_values, list):
+        matched = scalars.notna() & scalars.astype(str).isin([str(v) for v in tag_values])
+    else:
+        # Neither True nor a list: unexpected tag spec, skip this key
+        return pd.Series(float("nan"), index=features.index, dtype=object)
+    categories = scalars.astype(str).where(matched)
+    if is_list.any():
+        categories[is_list] = column[is_list].map(lambda v: _first_list_match(v, tag_values))
+    return categories.astype(object)
+
+
+def sights_from_features(features: pd.DataFrame, tags: Dict[str, List[str]]) -> SightCollection:
+    """
+    Converts an OSMnx features GeoDataFrame into a SightCollection.
+
+    Names, categories, centroids and weather suitability are computed on whole
+    columns: rows without a name or geometry are dropped, the category is the
+    first tag (in `tags` order) whose value matches, 'Unknown' otherwise.
+    """
+    if features.empty or "name" not in features.columns:
+        return SightCollection.empty()
+    features = features[_is_filled(features["name"]) & features.geometry.notna() & ~features.geometry.is_empty]
+
+    category = pd.Series(float("nan"), index=features.index, dtype=object)
+    for tag_key, tag_values in tags.items():
+        if tag_key in features.columns:
+            category = category.fillna(_tag_categories(features, tag_key, tag_values))
+    category = category.fillna("Unknown")
+
+    # Use centroid for location (robust for both Points and Polygons). Taken with shapely on the
+    # raw lon/lat geometries: for building-sized features the planar centroid is exact enough,
+    # and GeoSeries.centroid would warn about the geographic CRS on every ingestion
+    centroids = shapely.centroid(np.asarray(features.geometry))
+    weather_by_category = {c: assign_weather_suitability(c) for c in category.unique()}
+    if "description" in features.columns:
+        descriptions = features["description"].where(features["description"].notna(), "").astype(str)
+    else:
+        descriptions = pd.Series("", index=features.index)
+
+    return SightCollection.from_columns(
+        names=features["name"].astype(str).to_numpy(),
+        lat=shapely.get_y(centroids),
+        lon=shapely.get_x(centroids),
+        categories=category.to_numpy(),
+        weather_suitability=category.map(weather_by_category).to_numpy(),
+        descriptions=descriptions.to_numpy(),
+    )
+
+
+def iter_osm_sights(
+    location: Union[str, Point],
+    tags: Dict[str, List[str]],
+    radius_meters: Optional[int] = 1000,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[SightCollection]:
+    """
+    Streams the sights of an OSM query as SightCollection chunks of at most
+    chunk_size rows, for city-wide queries with hundreds of thousands of features.
+
+    The area is walked one tile of the tile store (planner/poi_tiles.py) at a
+    time: each tile is read from the store or fetched from OSM on its own, so
+    only one tile's OSMnx result is in memory at once, however large the area.
+    A tile that cannot be fetched is reported and skipped.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    if isinstance(location, Point) and radius_meters is None:
+        raise ValueError("radius_meters must be provided when 'location' is a shapely.geometry.Point.")
+    if not isinstance(location, (str, Point)):
+        raise ValueError("Location must be a string (city name) or a shapely.geometry.Point.")
+
+    boundary = None
     if isinstance(location, str):
-        # Logic for city names (place-based query)
-        try:
-            gdf = ox.features.features_from_place(location, tags=tags)
-        except Exception as e:
-            print(f"Error fetching features for place '{location}': {e}")
-            return []
-    elif isinstance(location, Point):
-        # Logic for coordinates (point-based query)
-        # osmnx.features.features_from_point expects (latitude, longitude)
-        # Shapely Point stores (longitude, latitude), so extract correctly
-        lat, lon = location.y, location.x
         try:
-            gdf = ox.features.features_from_point((lat, lon), tags=tags, dist=radius_meters)
+            boundary = ox.geocode_to_gdf(location).geometry.union_all()
         except Exception as e:
-            print(f"Error fetching features around point ({lat}, {lon}) with radius {radius_meters}m: {e}")
-            return []
-
-    sights: List[Sight] = []
-    if not gdf.empty:
-        # Convert GeoDataFrame to list of Sight objects
-        for _, row in gdf.iterrows():
-            name = row.get('name')
-            if not name:
-                continue  # Skip sights without a name
-
-            # Robust category determination based on requested tags
-            category = 'Unknown'
-            for tag_key, tag_values in tags.items():
-                if tag_key in row:
-                    row_value = row[tag_key]
-
-                    # Case 1: tag_values is True (meaning match any value for this tag_key)
-                    if tag_values is True:
-                        # If row_value is a list, pick the first non-empty string item
-                        if isinstance(row_value, list):
-                            for item in row_value:
-                                if item is not None and str(item).strip() != '':
-                                    category = str(item)
-                                    break
-                            if category != 'Unknown':
-                                break  # Found category, break outer loop
-                        # If row_value is a single value, use it directly
-                        else:
-                            if row_value is not None and str(row_value).strip() != '':
-                                category = str(row_value)
-                                break  # Found category, break outer loop
-                    # Case 2: tag_values is a list of strings (standard behavior)
-                    elif isinstance(tag_values, list):
-                        # If row_value is a list, iterate through its items
-                        if isinstance(row_value, list):
-                            for item in row_value:
-                                # Convert each item to string for comparison against tag_values
-                                if str(item) in tag_values:
-                                    category = str(item)
-                                    break  # Found a category in the list, break inner loop
-                            if category != 'Unknown':  # If a category was found in the list, break outer loop
-                                break
-                        # If row_value is a single value (string, bool, int, float, etc.)
-                        else:
-                            # Convert the single value to string for comparison against tag_values
-                            if str(row_value) in tag_values:
-                                category = str(row_value)
-                                break  # Found a category, break outer loop
-                    # Else (tag_values is neither True nor a list), it's an unexpected type for tags.items().
-                    # We will simply skip this tag_key as it doesn't fit our expected patterns.
-
-            # Use centroid for location (robust for both Points and Polygons)
-            latitude = row.geometry.centroid.y if row.geometry else None
-            longitude = row.geometry.centroid.x if row.geometry else None
-
-            if latitude is not None and longitude is not None:
-                sights.append(
-                    Sight(
-                        #id=row.get('osm_id'),  # Use osm_id as unique ID for the Sight
-                        name=name,
-                        location=Point(longitude, latitude),  # Store as Shapely Point (lon, lat)
-                        category=category,
-                        weather_suitability=assign_weather_suitability(category),
-                        description=row.get("description", "")
-                    )
-                )
+            print(f"Error geocoding place '{location}': {e}")
+            return
+        shapely.prepare(boundary)
+        bbox = boundary.bounds
     else:
-        print(f"No OSM features found for query. Location: {location} (type: {type(location).__name__}), Tags: {tags}, Radius: {radius_meters}m. GeoDataFrame is empty.")
-
-
-    # Cache the fetched data
-    serial_data = [
-        {
-            #"id": s.id,  # Include ID in cached data
-            "name": s.name,
-            "lon": s.location.x,  # Store longitude
-            "lat": s.location.y,  # Store latitude
-            "category": s.category,
-            "weather_suitability": list(s.weather_suitability),
-            "description": s.description,
-        }
-        for s in sights
-    ]
-    try:
-        with cache_file.open("w") as f:
-            json.dump(serial_data, f, indent=2)
-    except IOError as e:
-        print(f"Error writing to cache file {cache_file}: {e}")
+        bbox = radius_bbox(location.y, location.x, radius_meters)
 
-    return sights
\ No newline at end of file
+    store = get_tile_store()
+    for tile in tiles_for_bbox(bbox, store.zoom):
+        try:
+            pois = store.load_tiles([tile], tags)
+        except Exception as e:
+            print(f"Error fetching features for tile {tile} of {location}: {e}")
+            continue
+        if boundary is not None:
+            pois = pois.take(shapely.intersects_xy(boundary, pois.lon, pois.lat))
+        else:
+            pois = pois.take(pois.distances_from((location.y, location.x)) * 1000 <= radius_meters)
+        for start in range(0, len(pois), chunk_size):
+            yield pois.take(slice(start, start + chunk_size))
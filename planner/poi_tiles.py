@@ -0,0 +1,168 @@
+# planner/poi_tiles.py
+# Tile-based POI store.
+# POIs are cached per slippy-map tile (zoom 14, roughly 1.5 x 1.5 km in central
+# Europe) and per tag set, instead of per exact query string. A radius, bounding
+# box or place query is answered from the tiles it touches; only tiles that are
+# missing or older than the TTL are fetched (in one request covering them) and
+# written back, so overlapping queries share data and refreshes are incremental.
+# Tiles use the binary SightCollection format and are memory-mapped on load, so a
+# cache hit does not parse anything or build Sight objects until they are needed.
+import hashlib
+import json
+import math
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import shapely
+
+from .sight_collection import SightCollection #p
+
+TILE_DIR = Path("cache") / "poi_tiles"
+TILE_ZOOM = 14
+DEFAULT_TILE_TTL_SECONDS = 14 * 24 * 3600  # POIs change slowly
+METERS_PER_DEGREE_LAT = 111_320
+
+Tile = Tuple[int, int]                     # (x, y) at the store's zoom
+BBox = Tuple[float, float, float, float]   # (west, south, east, north), the OSMnx 2 order
+
+
+# --------- Slippy-map tile math --------------------------------------------------
+def tile_xy(lat, lon, zoom: int = TILE_ZOOM):
+    """Tile column/row for (arrays of) lat/lon in degrees."""
+    n = 2 ** zoom
+    lat_rad = np.radians(np.clip(lat, -85.0511, 85.0511))
+    x = np.floor((np.asarray(lon) + 180.0) / 360.0 * n).astype(np.int64)
+    y = np.floor((1.0 - np.arcsinh(np.tan(lat_rad)) / math.pi) / 2.0 * n).astype(np.int64)
+    return np.clip(x, 0, n - 1), np.clip(y, 0, n - 1)
+
+
+def tile_bounds(x: int, y: int, zoom: int = TILE_ZOOM) -> BBox:
+    """(west, south, east, north) of a tile."""
+    n = 2 ** zoom
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def tiles_for_bbox(bbox: BBox, zoom: int = TILE_ZOOM) -> List[Tile]:
+    west, south, east, north = bbox
+    x0, y0 = tile_xy(north, west, zoom)
+    x1, y1 = tile_xy(south, east, zoom)
+    return [(x, y) for x in range(int(x0), int(x1) + 1) for y in range(int(y0), int(y1) + 1)]
+
+
+def radius_bbox(lat: float, lon: float, radius_meters: float) -> BBox:
+    dlat = radius_meters / METERS_PER_DEGREE_LAT
+    dlon = radius_meters / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    return lon - dlon, lat - dlat, lon + dlon, lat + dlat
+
+
+def tags_key(tags: Dict) -> str:
+    """Short stable key for a tag query; tiles are only shared between identical tag sets."""
+    return hashlib.sha256(json.dumps(tags, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+# --------- Store ---------------------------------------------------------------
+class POITileStore:
+    """
+    Per-tile POI cache on disk (one small binary file per tag set and tile).
+
+    Args:
+        fetch: Callable (bbox, tags, refresh) -> SightCollection with the POIs in
+               bbox; refresh=True asks it to bypass any HTTP cache.
+        root: Directory of the tile files.
+        zoom: Slippy-map zoom of the tiles.
+        ttl_seconds: Tiles older than this are refetched on the next query.
+    """
+
+    def __init__(self,
+                 fetch: Callable[[BBox, Dict, bool], SightCollection],
+                 root: Path = TILE_DIR,
+                 zoom: int = TILE_ZOOM,
+                 ttl_seconds: float = DEFAULT_TILE_TTL_SECONDS):
+        self.fetch = fetch
+        self.root = Path(root)
+        self.zoom = zoom
+        self.ttl_seconds = ttl_seconds
+        self.tiles_fetched = 0
+        self.tiles_from_cache = 0
+        self.requests_made = 0
+
+    def _tile_path(self, key: str, tile: Tile) -> Path:
+        return self.root / key / str(self.zoom) / f"{tile[0]}_{tile[1]}.sights"
+
+    def _is_fresh(self, path: Path) -> bool:
+        try:
+            return time.time() - path.stat().st_mtime <= self.ttl_seconds
+        except FileNotFoundError:
+            return False
+
+    def _read_tile(self, path: Path) -> Optional[SightCollection]:
+        try:
+            return SightCollection.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error reading tile {path}: {e}. Will refetch it.")
+            return None
+
+    def _write_tile(self, path: Path, collection: SightCollection) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".tmp{os.getpid()}")
+        try:
+            collection.save(tmp)
+            os.replace(tmp, path)  # readers never see a half-written tile
+        except OSError as e:
+            print(f"Error writing tile {path}: {e}")
+
+    def load_tiles(self, tiles: Iterable[Tile], tags: Dict, refresh: bool = False) -> SightCollection:
+        """
+        All POIs of the given tiles. Missing, stale or unreadable tiles (all of
+        them if refresh) are fetched with one request over their joint bounding
+        box and stored, including tiles that turned out to be empty.
+        """
+        key = tags_key(tags)
+        parts, missing = [], []
+        for tile in tiles:
+            path = self._tile_path(key, tile)
+            cached = None if refresh or not self._is_fresh(path) else self._read_tile(path)
+            if cached is None:
+                missing.append(tile)
+            else:
+                parts.append(cached)
+        self.tiles_from_cache += len(parts)
+
+        if missing:
+            bounds = [tile_bounds(x, y, self.zoom) for x, y in missing]
+            bbox = (min(b[0] for b in bounds), min(b[1] for b in bounds),
+                    max(b[2] for b in bounds), max(b[3] for b in bounds))
+            fetched = self.fetch(bbox, tags, refresh)
+            self.requests_made += 1
+            xs, ys = tile_xy(fetched.lat, fetched.lon, self.zoom)
+            for tile in missing:
+                in_tile = fetched.take((xs == tile[0]) & (ys == tile[1]))
+                self._write_tile(self._tile_path(key, tile), in_tile)
+                parts.append(in_tile)
+            self.tiles_fetched += len(missing)
+        return SightCollection.concat(parts)
+
+    def query_bbox(self, bbox: BBox, tags: Dict, refresh: bool = False) -> SightCollection:
+        west, south, east, north = bbox
+        pois = self.load_tiles(tiles_for_bbox(bbox, self.zoom), tags, refresh)
+        inside = (pois.lon >= west) & (pois.lon <= east) & (pois.lat >= south) & (pois.lat <= north)
+        return pois.take(inside)
+
+    def query_radius(self, lat: float, lon: float, radius_meters: float, tags: Dict,
+                     refresh: bool = False) -> SightCollection:
+        """POIs within radius_meters (great-circle) of (lat, lon)."""
+        pois = self.load_tiles(tiles_for_bbox(radius_bbox(lat, lon, radius_meters), self.zoom), tags, refresh)
+        return pois.take(pois.distances_from((lat, lon)) * 1000 <= radius_meters)
+
+    def query_polygon(self, polygon, tags: Dict, refresh: bool = False) -> SightCollection:
+        """POIs inside a Shapely (multi)polygon in lon/lat, e.g. a geocoded city boundary."""
+        pois = self.load_tiles(tiles_for_bbox(polygon.bounds, self.zoom), tags, refresh)
+        shapely.prepare(polygon)
+        return pois.take(shapely.intersects_xy(polygon, pois.lon, pois.lat))
@@ -0,0 +1,142 @@
+# planner/profiling.py
+# Opt-in cProfile of a single request or CLI run.
+# A profile covers the calling thread (the API handler, the CLI) plus the solver
+# jobs it sends to worker processes: those run under `profiled()` and return
+# their raw stats with the result, which are merged into the request's profile.
+# Profiles are written as standard .prof files (pstats/snakeviz/gprof2dot) under
+# profiles/, named after the hash of the request, and a short list of the top
+# cumulative functions is returned for the response metadata.
+#
+# cProfile hooks the thread it is enabled on, and all requests of the API share
+# the event-loop thread: a second overlapping profile would take over the first
+# one's hook (Python 3.11) or fail to start (3.12+). Only one request is profiled
+# per process at a time; a profiled request that overlaps it runs unprofiled and
+# says so in its summary.
+import cProfile
+import hashlib
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", "profiles"))
+PROFILE_HEADER = "X-Profile"
+TOP_FUNCTIONS = 15
+
+_active = threading.Lock()  # Held by the one RequestProfile that is recording
+
+
+def request_hash(payload: Any) -> str:
+    """Stable hash of a request body (dicts are key-sorted)."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def profiling_requested(headers, query_params) -> bool:
+    """True for an "X-Profile: 1" header or a "?profile=1" query flag."""
+    value = headers.get(PROFILE_HEADER) or query_params.get("profile") or ""
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+class _RawStats:
+    """Raw profiler stats in the shape pstats.Stats.add() accepts."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def profiled(fn, *args, **kwargs):
+    """Runs fn under cProfile; returns (result, raw stats). Picklable for process pools."""
+    profiler = cProfile.Profile()
+    result = profiler.runcall(fn, *args, **kwargs)
+    profiler.create_stats()
+    return result, profiler.stats
+
+
+class RequestProfile:
+    """
+    Profile of one request: `with profile.running():` covers the calling
+    thread, add_worker_stats() merges what worker jobs returned from profiled().
+    """
+
+    def __init__(self, name: str, key: str, directory: Path = PROFILE_DIR):
+        self.name = name
+        self.key = key
+        self.directory = Path(directory)
+        self.path: Optional[Path] = None
+        self._profiler = cProfile.Profile()
+        self._worker_stats: List[dict] = []
+        self._started = time.perf_counter()
+        self.seconds = 0.0
+        self.recorded = False
+        self.note: Optional[str] = None
+
+    @contextmanager
+    def running(self):
+        """Profiles the block, or just runs it if another request profile is recording."""
+        self.recorded = _active.acquire(blocking=False)
+        self.note = None if self.recorded else "Not profiled: another profiled request was running in this process."
+        if self.recorded:
+            # Other requests served by the same event loop meanwhile show up as well
+            self._profiler.enable()
+        try:
+            yield self
+        finally:
+            if self.recorded:
+                self._profiler.disable()
+                _active.release()
+            self.seconds = time.perf_counter() - self._started
+
+    def add_worker_stats(self, raw_stats: dict) -> None:
+        if self.recorded:
+            self._worker_stats.append(raw_stats)
+
+    def stats(self) -> pstats.Stats:
+        stats = pstats.Stats(self._profiler)
+        for raw in self._worker_stats:
+            stats.add(_RawStats(raw))
+        return stats
+
+    def save(self) -> Optional[Path]:
+        """Writes <directory>/<name>_<key>_<timestamp>.prof and returns its path (None if not recorded)."""
+        if not self.recorded:
+            return None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / f"{self.name}_{self.key}_{time.strftime('%Y%m%d-%H%M%S')}.prof"
+        self.stats().dump_stats(str(self.path))
+        return self.path
+
+    def summary(self, top: int = TOP_FUNCTIONS) -> Dict[str, Any]:
+        """Path, wall time and the top functions by cumulative time, for response metadata."""
+        rows = []
+        if self.recorded:
+            rows = sorted(self.stats().stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+        return {
+            "key": self.key,
+            "note": self.note,
+            "path": str(self.path) if self.path is not None else None,
+            "wall_seconds": self.seconds,
+            "worker_profiles": len(self._worker_stats),
+            "top_cumulative": [
+                {"function": f"{file}:{line}({func})", "calls": total_calls,
+                 "tottime": round(tottime, 6), "cumtime": round(cumtime, 6)}
+                for (file, line, func), (_, total_calls, tottime, cumtime, _) in rows
+            ],
+        }
+
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    if summary["note"]:
+        print(f"Profile {summary['key']}: {summary['note']}")
+        return
+    print(f"Profile {summary['key']}: {summary['wall_seconds']:.3f}s, saved to {summary['path']}")
+    print(f"{'cumtime':>10} {'tottime':>10} {'calls':>8}  function")
+    for row in summary["top_cumulative"]:
+        print(f"{row['cumtime']:10.4f} {row['tottime']:10.4f} {row['calls']:>8}  {row['function']}")
@@ -0,0 +1,220 @@
+# planner/route_cache.py
+# Persistent OSRM leg cache.
+# Every routed leg (and every full multi-stop route) is stored in a small SQLite
+# file under cache/, keyed by the OSRM profile and the rounded (lon, lat) pairs.
+# Entries expire after a TTL and the table is kept below `max_entries` by evicting
+# the least recently used rows, so repeated tours over the same landmarks do not
+# touch the network again. Hits only note their access time in memory; the times
+# are written with the next put, eviction or close, so reads stay read-only.
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CACHE_DIR = Path("cache")
+DEFAULT_DB_PATH = CACHE_DIR / "osrm_legs.sqlite"
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600   # road networks change slowly
+DEFAULT_MAX_ENTRIES = 200_000
+COORD_PRECISION = 5                    # 5 decimals ~ 1 m
+MAX_PENDING_TOUCHES = 1000             # Access times held in memory before they are written anyway
+
+Coord = Tuple[float, float]            # (lon, lat), the OSRM order
+
+
+# --------- Polyline encoding (Google algorithm, precision 5) -------------------
+def encode_polyline(coords: Sequence[Coord]) -> str:
+    """Encodes [(lon, lat), ...] into a compact polyline string."""
+    result = []
+    prev_lat = prev_lon = 0
+    for lon, lat in coords:
+        lat_i, lon_i = int(round(lat * 1e5)), int(round(lon * 1e5))
+        for value in (lat_i - prev_lat, lon_i - prev_lon):
+            value = ~(value << 1) if value < 0 else value << 1
+            while value >= 0x20:
+                result.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            result.append(chr(value + 63))
+        prev_lat, prev_lon = lat_i, lon_i
+    return "".join(result)
+
+
+def decode_polyline(encoded: str) -> List[Coord]:
+    """Inverse of encode_polyline, returns [(lon, lat), ...]."""
+    coords: List[Coord] = []
+    index = lat = lon = 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        coords.append((lon / 1e5, lat / 1e5))
+    return coords
+
+
+class LegCache:
+    """SQLite-backed cache of OSRM distances, durations and optional geometries."""
+
+    def __init__(self,
+                 path: Path = DEFAULT_DB_PATH,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self._touched: Dict[str, float] = {}   # key -> access time not yet written
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS legs ("
+                " key TEXT PRIMARY KEY,"
+                " distance REAL NOT NULL,"
+                " duration REAL NOT NULL,"
+                " geometry TEXT,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_legs_accessed ON legs(accessed_at)")
+
+    @staticmethod
+    def make_key(profile: str, coords: Sequence[Coord]) -> str:
+        """'foot|2.29450,48.85840;2.33760,48.86060' - rounded so nearby requests share rows."""
+        points = ";".join(f"{lon:.{COORD_PRECISION}f},{lat:.{COORD_PRECISION}f}" for lon, lat in coords)
+        return f"{profile}|{points}"
+
+    def get(self, profile: str, coords: Sequence[Coord], need_geometry: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Returns {"distance", "duration", "geometry"} or None on a miss.
+        geometry is a decoded [(lon, lat), ...] list or None if it was not stored.
+        """
+        key = self.make_key(profile, coords)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT distance, duration, geometry, created_at FROM legs WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[3] > self.ttl_seconds or (need_geometry and row[2] is None):
+                self.misses += 1
+                return None
+            self._touched[key] = now
+            if len(self._touched) >= MAX_PENDING_TOUCHES:
+                with self._conn:
+                    self._flush_touched_locked()
+            self.hits += 1
+        distance, duration, geometry, _ = row
+        return {
+            "distance": distance,
+            "duration": duration,
+            "geometry": decode_polyline(geometry) if geometry is not None else None,
+        }
+
+    def put(self, profile: str, coords: Sequence[Coord], distance: float, duration: float,
+            geometry: Optional[Sequence[Coord]] = None) -> None:
+        self.put_many(profile, [(coords, distance, duration, geometry)])
+
+    def put_many(self, profile: str,
+                 entries: Iterable[Tuple[Sequence[Coord], float, float, Optional[Sequence[Coord]]]]) -> None:
+        """Stores several (coords, distance, duration, geometry) entries in one transaction."""
+        now = time.time()
+        rows = []
+        for coords, distance, duration, geometry in entries:
+            encoded = encode_polyline(geometry) if geometry is not None else None
+            rows.append((self.make_key(profile, coords), float(distance), float(duration), encoded, now, now))
+        if not rows:
+            return
+        with self._lock:
+            with self._conn:
+                self._flush_touched_locked()
+                # Keep an already stored geometry when a leg is refreshed without one
+                self._conn.executemany(
+                    "INSERT INTO legs (key, distance, duration, geometry, created_at, accessed_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT(key) DO UPDATE SET distance = excluded.distance,"
+                    " duration = excluded.duration,"
+                    " geometry = COALESCE(excluded.geometry, legs.geometry),"
+                    " created_at = excluded.created_at, accessed_at = excluded.accessed_at",
+                    rows,
+                )
+            self._writes_since_evict += len(rows)
+            if self._writes_since_evict >= max(1, self.max_entries // 100):
+                self._evict_locked()
+
+    def evict(self) -> int:
+        """Drops expired rows, then the least recently used ones above max_entries."""
+        with self._lock:
+            return self._evict_locked()
+
+    def _flush_touched_locked(self) -> None:
+        """Writes the access times noted by get(); call inside a transaction."""
+        if self._touched:
+            self._conn.executemany("UPDATE legs SET accessed_at = ? WHERE key = ?",
+                                   [(at, key) for key, at in self._touched.items()])
+            self._touched.clear()
+
+    def _evict_locked(self) -> int:
+        self._writes_since_evict = 0
+        with self._conn:
+            self._flush_touched_locked()
+            removed = self._conn.execute(
+                "DELETE FROM legs WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+            count = self._conn.execute("SELECT COUNT(*) FROM legs").fetchone()[0]
+            if count > self.max_entries:
+                removed += self._conn.execute(
+                    "DELETE FROM legs WHERE key IN ("
+                    " SELECT key FROM legs ORDER BY accessed_at ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                ).rowcount
+        return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM legs").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._touched.clear()
+            with self._conn:
+                self._conn.execute("DELETE FROM legs")
+
+    def close(self) -> None:
+        with self._lock:
+            with self._conn:
+                self._flush_touched_locked()
+            self._conn.close()
+
+
+_default_cache: Optional[LegCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_leg_cache() -> Optional[LegCache]:
+    """
+    Process-wide cache instance. The location can be set with OSRM_LEG_CACHE;
+    set it to "off" to disable caching (returns None).
+    """
+    global _default_cache
+    location = os.environ.get("OSRM_LEG_CACHE", str(DEFAULT_DB_PATH))
+    if location.lower() in ("off", "0", "false", ""):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None or _default_cache.path != Path(location):
+            _default_cache = LegCache(Path(location))
+        return _default_cache
@@ -0,0 +1,398 @@
+# planner/sight_collection.py
+# Columnar storage for large sight sets (tens of thousands of OSM POIs).
+# Instead of one frozen Sight dataclass with a Shapely Point and a Python list
+# per POI, a SightCollection keeps float64 lat/lon arrays, interned category
+# codes and a weather-suitability bitmask. Filtering, distances and
+# serialisation run on the arrays; Sight objects are only built for the rows
+# that are actually handed to the planners.
+import json
+import struct
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+from shapely.geometry import Point
+
+from .sights import Sight #p
+from .spatial_index import SightIndex, _chord_to_km, lat_lon, unit_vectors #p
+
+# Tags known up front; others are appended to a collection's own vocabulary
+WEATHER_TAGS = ("sunny", "cloudy", "rainy", "any")
+MAX_WEATHER_TAGS = 32  # bits in the uint32 mask
+NO_PRIMARY = -1
+
+# Binary file layout (save/load): MAGIC, uint64 header length, JSON header with
+# the vocabularies and column offsets, then the raw column bytes, 8-byte aligned.
+# Names and descriptions are one UTF-8 string table each plus character offsets.
+BINARY_MAGIC = b"SIGHTS01"
+_ALIGN = 8
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+def _string_table(strings: np.ndarray):
+    """(uint8 UTF-8 blob, int64 character offsets of length n + 1)."""
+    texts = [str(v) for v in strings]
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(t) for t in texts], out=offsets[1:])
+    return np.frombuffer("".join(texts).encode("utf-8"), dtype=np.uint8), offsets
+
+
+def _split_string_table(blob: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    text = blob.tobytes().decode("utf-8")
+    bounds = offsets.tolist()
+    strings = np.empty(len(bounds) - 1, dtype=object)
+    strings[:] = [text[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+    return strings
+
+
+def _as_tags(weather_suitability) -> List[str]:
+    """weather_suitability may be a list/tuple of tags or, in older data, a single string."""
+    if weather_suitability is None:
+        return []
+    if isinstance(weather_suitability, str):
+        return [weather_suitability]
+    return [str(w) for w in weather_suitability]
+
+
+class SightCollection:
+    """
+    Array-backed, immutable collection of sights.
+
+    Columns (all of length n):
+        names, descriptions: object arrays of str
+        lat, lon:            float64
+        category_codes:      int32 index into `categories`
+        weather_masks:       uint32, bit i set if `weather_tags[i]` is suitable
+        primary_weather:     int8 index into `weather_tags` of the first tag
+                             (the planners group by it), NO_PRIMARY if none
+
+    Indexing with an int returns a Sight view; slices, boolean masks and index
+    arrays return a new SightCollection sharing the vocabularies.
+    The tag order after the primary tag is not kept (vocabulary order).
+
+    names and descriptions may also be given as zero-argument callables; they are
+    then only built on first access (see load()), and take/concat stay lazy.
+    """
+
+    def __init__(self, names, lat, lon, category_codes, categories, weather_masks, primary_weather,
+                 weather_tags=WEATHER_TAGS, descriptions=None):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        n = len(self.lat)
+        self._names = names if callable(names) else np.asarray(names, dtype=object)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.category_codes = np.asarray(category_codes, dtype=np.int32)
+        self.categories = tuple(categories)
+        self.weather_masks = np.asarray(weather_masks, dtype=np.uint32)
+        self.primary_weather = np.asarray(primary_weather, dtype=np.int8)
+        self.weather_tags = tuple(weather_tags)
+        if descriptions is None:
+            descriptions = np.full(n, "", dtype=object)
+        self._descriptions = descriptions if callable(descriptions) else np.asarray(descriptions, dtype=object)
+        columns = [self.lon, self.category_codes, self.weather_masks, self.primary_weather]
+        columns += [c for c in (self._names, self._descriptions) if not callable(c)]
+        if any(len(c) != n for c in columns):
+            raise ValueError("All SightCollection columns must have the same length")
+        if len(self.weather_tags) > MAX_WEATHER_TAGS:
+            raise ValueError(f"At most {MAX_WEATHER_TAGS} distinct weather tags are supported")
+
+    @property
+    def names(self) -> np.ndarray:
+        if callable(self._names):
+            self._names = np.asarray(self._names(), dtype=object)
+        return self._names
+
+    @property
+    def descriptions(self) -> np.ndarray:
+        if callable(self._descriptions):
+            self._descriptions = np.asarray(self._descriptions(), dtype=object)
+        return self._descriptions
+
+    def _lazy_column(self, attr: str, select: Callable[[np.ndarray], np.ndarray]):
+        """select(column) now if the column is loaded, otherwise a callable that does it on first access."""
+        if callable(getattr(self, "_" + attr)):
+            return lambda: select(getattr(self, attr))
+        return select(getattr(self, attr))
+
+    # --------- construction --------------------------------------------------
+    @classmethod
+    def from_columns(cls, names: Sequence[str], lat, lon, categories: Sequence[str],
+                     weather_suitability: Sequence, descriptions: Optional[Sequence[str]] = None,
+                     weather_delimiter: Optional[str] = None) -> "SightCollection":
+        """
+        Builds a collection from per-sight columns (categories and tags as strings).
+        weather_suitability holds a list of tags per sight, or delimited strings
+        such as "rainy|any" if weather_delimiter is given. Each distinct value is
+        encoded once, so large columns with few distinct values are cheap.
+        """
+        category_vocab, category_codes = np.unique(np.asarray(categories, dtype=str), return_inverse=True)
+        weather_tags = list(WEATHER_TAGS)
+        tag_bit = {t: i for i, t in enumerate(weather_tags)}
+        encoded = {}  # distinct value -> (mask, primary)
+
+        def encode(tags):
+            mask = 0
+            for tag in tags:
+                if tag not in tag_bit:
+                    tag_bit[tag] = len(weather_tags)
+                    weather_tags.append(tag)
+                    if len(weather_tags) > MAX_WEATHER_TAGS:
+                        raise ValueError(f"At most {MAX_WEATHER_TAGS} distinct weather tags are supported")
+                mask |= 1 << tag_bit[tag]
+            return mask, tag_bit[tags[0]] if tags else NO_PRIMARY
+
+        masks, primary = [], []
+        for value in weather_suitability:
+            key = value if isinstance(value, (str, tuple)) or value is None else tuple(value)
+            hit = encoded.get(key)
+            if hit is None:
+                if weather_delimiter is not None and isinstance(value, str):
+                    tags = [t for t in value.split(weather_delimiter) if t]
+                else:
+                    tags = _as_tags(value)
+                hit = encoded[key] = encode(tags)
+            masks.append(hit[0])
+            primary.append(hit[1])
+        return cls(names, lat, lon, category_codes.reshape(-1), category_vocab.tolist(),
+                   np.array(masks, dtype=np.uint32), np.array(primary, dtype=np.int8), weather_tags, descriptions)
+
+    def weather_strings(self, delimiter: str = "|") -> np.ndarray:
+        """Object array of each sight's tags joined by delimiter (primary tag first), built per distinct mask."""
+        pairs = self.weather_masks.astype(np.int64) << 8 | (self.primary_weather.astype(np.int64) & 0xFF)
+        _, first_rows, inverse = np.unique(pairs, return_index=True, return_inverse=True)
+        joined = np.empty(len(first_rows), dtype=object)
+        joined[:] = [delimiter.join(self._weather_list(int(i))) for i in first_rows]
+        return joined[inverse.reshape(-1)]
+
+    @classmethod
+    def from_sights(cls, sights: Iterable[Sight]) -> "SightCollection":
+        """Packs a list of Sight objects (Shapely or (lat, lon) locations) into columns."""
+        sights = list(sights)
+        coords = np.array([lat_lon(s.location) for s in sights], dtype=np.float64).reshape(-1, 2)
+        return cls.from_columns(
+            names=[s.name for s in sights],
+            lat=coords[:, 0],
+            lon=coords[:, 1],
+            categories=[str(s.category) for s in sights],
+            weather_suitability=[s.weather_suitability for s in sights],
+            descriptions=[s.description or "" for s in sights],
+        )
+
+    @classmethod
+    def empty(cls) -> "SightCollection":
+        return cls([], [], [], [], (), [], [])
+
+    @classmethod
+    def concat(cls, collections: Iterable["SightCollection"]) -> "SightCollection":
+        """Stacks collections; category codes and weather bits are remapped onto merged vocabularies."""
+        collections = [c for c in collections if len(c)]
+        if not collections:
+            return cls.empty()
+        categories = sorted(set().union(*(c.categories for c in collections)))
+        category_index = {c: i for i, c in enumerate(categories)}
+        weather_tags = list(WEATHER_TAGS)
+        for c in collections:
+            weather_tags += [t for t in c.weather_tags if t not in weather_tags]
+        tag_index = {t: i for i, t in enumerate(weather_tags)}
+
+        codes, masks, primaries = [], [], []
+        for c in collections:
+            code_map = np.array([category_index[cat] for cat in c.categories], dtype=np.int32)
+            codes.append(code_map[c.category_codes])
+            mask = np.zeros(len(c), dtype=np.uint32)
+            for bit, tag in enumerate(c.weather_tags):
+                mask |= ((c.weather_masks >> np.uint32(bit)) & np.uint32(1)) << np.uint32(tag_index[tag])
+            masks.append(mask)
+            # The trailing NO_PRIMARY entry is what index -1 (no primary tag) maps to
+            primary_map = np.array([tag_index[t] for t in c.weather_tags] + [NO_PRIMARY], dtype=np.int8)
+            primaries.append(primary_map[c.primary_weather])
+
+        def stacked(attr):
+            if any(callable(getattr(c, "_" + attr)) for c in collections):
+                return lambda: np.concatenate([getattr(c, attr) for c in collections])
+            return np.concatenate([getattr(c, attr) for c in collections])
+
+        return cls(stacked("names"),
+                   np.concatenate([c.lat for c in collections]),
+                   np.concatenate([c.lon for c in collections]),
+                   np.concatenate(codes), categories, np.concatenate(masks), np.concatenate(primaries),
+                   weather_tags, stacked("descriptions"))
+
+    # --------- Sight views ---------------------------------------------------
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def __getitem__(self, key) -> Union[Sight, "SightCollection"]:
+        if isinstance(key, (int, np.integer)):
+            return self._sight(int(key))
+        return self.take(key)
+
+    def __iter__(self) -> Iterator[Sight]:
+        for i in range(len(self)):
+            yield self._sight(i)
+
+    def _weather_list(self, i: int) -> List[str]:
+        mask = int(self.weather_masks[i])
+        primary = int(self.primary_weather[i])
+        tags = [self.weather_tags[primary]] if primary != NO_PRIMARY else []
+        tags += [t for bit, t in enumerate(self.weather_tags) if mask >> bit & 1 and bit != primary]
+        return tags
+
+    def _sight(self, i: int) -> Sight:
+        if i < 0:
+            i += len(self)
+        return Sight(
+            name=self.names[i],
+            location=Point(self.lon[i], self.lat[i]),
+            category=self.categories[self.category_codes[i]],
+            weather_suitability=self._weather_list(i),
+            description=self.descriptions[i],
+        )
+
+    def to_sights(self) -> List[Sight]:
+        return list(self)
+
+    def take(self, selector) -> "SightCollection":
+        """Rows selected by a slice, boolean mask or index array; vocabularies are shared."""
+        return SightCollection(self._lazy_column("names", lambda c: c[selector]),
+                               self.lat[selector], self.lon[selector],
+                               self.category_codes[selector], self.categories, self.weather_masks[selector],
+                               self.primary_weather[selector], self.weather_tags,
+                               self._lazy_column("descriptions", lambda c: c[selector]))
+
+    # --------- array queries -------------------------------------------------
+    @property
+    def coords(self) -> np.ndarray:
+        """(n, 2) float64 array of (lat, lon), the layout sight_coordinates() returns."""
+        return np.column_stack((self.lat, self.lon))
+
+    def weather_bit(self, tag: str) -> int:
+        """Mask bit for a tag, 0 if no sight in the collection carries it."""
+        try:
+            return 1 << self.weather_tags.index(tag)
+        except ValueError:
+            return 0
+
+    def suitable_for(self, weather_condition: str) -> np.ndarray:
+        """Boolean mask, same rule as is_weather_suitable: the condition or 'any'."""
+        bits = self.weather_bit(weather_condition) | self.weather_bit("any")
+        return (self.weather_masks & np.uint32(bits)) != 0
+
+    def in_categories(self, categories: Iterable[str]) -> np.ndarray:
+        """Boolean mask of the sights whose category is one of `categories`."""
+        wanted = set(categories)
+        codes = [code for code, c in enumerate(self.categories) if c in wanted]
+        return np.isin(self.category_codes, codes)
+
+    def primary_weather_tags(self) -> np.ndarray:
+        """Object array with each sight's primary tag ("any" if it has none), for grouping."""
+        vocab = np.asarray(self.weather_tags + ("any",), dtype=object)
+        return vocab[self.primary_weather]  # NO_PRIMARY (-1) picks the trailing "any"
+
+    def distances_from(self, location) -> np.ndarray:
+        """Great-circle km from location to every sight."""
+        vec = unit_vectors(lat_lon(location))[0]
+        return _chord_to_km(np.linalg.norm(unit_vectors(self.coords) - vec, axis=1))
+
+    def index(self) -> SightIndex:
+        """A SightIndex over Sight views of this collection, reusing the coordinate arrays."""
+        return SightIndex(self.to_sights(), self.coords)
+
+    # --------- serialisation -------------------------------------------------
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Plain arrays (e.g. for np.savez); from_arrays() restores the collection."""
+        return {
+            "names": self.names.astype(str),
+            "lat": self.lat,
+            "lon": self.lon,
+            "category_codes": self.category_codes,
+            "categories": np.asarray(self.categories, dtype=str),
+            "weather_masks": self.weather_masks,
+            "primary_weather": self.primary_weather,
+            "weather_tags": np.asarray(self.weather_tags, dtype=str),
+            "descriptions": self.descriptions.astype(str),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "SightCollection":
+        return cls(
+            names=np.asarray(arrays["names"]).astype(object),
+            lat=arrays["lat"],
+            lon=arrays["lon"],
+            category_codes=arrays["category_codes"],
+            categories=np.asarray(arrays["categories"]).tolist(),
+            weather_masks=arrays["weather_masks"],
+            primary_weather=arrays["primary_weather"],
+            weather_tags=np.asarray(arrays["weather_tags"]).tolist(),
+            descriptions=np.asarray(arrays["descriptions"]).astype(object),
+        )
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Writes the compact binary format that load() memory-maps."""
+        names_blob, name_offsets = _string_table(self.names)
+        desc_blob, desc_offsets = _string_table(self.descriptions)
+        columns = {
+            "lat": self.lat, "lon": self.lon, "category_codes": self.category_codes,
+            "weather_masks": self.weather_masks, "primary_weather": self.primary_weather,
+            "names": names_blob, "name_offsets": name_offsets,
+            "descriptions": desc_blob, "description_offsets": desc_offsets,
+        }
+        specs, offset = {}, 0
+        for name, column in columns.items():
+            column = np.ascontiguousarray(column)
+            columns[name] = column
+            specs[name] = {"dtype": column.dtype.str, "offset": offset, "count": len(column)}
+            offset = _aligned(offset + column.nbytes)
+        header = json.dumps({"n": len(self), "categories": list(self.categories),
+                             "weather_tags": list(self.weather_tags), "columns": specs}).encode("utf-8")
+        data_start = _aligned(len(BINARY_MAGIC) + 8 + len(header))
+        with open(path, "wb") as f:
+            f.write(BINARY_MAGIC + struct.pack("<Q", len(header)) + header)
+            for name, column in columns.items():
+                f.seek(data_start + specs[name]["offset"])
+                f.write(column.tobytes())
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap: bool = True) -> "SightCollection":
+        """
+        Opens a file written by save(). With mmap the numeric columns are views
+        into the memory-mapped file, and names/descriptions are only decoded from
+        their string tables when first used, so opening is close to free.
+        """
+        with open(path, "rb") as f:
+            if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+                raise ValueError(f"{path} is not a SightCollection file")
+            (header_len,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_len))
+        data_start = _aligned(len(BINARY_MAGIC) + 8 + header_len)
+        buffer = np.memmap(path, dtype=np.uint8, mode="r") if mmap else np.fromfile(path, dtype=np.uint8)
+
+        def column(name):
+            spec = header["columns"][name]
+            dtype = np.dtype(spec["dtype"])
+            start = data_start + spec["offset"]
+            return buffer[start:start + spec["count"] * dtype.itemsize].view(dtype)
+
+        return cls(lambda: _split_string_table(column("names"), column("name_offsets")),
+                   column("lat"), column("lon"), column("category_codes"), header["categories"],
+                   column("weather_masks"), column("primary_weather"), header["weather_tags"],
+                   lambda: _split_string_table(column("descriptions"), column("description_offsets")))
+
+    def to_records(self) -> List[Dict]:
+        """The JSON layout used by the POI cache in planner/osm.py."""
+        return [
+            {
+                "name": self.names[i],
+                "lon": float(self.lon[i]),
+                "lat": float(self.lat[i]),
+                "category": self.categories[self.category_codes[i]],
+                "weather_suitability": self._weather_list(i),
+                "description": self.descriptions[i],
+            }
+            for i in range(len(self))
+        ]
+
+    def __repr__(self):
+        return f"SightCollection({len(self)} sights, {len(self.categories)} categories)"
@@ -0,0 +1,172 @@
+# planner/spatial_index.py
+# Spatial index over the sights of a city.
+# Sights are stored as 3-D unit vectors in a KD-tree: the straight-line (chord)
+# distance between unit vectors grows monotonically with the great-circle
+# distance, so nearest-k and radius queries are exact haversine queries without
+# any projection. Bounding boxes are answered from the latitude-sorted coordinates.
+# Build it once per city load and share it between the planning steps.
+import math
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+# Candidate sets smaller than 1/SUBSET_SCAN_RATIO of the index are scanned
+# directly instead of walking the tree past all the sights outside the set
+SUBSET_SCAN_RATIO = 8
+
+
+def lat_lon(location) -> Tuple[float, float]:
+    """(lat, lon) floats for a Shapely Point (x=lon, y=lat), a Meteostat Point or a (lat, lon) pair."""
+    if hasattr(location, "x") and hasattr(location, "y"):
+        return location.y, location.x
+    if hasattr(location, "latitude") and hasattr(location, "longitude"):
+        return location.latitude, location.longitude
+    if isinstance(location, (tuple, list)) and len(location) == 2:
+        return float(location[0]), float(location[1])
+    raise TypeError(f"Unsupported location type: {type(location)}")
+
+
+def unit_vectors(coords: np.ndarray) -> np.ndarray:
+    """(n, 3) unit vectors on the sphere for (lat, lon) rows in degrees."""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    lat, lon = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def _chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2.0, 0.0, 1.0))
+
+
+def _km_to_chord(km: float) -> float:
+    return 2 * math.sin(min(km / (2 * EARTH_RADIUS_KM), math.pi / 2))
+
+
+class SightIndex:
+    """
+    Nearest-k, within-radius and bounding-box queries over a fixed list of sights.
+
+    Args:
+        sights: The sights to index; results are returned as these objects.
+        coords: Optional (n, 2) array of (lat, lon) rows for the sights, e.g. from
+                sight_coordinates(), to skip reading the locations again.
+
+    Distances are great-circle kilometres, locations may be Shapely points
+    (x=lon, y=lat), Meteostat points or (lat, lon) tuples.
+    """
+
+    def __init__(self, sights: Sequence, coords: Optional[np.ndarray] = None):
+        self.sights = list(sights)
+        if coords is None:
+            coords = [lat_lon(s.location) for s in self.sights]
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        if len(self.coords) != len(self.sights):
+            raise ValueError("coords must have one (lat, lon) row per sight")
+        self._vectors = unit_vectors(self.coords)
+        if len(self.sights):
+            from scipy.spatial import cKDTree  # Loaded with the first index, not at import
+            self._tree = cKDTree(self._vectors)
+        else:
+            self._tree = None
+        self._position = {s: i for i, s in enumerate(self.sights)}  # Sight hashes by name
+        self._lat_order = np.argsort(self.coords[:, 0], kind="stable")
+        self._sorted_lat = self.coords[self._lat_order, 0]
+
+    def __len__(self) -> int:
+        return len(self.sights)
+
+    def __contains__(self, sight) -> bool:
+        return sight in self._position
+
+    def positions(self, sights: Iterable) -> np.ndarray:
+        """Row numbers of the given sights in this index (KeyError for unknown sights)."""
+        return np.fromiter((self._position[s] for s in sights), dtype=np.intp)
+
+    def distances(self, location, sights: Optional[Iterable] = None) -> np.ndarray:
+        """Great-circle km from location to every indexed sight, or to the given ones in order."""
+        vec = unit_vectors(lat_lon(location))[0]
+        vectors = self._vectors if sights is None else self._vectors[self.positions(sights)]
+        return _chord_to_km(np.linalg.norm(vectors - vec, axis=1))
+
+    def by_distance(self, location, sights: Optional[Iterable] = None) -> List:
+        """The indexed sights (or the given subset) sorted by distance from location, ties in list order."""
+        candidates = self.sights if sights is None else list(sights)
+        order = np.argsort(self.distances(location, candidates), kind="stable")
+        return [candidates[i] for i in order]
+
+    def iter_nearest(self, location, candidates: Optional[Iterable] = None,
+                     exclude: Optional[set] = None) -> Iterator[Tuple[object, float]]:
+        """
+        Yields (sight, km) in increasing distance from location.
+
+        candidates restricts the search to a subset of the indexed sights and
+        exclude skips sights (e.g. already visited ones). The tree is queried
+        with a growing k, so stopping early only pays for the sights seen.
+        """
+        if not self.sights:
+            return
+        if candidates is not None:
+            candidates = list(candidates)
+            if len(candidates) * SUBSET_SCAN_RATIO < len(self.sights):
+                dists = self.distances(location, candidates)
+                for i in np.argsort(dists, kind="stable"):
+                    if not exclude or candidates[i] not in exclude:
+                        yield candidates[i], float(dists[i])
+                return
+            allowed = np.zeros(len(self.sights), dtype=bool)
+            allowed[self.positions(candidates)] = True
+        else:
+            allowed = None
+
+        vec = unit_vectors(lat_lon(location))[0]
+        n = len(self.sights)
+        k, seen = 8, 0
+        while seen < n:
+            k = min(k, n)
+            chords, idx = self._tree.query(vec, k=k)
+            chords, idx = np.atleast_1d(chords), np.atleast_1d(idx)
+            for chord, i in zip(chords[seen:], idx[seen:]):
+                if allowed is not None and not allowed[i]:
+                    continue
+                sight = self.sights[i]
+                if exclude and sight in exclude:
+                    continue
+                yield sight, float(_chord_to_km(chord))
+            seen = k
+            k *= 4
+
+    def nearest(self, location, k: int = 1, candidates: Optional[Iterable] = None,
+                exclude: Optional[set] = None) -> List:
+        """The k sights closest to location (fewer if the index runs out)."""
+        result = []
+        for sight, _ in self.iter_nearest(location, candidates, exclude):
+            if len(result) >= k:
+                break
+            result.append(sight)
+        return result
+
+    def within_radius(self, location, radius_km: float) -> List:
+        """All sights within radius_km of location, nearest first."""
+        if not self.sights or radius_km < 0:
+            return []
+        vec = unit_vectors(lat_lon(location))[0]
+        idx = np.asarray(self._tree.query_ball_point(vec, _km_to_chord(radius_km)), dtype=np.intp)
+        order = np.argsort(np.linalg.norm(self._vectors[idx] - vec, axis=1), kind="stable")
+        return [self.sights[i] for i in idx[order]]
+
+    def in_bbox(self, south: float, west: float, north: float, east: float) -> List:
+        """
+        Sights inside the box, in index order. A box with west > east crosses the
+        antimeridian.
+        """
+        lo = np.searchsorted(self._sorted_lat, south, side="left")
+        hi = np.searchsorted(self._sorted_lat, north, side="right")
+        rows = self._lat_order[lo:hi]
+        lon = self.coords[rows, 1]
+        if west <= east:
+            rows = rows[(lon >= west) & (lon <= east)]
+        else:
+            rows = rows[(lon >= west) | (lon <= east)]
+        return [self.sights[i] for i in np.sort(rows)]
@@ -1,14 +1,24 @@
 # tour_planner_orchestrator.py
 from collections import defaultdict
 import math
-from typing import Dict, List, Tuple
+import sys
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import shapely
 from shapely.geometry import Point as ShapelyPoint
-from meteostat import Point as MeteostatPoint
 
 # --------- 1. Distance helpers -------------------------------------------------
-from meteostat import Point
-
 from .sights import Sight
+from .sight_collection import SightCollection
+from .spatial_index import SightIndex, lat_lon, unit_vectors
+from .tracing import inc, span #p
+
+EARTH_RADIUS_KM = 6371
+
+
+def _meteostat_point_type():
+    """meteostat.Point once meteostat is loaded; before that nothing can be one, so it is not imported here."""
+    return getattr(sys.modules.get("meteostat"), "Point", ())
 
 
 def haversine(coord1, coord2):
@@ -16,12 +26,16 @@ def haversine(coord1, coord2):
     #print(f"[DEBUG] Raw coord2: {coord2}, type: {type(coord2)}")
 
     # Convert coord1
-    if isinstance(coord1, (MeteostatPoint, ShapelyPoint)):
-        coord1 = (coord1.lat, coord1.lon) if isinstance(coord1, MeteostatPoint) else (coord1.y, coord1.x)
+    if isinstance(coord1, ShapelyPoint):
+        coord1 = (coord1.y, coord1.x)
+    elif isinstance(coord1, _meteostat_point_type()):
+        coord1 = (coord1.latitude, coord1.longitude)
 
     # Convert coord2
-    if isinstance(coord2, (MeteostatPoint, ShapelyPoint)):
-        coord2 = (coord2.lat, coord2.lon) if isinstance(coord2, MeteostatPoint) else (coord2.y, coord2.x)
+    if isinstance(coord2, ShapelyPoint):
+        coord2 = (coord2.y, coord2.x)
+    elif isinstance(coord2, _meteostat_point_type()):
+        coord2 = (coord2.latitude, coord2.longitude)
 
     lat1, lon1 = map(math.radians, coord1)
     lat2, lon2 = map(math.radians, coord2)
@@ -35,70 +49,137 @@ def haversine(coord1, coord2):
          math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2)
     c = 2 * math.asin(math.sqrt(a))
 
-    r = 6371  # Earth radius in kilometers
+    r = EARTH_RADIUS_KM  # Earth radius in kilometers
     distance = c * r
     #print(f"[DEBUG] Haversine distance: {distance} km")
     return distance
 
-def build_distance_matrix(sights):
-    n = len(sights)
-    mat = [[0.0]*n for _ in range(n)]
-    for i in range(n):
-        # Determine (lat_i, lon_i)
-        if isinstance(sights[i].location, ShapelyPoint):  # <-- Use ShapelyPoint here
-            # Assuming ShapelyPoint stores (longitude, latitude) as per your debug: POINT (2.347 48.8529)
-            # So, .x is longitude, .y is latitude.
-            # We need (latitude, longitude) for haversine.
-            lat_i, lon_i = sights[i].location.y, sights[i].location.x
-        elif isinstance(sights[i].location, MeteostatPoint):  # <-- Handle MeteostatPoint
-            # Meteostat Point objects typically have .lat and .lon attributes
-            lat_i, lon_i = sights[i].location.lat, sights[i].location.lon
-        elif isinstance(sights[i].location, tuple):
-            # If it's already a tuple (lat, lon)
-            lat_i, lon_i = sights[i].location
-        else:
-            raise TypeError(
-                f"Unsupported location type for sight {sights[i].name} at index {i}: {type(sights[i].location)}")
-
-        for j in range(i+1, n):
-            # Determine (lat_j, lon_j)
-            if isinstance(sights[j].location, ShapelyPoint):  # <-- Use ShapelyPoint here
-                lat_j, lon_j = sights[j].location.y, sights[j].location.x
-            elif isinstance(sights[j].location, MeteostatPoint):  # <-- Handle MeteostatPoint
-                lat_j, lon_j = sights[j].location.lat, sights[j].location.lon
-            elif isinstance(sights[j].location, tuple):
-                lat_j, lon_j = sights[j].location
-            else:
-                raise TypeError(
-                    f"Unsupported location type for sight {sights[j].name} at index {j}: {type(sights[j].location)}")
+def sight_coordinates(sights) -> np.ndarray:
+    """
+    Extracts all sight locations once into an (n, 2) float64 array of (lat, lon).
+    Shapely points, the common case, are read in a single vectorised call;
+    a SightCollection already holds the columns.
+    """
+    if isinstance(sights, SightCollection):
+        return sights.coords
+    locations = [s.location for s in sights]
+    if not locations:
+        return np.empty((0, 2), dtype=np.float64)
+    if all(isinstance(loc, ShapelyPoint) for loc in locations):
+        xy = shapely.get_coordinates(np.asarray(locations, dtype=object))
+        return np.ascontiguousarray(xy[:, ::-1], dtype=np.float64)
+    coords = []
+    for i, loc in enumerate(locations):
+        try:
+            coords.append(lat_lon(loc))
+        except TypeError:
+            raise TypeError(f"Unsupported location type for sight {sights[i].name} at index {i}: {type(loc)}")
+    return np.asarray(coords, dtype=np.float64)
+
+
+def haversine_matrix(coords_a: np.ndarray, coords_b: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Pairwise great-circle distances in kilometres between (lat, lon) rows of
+    coords_a and coords_b (defaults to coords_a).
 
-            d = haversine((lat_i, lon_i), (lat_j, lon_j)) / 1000  # km
-            mat[i][j] = mat[j][i] = d
+    Uses the identity haversine(a, b) = chord^2 / 4 on unit vectors, so only O(n)
+    trigonometry is needed and the n x n part is a single matrix product plus
+    one arcsin. Agrees with haversine() to well below a metre.
+    """
+    vec_a = unit_vectors(coords_a)
+    vec_b = vec_a if coords_b is None else unit_vectors(coords_b)
+    half_chord_sq = (1.0 - vec_a @ vec_b.T) / 2.0
+    np.clip(half_chord_sq, 0.0, 1.0, out=half_chord_sq)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(half_chord_sq, out=half_chord_sq), out=half_chord_sq)
+
+
+def build_distance_matrix(sights) -> np.ndarray:
+    """
+    Symmetric n x n haversine matrix (km) as a float64 ndarray, which the TSP
+    engines in planner/optimize.py consume without copying.
+    """
+    mat = haversine_matrix(sight_coordinates(sights))
+    np.fill_diagonal(mat, 0.0)
     return mat
 
-# --------- 3. Route optimisation per group (Rust MILP) -------------------------
+# --------- 3. Route optimisation per group -----------------------------------
 #from rust_milp_tsp import solve_tsp  # compiled with maturin
-# NEW PLAN: optimize with python-mip
-from .optimize import solve_tsp
+# The MIP model is now only the opt-in "exact" engine, see planner/optimize.py
+from .optimize import solve_tsp_anytime, choose_tsp_engine, summarise_solver_stats, EXACT_MAX_SIGHTS
 
 
-def optimise_routes(groups) -> Dict[str, List]:
+def optimise_routes(groups,
+                    engine: str = "auto",
+                    time_budget_ms: Optional[float] = None,
+                    exact_max_sights: int = EXACT_MAX_SIGHTS,
+                    stats: Optional[Dict] = None,
+                    matrix_provider=None,
+                    warm_start: Optional[Dict] = None) -> Dict[str, List]:
+    """
+    Orders the sights of every weather group with a TSP engine.
+
+    Args:
+        groups: weather category -> list of sights.
+        engine: "auto" picks per group by size and time budget (exact MIP for
+                tiny groups, heuristic otherwise); any other value forces that engine.
+        time_budget_ms: Optional per-group wall-clock budget. The solver is anytime:
+                        when the deadline hits, the best tour found so far is used.
+        exact_max_sights: Largest group that "auto" hands to the exact engine.
+        stats: Optional dict that receives one TSPResult per solved group.
+        matrix_provider: Optional MatrixProvider (planner/matrix_provider.py) for
+                         road distances/durations; haversine km if None.
+        warm_start: Optional sight -> rank from an earlier solution (see tour_ranks);
+                    a group whose sights are all ranked starts its local search
+                    from that order instead of from scratch.
+    """
     optimised = {}
     for w, sights in groups.items():
         if len(sights) <= 2:
             optimised[w] = sights
             continue
-        mat = build_distance_matrix(sights)
-        order = solve_tsp(mat)
-        optimised[w] = [sights[i] for i in order]
+        with span("matrix", sights=len(sights)):
+            if matrix_provider is not None:
+                mat = matrix_provider.matrix(sights)
+            else:
+                mat = build_distance_matrix(sights)
+        group_engine = engine
+        if engine == "auto":
+            group_engine = choose_tsp_engine(len(sights), time_budget_ms, exact_max_sights)
+        initial_tour = None
+        if warm_start is not None and all(s in warm_start for s in sights):
+            initial_tour = sorted(range(len(sights)), key=lambda i: warm_start[sights[i]])
+        with span("solve", engine=group_engine, sights=len(sights)) as solve_span:
+            result = solve_tsp_anytime(mat, time_budget_ms=time_budget_ms, engine=group_engine,
+                                       initial_tour=initial_tour)
+            solve_span["attrs"].update(status=result.status, gap=result.gap)
+        inc("planner_solver_results_total", engine=result.engine, status=result.status)
+        if stats is not None:
+            stats[w] = result
+        optimised[w] = [sights[i] for i in result.tour]
     return optimised
 
 
+def tour_ranks(tours, ranks: Optional[Dict] = None) -> Dict:
+    """
+    sight -> position over the concatenated tours (a dict of ordered lists), as
+    warm_start for the next solve. Updates and returns `ranks` if given.
+    """
+    ranks = {} if ranks is None else ranks
+    offset = max(ranks.values(), default=-1) + 1
+    for ordered in tours.values():
+        for s in ordered:
+            ranks[s] = offset
+            offset += 1
+    return ranks
+
+
 # --------- 2. Weather-aware grouping helpers -----------------------------------
-def initial_balanced_groups(sights, slot_counts: Dict[str, int], city_center):
+def initial_balanced_groups(sights, slot_counts: Dict[str, int], city_center,
+                            index: Optional[SightIndex] = None):
     """
     Assigns all sights to initial weather-based groups.
     Prioritizes primary weather suitability, then "any" sights.
+    index: optional SightIndex over the sights, reused for the distance sort.
     """
     grouped = defaultdict(list)
 
@@ -133,7 +214,9 @@ def initial_balanced_groups(sights, slot_counts: Dict[str, int], city_center):
 
     if unassigned_sights:
         # Sort unassigned by distance to city_center for a more logical distribution
-        unassigned_sights_sorted = sorted(unassigned_sights, key=lambda s: haversine(city_center, s.location))
+        if index is None:
+            index = SightIndex(unassigned_sights, sight_coordinates(unassigned_sights))
+        unassigned_sights_sorted = index.by_distance(city_center, unassigned_sights)
 
         # Round-robin distribute unassigned sights to available forecast weather categories
         forecast_weather_categories = list(slot_counts.keys())
@@ -270,16 +353,52 @@ def calculate_centroid(sights: List['Sight']) -> Tuple[float, float]:
     return (total_lat / len(sights), total_lon / len(sights))
 
 
+# Stealing priority: the distance to the receiving group is scaled by these factors
+ANY_STEAL_FACTOR = 0.5       # halve distance cost if 'any'
+SUITABLE_STEAL_FACTOR = 0.8  # slightly reduce distance cost if directly suitable
+
+
+def _steal_score(sight, w_target: str, dist_km: float) -> float:
+    if "any" in sight.weather_suitability:
+        return dist_km * ANY_STEAL_FACTOR
+    if w_target in sight.weather_suitability:
+        return dist_km * SUITABLE_STEAL_FACTOR
+    return dist_km
+
+
+def _best_sights_to_steal(index: SightIndex, target_centroid, donor_sights, w_target: str, count: int) -> List['Sight']:
+    """
+    The `count` donor sights with the lowest stealing score. Candidates come from
+    the index nearest first; since no factor is below ANY_STEAL_FACTOR, the search
+    stops once even a halved distance cannot beat the current picks.
+    """
+    best = []  # (score, sight), ascending
+    for s, dist in index.iter_nearest(target_centroid, candidates=donor_sights):
+        if len(best) >= count and dist * ANY_STEAL_FACTOR >= best[-1][0]:
+            break
+        score = _steal_score(s, w_target, dist)
+        if len(best) < count or score < best[-1][0]:
+            best.append((score, s))
+            best.sort(key=lambda x: x[0])
+            del best[count:]
+    return [s for _, s in best]
+
+
 def balance_by_stealing(groups: Dict[str, List['Sight']], slot_counts: Dict[str, int],
-                        city_center: Tuple[float, float]) -> Dict[str, List['Sight']]:
+                        city_center: Tuple[float, float],
+                        index: Optional[SightIndex] = None) -> Dict[str, List['Sight']]:
     """
     Attempts to balance the number of sights per weather group,
     proportional to the number of time slots each weather category covers in the forecast.
     Moves sights from larger groups to smaller ones, prioritizing 'any' sights or
     those suitable for the target group's weather, and favoring sights geographically
     closer to the target group's intended location.
+    index: optional SightIndex covering all grouped sights (built here if None).
     """
     new_groups = {w: list(sights) for w, sights in groups.items()}
+    if index is None:
+        all_sights = [s for sights in new_groups.values() for s in sights]
+        index = SightIndex(all_sights, sight_coordinates(all_sights))
 
     total_sights_in_groups = sum(len(v) for v in new_groups.values())
 
@@ -334,30 +453,9 @@ def balance_by_stealing(groups: Dict[str, List['Sight']], slot_counts: Dict[str,
                     if num_to_steal == 0:
                         continue
 
-                        # Build a list of potential sights to steal, prioritizing by suitability and proximity
-                    potential_sights_to_steal_with_dist = []
-                    for s in new_groups[w_donor]:
-                        # Calculate distance to target centroid
-                        dist_to_target = haversine(target_centroid, s.location)
-
-                        # Assign a 'priority score' for stealing:
-                        # Lower score = higher priority
-                        # 'any' suitability gets a bonus (lower score)
-                        # suitability for target category gets a bonus
-                        # Distance is a primary factor
-                        priority_score = dist_to_target
-                        if "any" in s.weather_suitability:
-                            priority_score *= 0.5  # Halve distance cost if 'any'
-                        elif w_target in s.weather_suitability:
-                            priority_score *= 0.8  # Slightly reduce distance cost if directly suitable
-
-                        potential_sights_to_steal_with_dist.append((s, priority_score))
-
-                    # Sort candidates by their priority score (lowest score first)
-                    potential_sights_to_steal_with_dist.sort(key=lambda x: x[1])
-
-                    # Extract the actual sights from the sorted list
-                    sights_actually_stolen = [s for s, score in potential_sights_to_steal_with_dist[:num_to_steal]]
+                    # Pick the sights to steal, prioritizing by suitability and proximity
+                    sights_actually_stolen = _best_sights_to_steal(index, target_centroid, new_groups[w_donor],
+                                                                   w_target, num_to_steal)
 
                     if len(sights_actually_stolen) > 0:
                         for s in sights_actually_stolen:
@@ -378,11 +476,26 @@ def plan_citytour_iterative(
         sights: List[Sight],
         city_center: tuple,
         weather_forecast: Dict[str, str],  # e.g., {'morning':'cloudy','afternoon':'sunny','evening':'cloudy'}
-        max_iters: int = 4
+        max_iters: int = 4,
+        engine: str = "auto",
+        time_budget_ms: Optional[float] = None,
+        solver_stats: Optional[Dict] = None,
+        matrix_provider=None,
+        index: Optional[SightIndex] = None,
+        warm_start: Optional[Dict] = None
 ) -> Dict[str, List[Sight]]:  # Now explicitly returns slot-keyed dictionary
     """
     sights: list of Sight objects, each with .location (lat,lon) & .weather_suitability (list[str])
     weather_forecast: {'morning':'cloudy','afternoon':'sunny','evening':'cloudy'}
+    engine: TSP engine for the groups, see optimise_routes
+    time_budget_ms: per-group solver budget (anytime mode), None = no limit
+    solver_stats: optional dict that is filled with the solver summary of the
+                  last iteration (per-group status, lengths and optimality gap)
+    matrix_provider: optional MatrixProvider to optimise on OSRM walking/cycling
+                     time or distance; it is queried once for all sights
+    index: optional SightIndex covering (at least) the sights, e.g. shared across days
+    warm_start: optional sight -> rank of a previous solution (tour_ranks); every
+                iteration after the first warm-starts from the one before
     Returns dict time_slot->ordered list of sights
     """
     # 1. Determine slot counts for each weather category based on forecast
@@ -392,22 +505,42 @@ def plan_citytour_iterative(
 
     # 2. Initial grouping of sights into weather categories
     # This now ensures all sights are initially placed into a group
-    groups = initial_balanced_groups(sights, slot_counts, city_center)
+    # One spatial index over all sights serves the distance sort and the stealing below
+    with span("grouping", sights=len(sights)):
+        if index is None:
+            index = SightIndex(sights, sight_coordinates(sights))
+        groups = initial_balanced_groups(sights, slot_counts, city_center, index=index)
 
     # 3. Iteratively optimize routes within groups and rebalance
     # The 'groups' will be refined over iterations, and sights within them will be optimally ordered.
+    # Fetch the cost matrix once for the whole set, groups use sub-matrices of it
+    if matrix_provider is not None:
+        with span("matrix_fetch", sights=len(sights)):
+            matrix_provider = matrix_provider.for_sights(sights)
+
+    group_results = {}
     for _ in range(max_iters):
-        # Optimize routes within each weather group using MILP
-        optimised_weather_groups = optimise_routes(groups)  # This returns weather-keyed groups, ordered
+        # Optimize routes within each weather group (heuristic or exact engine)
+        group_results = {}
+        optimised_weather_groups = optimise_routes(groups, engine=engine,
+                                                   time_budget_ms=time_budget_ms, stats=group_results,
+                                                   matrix_provider=matrix_provider,
+                                                   warm_start=warm_start)  # This returns weather-keyed groups, ordered
+        # Sights kept in their group are already ordered; the next pass only repairs around moved ones
+        warm_start = tour_ranks(optimised_weather_groups, dict(warm_start or {}))
 
         # Rebalance sights across groups (primarily to fill empty ones or re-distribute)
-        new_groups = balance_by_stealing(optimised_weather_groups, slot_counts, city_center)
+        with span("balancing"):
+            new_groups = balance_by_stealing(optimised_weather_groups, slot_counts, city_center, index=index)
 
         # Check for stabilization (if groups haven't changed much)
         if new_groups == groups:
             break
         groups = new_groups
 
+    if solver_stats is not None:
+        solver_stats.update(summarise_solver_stats(group_results))
+
     # 4. Final step: Distribute the optimally ordered sights (from 'groups') into actual time slots
     # Initialize the final tour plan structure with all time slots from the forecast
     final_tour_plan = {slot: [] for slot in weather_forecast.keys()}
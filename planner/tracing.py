@@ -0,0 +1,227 @@
+# planner/tracing.py
+# Lightweight spans and metrics for the planning hot path.
+# `with span("solve", engine="heuristic"):` times a phase, feeds the
+# planner_phase_seconds histogram and, if TRACE_FILE is set, appends the span as
+# one JSON line (trace/span/parent ids, attributes, duration) to that file.
+# `inc()` counts events such as OSRM requests or solver outcomes. The registry
+# renders itself in the Prometheus text format for the API's /metrics.
+#
+# Solvers run in worker processes whose registry nobody scrapes: a worker wraps
+# its job in `capture()`, hands the recorded events back with the result and
+# the API process `replay()`s them into its own registry and trace.
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+PHASE_METRIC = "planner_phase_seconds"
+PHASE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+Event = Tuple[str, Any]  # ("span", record) | ("inc", (name, value, labels))
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets: Iterable[float] = PHASE_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class MetricsRegistry:
+    """Counters and histograms by (name, labels); thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._help: Dict[str, str] = {PHASE_METRIC: "Wall time of the planning phases."}
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def counter_value(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get((name, _labels(labels)), 0.0)
+
+    def histogram(self, name: str, **labels) -> Optional[Histogram]:
+        with self._lock:
+            return self._histograms.get((name, _labels(labels)))
+
+    def render(self, gauges: Iterable[Tuple[str, str, Dict[str, Any], float]] = ()) -> str:
+        """
+        Prometheus text exposition of everything recorded plus extra
+        (name, help, labels, value) gauges, e.g. cache hit ratios read at scrape time.
+        """
+        lines: List[str] = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines += [f"# HELP {name} {self._help.get(name, name)}", f"# TYPE {name} counter"]
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), histogram in histograms:
+            if name not in seen:
+                seen.add(name)
+                lines += [f"# HELP {name} {self._help.get(name, name)}", f"# TYPE {name} histogram"]
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', f'{bound:g}'),))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {histogram.count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        families: Dict[str, Tuple[str, List[str]]] = {}  # Samples of one metric must stay together
+        for name, help_text, labels, value in gauges:
+            families.setdefault(name, (help_text, []))[1].append(f"{name}{_format_labels(_labels(labels))} {value:g}")
+        for name, (help_text, samples) in families.items():
+            if name not in seen:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            lines += samples
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+REGISTRY = MetricsRegistry()
+
+_current_span: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_span", default=None)
+_captured: ContextVar[Optional[List[Event]]] = ContextVar("captured_events", default=None)
+_trace_lock = threading.Lock()
+
+
+def trace_file() -> Optional[str]:
+    """JSONL trace destination from TRACE_FILE, None if tracing to a file is off."""
+    path = os.environ.get("TRACE_FILE", "")
+    return None if path.lower() in ("", "off", "0", "false") else path
+
+
+def _write_trace(record: Dict[str, Any]) -> None:
+    path = trace_file()
+    if path is None:
+        return
+    line = json.dumps(record, default=str) + "\n"
+    with _trace_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def _finish(record: Dict[str, Any]) -> None:
+    captured = _captured.get()
+    if captured is not None:
+        captured.append(("span", record))
+        return
+    REGISTRY.observe(PHASE_METRIC, record["duration_s"], phase=record["name"])
+    _write_trace(record)
+
+
+def inc(name: str, value: float = 1.0, **labels) -> None:
+    """Increments a counter (recorded for replay when inside capture())."""
+    captured = _captured.get()
+    if captured is not None:
+        captured.append(("inc", (name, value, labels)))
+    else:
+        REGISTRY.inc(name, value, **labels)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Times the block as phase `name`. Yields the span record; set
+    record["attrs"][...] for results known only at the end (e.g. the solver status).
+    """
+    parent = _current_span.get()
+    record = {
+        "trace_id": parent["trace_id"] if parent else uuid.uuid4().hex[:16],
+        "span_id": uuid.uuid4().hex[:16],
+        "parent_id": parent["span_id"] if parent else None,
+        "name": name,
+        "attrs": attrs,
+        "start": time.time(),
+        "pid": os.getpid(),
+    }
+    token = _current_span.set(record)
+    start = time.perf_counter()
+    record["status"] = "ok"
+    try:
+        yield record
+    except BaseException as e:
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record["duration_s"] = time.perf_counter() - start
+        _current_span.reset(token)
+        _finish(record)
+
+
+@contextmanager
+def capture():
+    """Collects the spans and counters of the block instead of recording them; yields the event list."""
+    events: List[Event] = []
+    token = _captured.set(events)
+    span_token = _current_span.set(None)
+    try:
+        yield events
+    finally:
+        _current_span.reset(span_token)
+        _captured.reset(token)
+
+
+def replay(events: Iterable[Event]) -> None:
+    """Records captured events here; their root spans become children of the current span."""
+    parent = _current_span.get()
+    for kind, payload in events:
+        if kind == "inc":
+            name, value, labels = payload
+            inc(name, value, **labels)
+            continue
+        if parent is not None:
+            roots = payload["parent_id"] is None
+            payload = {**payload, "trace_id": parent["trace_id"],
+                       "parent_id": parent["span_id"] if roots else payload["parent_id"]}
+        _finish(payload)
@@ -22,4 +22,20 @@ def visualize_sights_on_map(sights):
         ).add_to(tourist_map)
 
     tourist_map.save("tourist_sights_map.html")
-    print("Map has been saved as tourist_sights_map.html. Open it in your browser to view the interactive map!")
\ No newline at end of file
+    print("Map has been saved as tourist_sights_map.html. Open it in your browser to view the interactive map!")
+
+
+if __name__ == "__main__":
+    # python -m planner.visualize - the sample map planner/sights.py used to write on import
+    from shapely.geometry import Point
+    from .sights import Sight
+
+    sights = [
+        Sight(name="Louvre Museum", location=Point(2.3376, 48.8606), category="museum", weather_suitability="indoor",
+              description="A world-famous art museum in Paris."),
+        Sight(name="Eiffel Tower", location=Point(2.2945, 48.8584), category="monument", weather_suitability="outdoor",
+              description="An iconic symbol of Paris."),
+        Sight(name="Café de Flore", location=Point(2.3336, 48.8545), category="café", weather_suitability="sunny",
+              description="A historic and trendy café in Paris."),
+    ]
+    visualize_sights_on_map(sights)
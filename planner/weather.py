@@ -1,76 +1,124 @@
-import pandas as pd
-from meteostat import Point as MeteostatPoint, Daily, units, Hourly
+from __future__ import annotations
+
+import numpy as np
 from datetime import datetime, timedelta, date
-from typing import Dict, Any, Optional
+from typing import TYPE_CHECKING, Callable, Dict, Any, Mapping, Optional
 
 from shapely.geometry import Point
 
-def get_weather_forecast(location: Point, target_date: Optional[date] = None) -> Dict[str, Any]:
+from .forecast_cache import get_forecast_cache #p
+from .tracing import span #p
+
+if TYPE_CHECKING:
+    import pandas as pd  # pandas and meteostat load on the first fetch; cached forecasts need neither
+
+SLOTS = ("morning", "afternoon", "evening")
+SLOT_BOUNDS_HOURS = [8, 12, 17, 21]  # 08:00-12:00, 12:00-17:00, 17:00-21:00
+RAIN_THRESHOLD_MM = 1.0
+WARM_THRESHOLD_C = 20
+PREFETCH_DAYS = 7
+
+UNKNOWN_FORECAST = {slot: "unknown" for slot in SLOTS}
+
+
+def fetch_hourly(lat: float, lon: float, start: datetime, end: datetime) -> pd.DataFrame:
+    """Meteostat hourly observations/model data for a point."""
+    from meteostat import Hourly, Point as MeteostatPoint
+    return Hourly(MeteostatPoint(lat, lon), start, end).fetch()
+
+
+def summarize_slots(df: pd.DataFrame) -> Dict[date, Dict[str, str]]:
+    """
+    Slot conditions for every day in an hourly frame, in one groupby over
+    (day, slot): precipitation > 1 mm -> rainy, else mean temperature > 20 °C ->
+    sunny, else cloudy; slots without rows or temperatures are "unknown".
+    """
+    if df.empty:
+        return {}
+    import pandas as pd
+    slot = pd.cut(df.index.hour, bins=SLOT_BOUNDS_HOURS, right=False, labels=SLOTS)
+    missing = pd.Series(np.nan, index=df.index)
+    stats = pd.DataFrame({
+        "day": df.index.date,
+        "slot": slot,
+        "prcp": df.get("prcp", missing).to_numpy(dtype=np.float64),
+        "temp": df.get("temp", missing).to_numpy(dtype=np.float64),
+    }).groupby(["day", "slot"], observed=True).agg(prcp=("prcp", "sum"), temp=("temp", "mean"))
+
+    conditions = np.select(
+        [stats["prcp"].to_numpy() > RAIN_THRESHOLD_MM, stats["temp"].isna().to_numpy(),
+         stats["temp"].to_numpy() > WARM_THRESHOLD_C],
+        ["rainy", "unknown", "sunny"], default="cloudy")
+    days: Dict[date, Dict[str, str]] = {}
+    for (day, slot_name), condition in zip(stats.index, conditions):
+        days.setdefault(day, dict(UNKNOWN_FORECAST))[slot_name] = str(condition)
+    return days
+
+
+def _day_window(first: date, days: int = 1):
+    start = datetime.combine(first, datetime.min.time()) + timedelta(hours=SLOT_BOUNDS_HOURS[0])
+    end = datetime.combine(first + timedelta(days=days - 1), datetime.min.time()) + timedelta(hours=SLOT_BOUNDS_HOURS[-1])
+    return start, end
+
+
+def get_weather_forecast(location: Point, target_date: Optional[date] = None,
+                         fetch: Callable[[float, float, datetime, datetime], pd.DataFrame] = fetch_hourly) -> Dict[str, Any]:
     """
     Fetches the weather forecast for a given location and date.
     Args:
         location: A shapely.geometry.Point object (lon, lat) for the location.
         target_date: The date for which to get the forecast.
+        fetch: Source of hourly data (Meteostat unless injected).
     Returns:
         A dictionary with weather conditions for 'morning', 'afternoon', 'evening'.
+        Served from the forecast cache when the same place (~1 km) and day were seen before.
     """
-    # Convert the Shapely point to a metostat point
-    meteostat_location = MeteostatPoint(location.y, location.x) # location.y is latitude, location.x is longitude
-
-    if target_date is None:
-        current_date = datetime.now().date()  # Get just the date part for combining
-    else:
-        current_date = target_date  # Use the provided date
-
-    # Define time slots as datetime ranges
-    morning_start = datetime.combine(current_date, datetime.min.time()) + timedelta(hours=8)
-    morning_end = morning_start + timedelta(hours=4)  # 08:00-12:00
-    afternoon_start = morning_end  # 12:00
-    afternoon_end = afternoon_start + timedelta(hours=5)  # 12:00-17:00
-    evening_start = afternoon_end  # 17:00
-    evening_end = evening_start + timedelta(hours=4)  # 17:00-21:00
-
-    # Fetch hourly data for the full day (say 8:00 - 21:00)
-    start_time = morning_start
-    end_time = evening_end
-    data = Hourly(meteostat_location, start_time, end_time)
-    df = data.fetch()
+    lat, lon = location.y, location.x  # location.y is latitude, location.x is longitude
+    current_date = target_date if target_date is not None else datetime.now().date()
+    if isinstance(current_date, datetime):
+        current_date = current_date.date()
 
-    if df.empty:
-        return {"morning": "unknown", "afternoon": "unknown", "evening": "unknown"}
-
-
-    def summarize_slot(slot_start, slot_end):
-        # Ensure comparison with timezone-naive datetimes if df.index is naive, or convert if needed
-        slot_data = df[(df.index >= slot_start) & (df.index < slot_end)]
-        if slot_data.empty:
-            return "unknown"
-
-        # Simple rule: if total precipitation > threshold -> rainy
-        # Use .get() and an empty Series as fallback for safe sum on potentially missing columns
-        if slot_data.get('prcp', pd.Series(dtype='float64')).sum() > 1.0:
-            return "rainy"
-
-        # Average temperature
-        # Use .get() and an empty Series as fallback for safe mean on potentially missing columns
-        avg_temp = slot_data.get('temp', pd.Series(dtype='float64')).mean()
-        if pd.notna(avg_temp): # Check if mean is not NaN
-            if avg_temp > 20:
-                return "sunny"
-            else:
-                return "cloudy"
-        else:
-            return "unknown" # If no temp data
-
-    forecast = {
-        "morning": summarize_slot(morning_start, morning_end),
-        "afternoon": summarize_slot(afternoon_start, afternoon_end),
-        "evening": summarize_slot(evening_start, evening_end),
-    }
+    cache = get_forecast_cache()
+    if cache is not None:
+        cached = cache.get(lat, lon, current_date)
+        if cached is not None:
+            return cached
 
+    with span("weather.fetch"):
+        hourly = fetch(lat, lon, *_day_window(current_date))
+    forecast = summarize_slots(hourly).get(current_date, dict(UNKNOWN_FORECAST))
+    if cache is not None:
+        cache.put(lat, lon, current_date, forecast)
     return forecast
 
+
+def prefetch_forecasts(locations: Mapping[str, Point], start_date: Optional[date] = None,
+                       days: int = PREFETCH_DAYS,
+                       fetch: Callable[[float, float, datetime, datetime], pd.DataFrame] = fetch_hourly
+                       ) -> Dict[str, Dict[date, Dict[str, str]]]:
+    """
+    Warms the forecast cache for several cities: one hourly fetch per city covers
+    all `days` days from start_date and is summarised in a single groupby.
+    Cities that fail are reported and skipped. Returns name -> date -> forecast.
+    """
+    first = start_date or datetime.now().date()
+    window = [first + timedelta(days=i) for i in range(days)]
+    cache = get_forecast_cache()
+    result = {}
+    for name, location in locations.items():
+        lat, lon = location.y, location.x
+        try:
+            by_day = summarize_slots(fetch(lat, lon, *_day_window(first, days)))
+        except Exception as e:
+            print(f"Could not prefetch weather for {name}: {e}")
+            continue
+        result[name] = {day: by_day.get(day, dict(UNKNOWN_FORECAST)) for day in window}
+        if cache is not None:
+            cache.put_many(lat, lon, result[name].items())
+    return result
+
 def get_weather_condition(lat, lon, date):
+    from meteostat import Daily
     location = Point(lat, lon)
     data = Daily(location, date, date)
     df = data.fetch()
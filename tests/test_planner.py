@@ -0,0 +1,786 @@
+import asyncio
+import itertools
+import time
+
+import httpx
+import numpy as np
+import pytest
+from shapely.geometry import Point
+
+from planner.optimize import (solve_tsp, solve_tsp_heuristic, solve_tsp_anytime, tour_length,
+                              choose_tsp_engine, one_tree_lower_bound)
+from planner.route_cache import LegCache
+from planner.sights import Sight
+from planner.matrix_provider import OSRMTableProvider
+from planner.net import CircuitBreaker, CircuitOpenError, OSRMClient
+from planner.sight_collection import SightCollection
+from planner.spatial_index import SightIndex
+from planner.tour_planner_orchestrator import build_distance_matrix, haversine, haversine_matrix
+
+
+def _random_matrix(n, seed=0):
+    pts = np.random.default_rng(seed).random((n, 2))
+    return np.sqrt(((pts[:, None, :] - pts[None, :, :]) ** 2).sum(-1))
+
+
+def test_heuristic_tour_visits_every_node_once():
+    dist = _random_matrix(60)
+    tour = solve_tsp_heuristic(dist)
+    assert tour[0] == 0
+    assert sorted(tour) == list(range(60))
+
+
+def test_heuristic_matches_brute_force_on_small_instances():
+    for seed in range(5):
+        dist = _random_matrix(7, seed)
+        best = min(tour_length(dist, (0,) + p) for p in itertools.permutations(range(1, 7)))
+        assert abs(tour_length(dist, solve_tsp_heuristic(dist)) - best) < 1e-9
+
+
+def test_solve_tsp_accepts_list_of_lists():
+    dist = [[0.0, 1.0, 5.0, 8.0],
+            [1.0, 0.0, 2.0, 6.0],
+            [5.0, 2.0, 0.0, 3.0],
+            [8.0, 6.0, 3.0, 0.0]]
+    assert tour_length(dist, solve_tsp(dist)) == 14.0
+
+
+def test_engine_choice_by_size_and_budget():
+    assert choose_tsp_engine(5) == "exact"
+    assert choose_tsp_engine(5, time_budget_ms=50) == "heuristic"
+    assert choose_tsp_engine(40) == "heuristic"
+
+
+def test_one_tree_bound_never_exceeds_optimum():
+    for seed in range(5):
+        dist = _random_matrix(7, seed)
+        best = min(tour_length(dist, (0,) + p) for p in itertools.permutations(range(1, 7)))
+        assert one_tree_lower_bound(dist) <= best + 1e-9
+
+
+def test_anytime_solver_respects_budget_and_reports_gap():
+    dist = _random_matrix(300)
+    result = solve_tsp_anytime(dist, time_budget_ms=30, engine="heuristic")
+    assert sorted(result.tour) == list(range(300))
+    assert result.elapsed_ms < 300
+    assert 0.0 <= result.gap < 1.0
+    assert result.to_dict()["gap"] == result.gap
+
+
+def test_distance_matrix_matches_scalar_haversine():
+    rng = np.random.default_rng(3)
+    sights = [Sight(f"s{i}", Point(2.3 + rng.random() * 0.1, 48.8 + rng.random() * 0.1), "museum", ["any"])
+              for i in range(40)]
+    mat = build_distance_matrix(sights)
+    assert isinstance(mat, np.ndarray) and mat.shape == (40, 40)
+    assert np.allclose(mat, mat.T) and np.all(np.diag(mat) == 0.0)
+    assert abs(mat[4, 17] - haversine(sights[4].location, sights[17].location)) < 1e-6
+
+
+def test_sight_index_queries_match_brute_force():
+    rng = np.random.default_rng(11)
+    sights = [Sight(f"s{i}", Point(11.5 + rng.random() * 0.1, 48.1 + rng.random() * 0.1), "museum", ["any"])
+              for i in range(500)]
+    index = SightIndex(sights)
+    center = (48.15, 11.55)
+    dist = np.array([haversine(center, s.location) for s in sights])
+    order = np.argsort(dist)
+
+    assert [s.name for s in index.nearest(center, k=5)] == [sights[i].name for i in order[:5]]
+    assert [s.name for s in index.within_radius(center, 2.0)] == [sights[i].name for i in order if dist[i] <= 2.0]
+    visited = set(sights[i] for i in order[:20])
+    assert index.nearest(center, exclude=visited)[0] is sights[order[20]]
+    subset = sights[::50]
+    assert index.nearest(center, candidates=subset)[0] is min(subset, key=lambda s: haversine(center, s.location))
+
+    in_box = index.in_bbox(48.12, 11.52, 48.14, 11.56)
+    assert in_box == [s for s in sights if 48.12 <= s.location.y <= 48.14 and 11.52 <= s.location.x <= 11.56]
+
+    from planner.aware_tour import optimize_route
+    route, current, unvisited = [], center, sights[:60]
+    while unvisited:  # The greedy walk, one nearest-neighbour query per step
+        current = index.nearest(current, candidates=unvisited)[0]
+        route.append(current)
+        unvisited.remove(current)
+        current = current.location
+    assert optimize_route(center, sights[:60]) == route
+
+
+def test_sight_collection_roundtrip_and_array_filters():
+    sights = [Sight("Louvre", Point(2.3376, 48.8606), "museum", ["rainy", "any"], "Art"),
+              Sight("Eiffel Tower", Point(2.2945, 48.8584), "monument", ["sunny", "cloudy"]),
+              Sight("Jardin", Point(2.3372, 48.8462), "park", ["sunny"]),
+              Sight("Flore", Point(2.3336, 48.8545), "cafe", "foggy")]
+    collection = SightCollection.from_sights(sights)
+    assert collection.categories == ("cafe", "monument", "museum", "park")
+    assert collection[0].weather_suitability == ["rainy", "any"] and collection[0].description == "Art"
+    assert collection[3].weather_suitability == ["foggy"]
+    assert collection.to_sights() == sights
+
+    assert list(collection.names[collection.suitable_for("cloudy")]) == ["Louvre", "Eiffel Tower"]
+    assert list(collection.names[collection.in_categories(["park", "cafe"])]) == ["Jardin", "Flore"]
+    assert list(collection.primary_weather_tags()) == ["rainy", "sunny", "sunny", "foggy"]
+    assert np.allclose(collection.coords, [[s.location.y, s.location.x] for s in sights])
+    assert abs(collection.distances_from((48.8606, 2.3376))[1] - haversine(sights[0].location, sights[1].location)) < 1e-6
+
+    restored = SightCollection.from_arrays(collection.to_arrays())
+    assert restored.to_records() == collection.to_records()
+    assert restored[1:3].to_sights() == sights[1:3]
+
+
+def test_osm_features_are_extracted_by_columns():
+    import geopandas as gpd
+    from shapely.geometry import Polygon
+    from planner.osm import sights_from_features
+
+    features = gpd.GeoDataFrame({
+        "name": ["Louvre", None, "Jardin", "Bar", "Tower"],
+        "tourism": ["museum", "museum", None, float("nan"), ["attraction", "viewpoint"]],
+        "leisure": [None, None, "park", None, None],
+        "description": ["Art", None, None, None, None],
+    }, geometry=[Point(2.3376, 48.8606), Point(2.3, 48.8),
+                 Polygon([(2.33, 48.84), (2.34, 48.84), (2.34, 48.85), (2.33, 48.85)]),
+                 Point(2.35, 48.86), Point(2.2945, 48.8584)], crs="EPSG:4326")
+    collection = sights_from_features(features, {"tourism": ["museum", "viewpoint"], "leisure": True})
+
+    assert list(collection.names) == ["Louvre", "Jardin", "Bar", "Tower"]
+    assert [collection.categories[c] for c in collection.category_codes] == ["museum", "park", "Unknown", "viewpoint"]
+    assert abs(collection.lat[1] - 48.845) < 1e-9 and abs(collection.lon[1] - 2.335) < 1e-9
+    assert collection[0].weather_suitability == ["rainy", "any"] and collection[0].description == "Art"
+    assert collection[1].weather_suitability == ["sunny"] and collection[2].description == ""
+
+
+def test_sight_collection_binary_file_is_memory_mapped_and_lazy(tmp_path):
+    sights = [Sight("Café de Flore", Point(2.3336, 48.8545), "cafe", ["any"], "Historic café"),
+              Sight("Louvre", Point(2.3376, 48.8606), "museum", ["rainy", "any"]),
+              Sight("Jardin", Point(2.3372, 48.8462), "park", ["sunny"], "Ωmega")]
+    collection = SightCollection.from_sights(sights)
+    collection.save(tmp_path / "paris.sights")
+
+    loaded = SightCollection.load(tmp_path / "paris.sights")
+    assert not loaded.lat.flags.writeable and callable(loaded._names)  # views into the read-only mapping
+    parks = loaded.take(loaded.in_categories(["park", "cafe"]))
+    both = SightCollection.concat([loaded, parks])
+    assert callable(parks._names) and callable(both._names)
+    assert list(both.names) == ["Café de Flore", "Louvre", "Jardin", "Café de Flore", "Jardin"]
+    assert loaded.to_records() == collection.to_records()
+    assert SightCollection.load(tmp_path / "paris.sights", mmap=False).to_sights() == sights
+
+    SightCollection.empty().save(tmp_path / "empty.sights")
+    assert len(SightCollection.load(tmp_path / "empty.sights")) == 0
+
+
+def test_csv_loader_round_trip_and_both_delimiters(tmp_path):
+    from planner.data_loader import iter_sights_from_csv, load_sights_from_csv, save_sights_to_csv
+
+    csv_path = tmp_path / "city.csv"
+    csv_path.write_text("name,longitude,latitude,category,weather_suitability,description\n"
+                        "Louvre,2.3376,48.8606,museum,\"rainy, any\",Art\n"
+                        "Jardin,2.3372,48.8462,park,sunny|cloudy,\n"
+                        ",2.3336,48.8545,,,\n"
+                        "Nowhere,,48.85,sight,sunny,\n")
+    sights = load_sights_from_csv(csv_path)
+    assert [s.name for s in sights] == ["Louvre", "Jardin", "Unnamed Sight"]
+    assert [s.weather_suitability for s in sights] == [["rainy", "any"], ["sunny", "cloudy"], ["any"]]
+    assert sights[2].category == "unknown" and sights[1].description == ""
+
+    out = tmp_path / "export.csv"
+    save_sights_to_csv(sights, out)
+    again = load_sights_from_csv(out)
+    assert [(s.name, s.weather_suitability, s.category, s.description) for s in again] == \
+        [(s.name, s.weather_suitability, s.category, s.description) for s in sights]
+    assert sum(len(c) for c in iter_sights_from_csv(csv_path, chunksize=2)) == 3
+
+
+def test_csv_loader_skips_rows_with_malformed_coordinates(tmp_path):
+    from planner.data_loader import iter_sights_from_csv, load_sights_from_csv
+
+    csv_path = tmp_path / "city.csv"
+    csv_path.write_text("name,longitude,latitude,category,weather_suitability\n"
+                        "Louvre,2.3376,48.8606,museum,rainy\n"
+                        "Broken,2.3372,abc,park,sunny\n"
+                        "Pantheon,2.3464,48.8462,monument,any\n")
+    assert [s.name for s in load_sights_from_csv(csv_path)] == ["Louvre", "Pantheon"]
+    assert [len(c) for c in iter_sights_from_csv(csv_path, chunksize=2)] == [1, 1]
+
+
+def test_poi_tile_store_reuses_tiles_across_queries(tmp_path):
+    from planner.poi_tiles import POITileStore
+
+    rng = np.random.default_rng(13)
+    world = SightCollection.from_columns([f"p{i}" for i in range(2000)], 48.10 + rng.random(2000) * 0.1,
+                                         11.50 + rng.random(2000) * 0.15, ["cafe"] * 2000, [["any"]] * 2000)
+    boxes = []
+
+    def fetch(bbox, tags, refresh):
+        boxes.append(bbox)
+        west, south, east, north = bbox
+        return world.take((world.lon >= west) & (world.lon < east) & (world.lat >= south) & (world.lat < north))
+
+    store = POITileStore(fetch=fetch, root=tmp_path)
+    small = store.query_radius(48.15, 11.57, 1000, {"amenity": ["cafe"]})
+    tiles_first = store.tiles_fetched
+    large = store.query_radius(48.15, 11.57, 3000, {"amenity": ["cafe"]})
+    assert len(boxes) == 2 and store.tiles_from_cache == tiles_first
+    assert sorted(large.names) == sorted(world.names[world.distances_from((48.15, 11.57)) <= 3.0])
+    assert set(small.names) <= set(large.names)
+
+    store.query_radius(48.15, 11.57, 1000, {"amenity": ["cafe"]})
+    assert len(boxes) == 2
+    store.ttl_seconds = -1
+    store.query_radius(48.15, 11.57, 1000, {"amenity": ["cafe"]})
+    assert len(boxes) == 3
+
+
+def test_iter_osm_sights_fetches_one_tile_at_a_time(tmp_path, monkeypatch):
+    from planner import osm
+    from planner.poi_tiles import POITileStore
+
+    rng = np.random.default_rng(14)
+    world = SightCollection.from_columns([f"p{i}" for i in range(2000)], 48.10 + rng.random(2000) * 0.1,
+                                         11.50 + rng.random(2000) * 0.15, ["cafe"] * 2000, [["any"]] * 2000)
+    sizes = []
+
+    def fetch(bbox, tags, refresh):
+        west, south, east, north = bbox
+        inside = (world.lon >= west) & (world.lon < east) & (world.lat >= south) & (world.lat < north)
+        sizes.append(int(inside.sum()))
+        return world.take(inside)
+
+    store = POITileStore(fetch=fetch, root=tmp_path)
+    monkeypatch.setattr(osm, "_tile_store", store)
+    chunks = list(osm.iter_osm_sights(Point(11.57, 48.15), {"amenity": ["cafe"]}, radius_meters=3000, chunk_size=50))
+
+    names = [name for chunk in chunks for name in chunk.names]
+    assert sorted(names) == sorted(world.names[world.distances_from((48.15, 11.57)) <= 3.0])
+    assert all(len(chunk) <= 50 for chunk in chunks)
+    assert store.requests_made == store.tiles_fetched > 1  # one request per tile
+    assert max(sizes) < len(names)
+
+
+def test_city_bundle_roundtrip_and_sub_matrices(tmp_path):
+    from planner.city_bundle import CityBundle, build_city_bundle, bundle_path, load_bundles
+
+    rng = np.random.default_rng(15)
+    sights = SightCollection.from_columns([f"s{i}" for i in range(40)], 52.5 + rng.random(40) * 0.05,
+                                          13.4 + rng.random(40) * 0.05, ["museum"] * 40, [["any"]] * 40)
+    bundle = build_city_bundle("Berlin, Germany", (52.52, 13.405), sights)
+    bundle.durations["walking"] = bundle.haversine_km * 1000 / 1.4
+    bundle.save(bundle_path("Berlin, Germany", tmp_path))
+
+    loaded = load_bundles(tmp_path)["berlin"]
+    assert loaded.center_point.y == 52.52 and list(loaded.sights.names) == list(sights.names)
+    chosen = [sights[i] for i in (7, 3, 30)]
+    provider = loaded.matrix_provider(chosen, "duration", "walking")
+    assert np.allclose(provider.matrix(chosen), build_distance_matrix(chosen) * 1000 / 1.4)
+    assert np.allclose(loaded.matrix_provider(chosen).matrix(chosen[::-1]), build_distance_matrix(chosen[::-1]))
+    assert loaded.matrix_provider(chosen, "duration", "cycling") is None
+    assert loaded.matrix_provider(chosen + [Sight("new", Point(13.4, 52.5), "park", ["any"])]) is None
+    namesake = Sight("s7", Point(chosen[0].location.x + 0.01, chosen[0].location.y), "museum", ["any"])
+    assert loaded.matrix_provider([namesake] + chosen[1:]) is None  # same name, elsewhere
+
+    stale = tmp_path / "old.citybundle.npz"
+    np.savez(stale, meta=np.array('{"format_version": 0}'))
+    assert set(load_bundles(tmp_path)) == {"berlin"}
+    with pytest.raises(ValueError):
+        CityBundle.load(stale)
+
+
+def test_leg_cache_roundtrip_and_lru_eviction(tmp_path):
+    cache = LegCache(tmp_path / "legs.sqlite", max_entries=2)
+    geometry = [(2.2945, 48.8584), (2.3, 48.86), (2.3376, 48.8606)]
+    cache.put("foot", [(2.2945, 48.8584), (2.3376, 48.8606)], 3500.0, 2600.0, geometry)
+    hit = cache.get("foot", [(2.294500001, 48.8584), (2.3376, 48.8606)], need_geometry=True)
+    assert hit["distance"] == 3500.0 and hit["geometry"] == geometry
+    assert cache.get("bike", [(2.2945, 48.8584), (2.3376, 48.8606)]) is None
+
+    cache.put("foot", [(1.0, 1.0), (2.0, 2.0)], 1.0, 1.0)
+    cache.get("foot", [(2.2945, 48.8584), (2.3376, 48.8606)])  # touch the first leg again
+    cache.put("foot", [(3.0, 3.0), (4.0, 4.0)], 1.0, 1.0)
+    cache.evict()
+    assert len(cache) == 2
+    assert cache.get("foot", [(1.0, 1.0), (2.0, 2.0)]) is None  # least recently used
+
+
+def test_leg_cache_hits_write_access_times_lazily(tmp_path):
+    import sqlite3
+
+    cache = LegCache(tmp_path / "legs.sqlite")
+    leg = [(2.2945, 48.8584), (2.3376, 48.8606)]
+    cache.put("foot", leg, 3500.0, 2600.0)
+
+    def accessed_at():
+        with sqlite3.connect(str(cache.path)) as conn:
+            return conn.execute("SELECT accessed_at FROM legs").fetchone()[0]
+
+    stored = accessed_at()
+    time.sleep(0.01)
+    assert cache.get("foot", leg) is not None
+    assert accessed_at() == stored  # a hit does not write
+    cache.evict()
+    assert accessed_at() > stored
+
+
+def test_osrm_route_is_served_from_leg_cache(tmp_path, monkeypatch):
+    from planner import get_route
+    calls = []
+
+    def fake_get(url):
+        calls.append(url)
+        return {"code": "Ok", "routes": [{
+            "distance": 1200.0, "duration": 900.0,
+            "geometry": {"coordinates": [[2.29, 48.85], [2.30, 48.86], [2.31, 48.87]]},
+            "legs": [{"distance": 500.0, "duration": 400.0}, {"distance": 700.0, "duration": 500.0}],
+        }]}
+
+    monkeypatch.setenv("OSRM_LEG_CACHE", str(tmp_path / "legs.sqlite"))
+    monkeypatch.setattr(get_route, "get_with_backoff", fake_get)
+    coords = [(2.29, 48.85), (2.30, 48.86), (2.31, 48.87)]
+    first = get_route.get_osrm_route(coords)
+    second = get_route.get_osrm_route(coords)
+    leg = get_route.get_route_details(Point(2.30, 48.86), Point(2.31, 48.87))
+    assert len(calls) == 1
+    assert first == second
+    assert leg == {"distance": 700.0, "duration": 500.0}
+
+
+def _stand_in_osrm_table(url):
+    """Behaves like OSRM /table: metres = 1.2 x haversine, walking at 1.4 m/s."""
+    path, _, query = url.partition("?")
+    coords = np.array([[float(v) for v in c.split(",")][::-1] for c in path.rsplit("/", 1)[1].split(";")])
+    params = dict(p.split("=") for p in query.split("&"))
+    src = [int(i) for i in params["sources"].split(";")] if "sources" in params else range(len(coords))
+    dst = [int(i) for i in params["destinations"].split(";")] if "destinations" in params else range(len(coords))
+    metres = haversine_matrix(coords[list(src)], coords[list(dst)]) * 1200
+    return {"code": "Ok", "distances": metres.tolist(), "durations": (metres / 1.4).tolist()}
+
+
+def test_osrm_table_provider_chunks_requests():
+    rng = np.random.default_rng(5)
+    sights = [Sight(f"s{i}", Point(13.3 + rng.random() * 0.1, 52.5 + rng.random() * 0.1), "museum", ["any"])
+              for i in range(7)]
+    single = OSRMTableProvider(fetch=_stand_in_osrm_table)
+    chunked = OSRMTableProvider(max_coords=4, fetch=_stand_in_osrm_table)
+    expected = build_distance_matrix(sights) * 1200 / 1.4
+    assert np.allclose(single.matrix(sights), expected, rtol=1e-4)
+    assert np.allclose(chunked.matrix(sights), expected, rtol=1e-4)
+    assert single.requests_made == 1 and chunked.requests_made == 16
+
+    sub = chunked.for_sights(sights).matrix(sights[2:5])
+    assert np.allclose(sub, expected[2:5, 2:5], rtol=1e-4) and chunked.requests_made == 32
+
+
+def test_osrm_client_retries_and_opens_circuit():
+    answers = iter([503, 200, 500, 500, 500])
+
+    def handler(request):
+        status = next(answers)
+        return httpx.Response(status, json={"code": "Ok"} if status == 200 else {})
+
+    client = OSRMClient(max_attempts=2, backoff=0.001,
+                        breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60),
+                        transport=httpx.MockTransport(handler))
+    assert asyncio.run(client.get_json("http://osrm.test/route")) == {"code": "Ok"}
+    with pytest.raises(RuntimeError):
+        client.get_json_sync("http://osrm.test/route")
+    with pytest.raises(RuntimeError):
+        client.get_json_sync("http://osrm.test/route")
+    assert client.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        client.get_json_sync("http://osrm.test/route")
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.before_call() is True           # the one half-open probe
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()                      # everyone else waits for it
+    breaker.record_failure()
+    assert breaker.state == "open"                 # a failed probe re-opens
+    time.sleep(0.02)
+    assert breaker.before_call() is True
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.before_call() is False
+
+
+def test_full_day_routes_are_fetched_concurrently(monkeypatch):
+    from planner import get_route
+    in_flight, peak = 0, 0
+
+    async def fake_get_json(url):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        return {"code": "Ok", "routes": [{"distance": 100.0, "duration": 80.0,
+                                          "geometry": {"coordinates": [[2.3, 48.8], [2.4, 48.9]]}}]}
+
+    monkeypatch.setenv("OSRM_LEG_CACHE", "off")
+    monkeypatch.setattr(get_route, "get_json_async", fake_get_json)
+    sights = [Sight(f"s{i}", Point(2.3 + i / 100, 48.85), "museum", ["any"]) for i in range(6)]
+    plan = {"morning": sights[:2], "afternoon": sights[2:4], "evening": sights[4:]}
+    info = asyncio.run(get_route.generate_information_full_day_tour(plan, Point(2.35, 48.85)))
+    assert peak == 4  # full tour + three subtours at once
+    assert info["total_subtour_length_meters"] == 300.0
+
+
+def test_day_planner_overlaps_both_strategies(monkeypatch):
+    from planner import base_planner
+
+    async def slow_routing(tour_plan, city_center, mode="walking"):
+        await asyncio.sleep(0.2)
+        return {"total_subtour_length_meters": 1.0, "haversine_total_subtour_length_meters": 1.0}
+
+    monkeypatch.setattr(base_planner, "generate_information_full_day_tour", slow_routing)
+    rng = np.random.default_rng(7)
+    sights = [Sight(f"s{i}", Point(2.3 + rng.random() * 0.05, 48.85 + rng.random() * 0.05), "museum",
+                    [["sunny"], ["rainy"], ["any"]][i % 3]) for i in range(12)]
+    forecast = {"morning": "sunny", "afternoon": "rainy", "evening": "cloudy"}
+    results = asyncio.run(base_planner.DayPlanner().plan(sights, Point(2.33, 48.87), "walking", forecast))
+
+    timings = results["timings"]
+    assert set(timings) == {"aware", "iterative", "wall_seconds"}
+    assert timings["aware"]["routing_seconds"] >= 0.2 and timings["iterative"]["routing_seconds"] >= 0.2
+    sequential = sum(t["planning_seconds"] + t["routing_seconds"] for t in (timings["aware"], timings["iterative"]))
+    assert timings["wall_seconds"] < sequential - 0.1
+    assert sorted(s.name for slot in results["iterative_plan"]["tour_plan"].values() for s in slot) == \
+        sorted(s.name for s in sights)
+
+
+def test_solver_service_back_pressure_and_timeout():
+    from concurrent.futures import ThreadPoolExecutor
+    from api.solver_service import SolverBusyError, SolverService, SolverUnavailableError
+
+    service = SolverService(max_workers=1, max_queue=1, timeout_seconds=0.3,
+                            executor_factory=lambda n: ThreadPoolExecutor(max_workers=n))
+
+    async def job(executor):
+        await asyncio.get_running_loop().run_in_executor(executor, time.sleep, 0.1)
+        return "done"
+
+    async def hang(executor):
+        await asyncio.sleep(5)
+
+    async def scenario():
+        results = await asyncio.gather(*(service.run(job) for _ in range(3)), return_exceptions=True)
+        assert results.count("done") == 2
+        assert isinstance(results[2], SolverBusyError) and results[2].retry_after > 0
+        with pytest.raises(SolverUnavailableError):
+            await service.run(hang)
+        assert service.in_flight == 0
+
+    asyncio.run(scenario())
+    service.shutdown()
+
+
+def test_day_planner_runs_in_process_pool(monkeypatch):
+    from concurrent.futures import ProcessPoolExecutor
+    from planner import base_planner
+
+    async def no_routing(tour_plan, city_center, mode="walking"):
+        return {}
+
+    monkeypatch.setattr(base_planner, "generate_information_full_day_tour", no_routing)
+    sights = [Sight(f"s{i}", Point(2.3 + i / 200, 48.85 + (i % 3) / 200), "museum", ["any"]) for i in range(9)]
+    forecast = {"morning": "sunny", "afternoon": "rainy", "evening": "cloudy"}
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        results = asyncio.run(base_planner.DayPlanner(executor=pool).plan(sights, Point(2.32, 48.86), "walking",
+                                                                          forecast, time_budget_ms=200))
+    assert results["iterative_plan"]["solver_stats"]["groups"]
+    assert sum(len(v) for v in results["aware_plan"]["tour_plan"].values()) == 9
+
+
+def test_geocoder_caches_coalesces_and_remembers_failures(tmp_path):
+    import threading
+    from osmnx._errors import InsufficientResponseError
+    from planner.geocoding import Geocoder, GeocodingError
+
+    calls = []
+    release = threading.Event()
+
+    def forward(query):
+        calls.append(query)
+        release.wait(2)
+        if query == "Atlantis":
+            raise InsufficientResponseError("no results")
+        return 48.1374, 11.5755
+
+    geocoder = Geocoder(tmp_path / "geocode.sqlite", forward=forward, reverse=lambda lat, lon: "Munich")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(geocoder.geocode("Munich, Germany")))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.2)
+    release.set()
+    for t in threads:
+        t.join()
+    assert results == [(48.1374, 11.5755)] * 4 and calls == ["Munich, Germany"]
+
+    assert geocoder.geocode("Paris") == (48.8566, 2.3522) and len(calls) == 1
+    for _ in range(2):
+        with pytest.raises(GeocodingError) as err:
+            geocoder.geocode("Atlantis")
+        assert err.value.not_found
+    assert calls.count("Atlantis") == 1
+
+    assert geocoder.reverse(48.13741, 11.57552) == geocoder.reverse(48.13739, 11.57549) == "Munich"
+    assert geocoder.upstream_calls == 3
+    # Either side of a .xxx5 rounding boundary, but in the same grid cell
+    assert geocoder.reverse(48.13151, 11.57451) == geocoder.reverse(48.13149, 11.57449) == "Munich"
+    assert geocoder.upstream_calls == 4
+    reopened = Geocoder(tmp_path / "geocode.sqlite", forward=forward)
+    assert reopened.geocode("  munich,germany ") == (48.1374, 11.5755) and reopened.upstream_calls == 0
+
+
+def test_weather_forecast_is_cached_and_prefetched_per_week(tmp_path, monkeypatch):
+    import pandas as pd
+    from datetime import date, datetime
+    from planner import weather
+
+    monkeypatch.setenv("WEATHER_CACHE", str(tmp_path / "forecasts.sqlite"))
+    calls = []
+
+    def fetch(lat, lon, start, end):
+        calls.append((start, end))
+        index = pd.date_range(start, end, freq="h")
+        hour = index.hour.to_numpy()
+        return pd.DataFrame({"temp": np.where(hour < 12, 15.0, 25.0),
+                             "prcp": np.where((hour >= 17) & (index.day % 2 == 0), 0.6, 0.0)}, index=index)
+
+    berlin = Point(13.405, 52.52)
+    expected = {"morning": "cloudy", "afternoon": "sunny", "evening": "rainy"}
+    assert weather.get_weather_forecast(berlin, date(2024, 5, 2), fetch=fetch) == expected
+    assert weather.get_weather_forecast(Point(13.4052, 52.5201), date(2024, 5, 2), fetch=fetch) == expected
+    assert len(calls) == 1
+    # Either side of a .xx5 rounding boundary (13.4049 -> "13.40", 13.4051 -> "13.41"), same grid cell
+    assert weather.get_weather_forecast(Point(13.4049, 52.5149), date(2024, 5, 2), fetch=fetch) == expected
+    assert weather.get_weather_forecast(Point(13.4051, 52.5151), date(2024, 5, 2), fetch=fetch) == expected
+    assert len(calls) == 2
+
+    week = weather.prefetch_forecasts({"Paris": Point(2.3522, 48.8566)}, date(2024, 5, 1), fetch=fetch)
+    assert len(calls) == 3 and calls[2] == (datetime(2024, 5, 1, 8), datetime(2024, 5, 7, 21))
+    assert [week["Paris"][date(2024, 5, d)]["evening"] for d in (1, 2)] == ["sunny", "rainy"]
+    assert weather.get_weather_forecast(Point(2.3522, 48.8566), date(2024, 5, 6), fetch=fetch)["evening"] == "rainy"
+    assert len(calls) == 3
+    assert weather.summarize_slots(pd.DataFrame()) == {}
+
+
+def test_week_planner_partitions_sights_and_builds_the_matrix_once():
+    from planner.base_planner import WeekPlanner
+    from planner.matrix_provider import HaversineMatrixProvider
+
+    class CountingProvider(HaversineMatrixProvider):
+        calls = 0
+
+        def matrix(self, sights):
+            CountingProvider.calls += 1
+            return super().matrix(sights)
+
+    rng = np.random.default_rng(18)
+    # West half indoor (rainy), east half outdoor (sunny)
+    sights = [Sight(f"s{i}", Point(13.30 + (i % 2) * 0.1 + rng.random() * 0.02, 52.5 + rng.random() * 0.02),
+                    "museum" if i % 2 == 0 else "park", ["rainy"] if i % 2 == 0 else ["sunny"]) for i in range(24)]
+    forecasts = {"mon": {"morning": "sunny", "afternoon": "sunny", "evening": "sunny"},
+                 "tue": {"morning": "rainy", "afternoon": "rainy", "evening": "rainy"}}
+    week = WeekPlanner(time_budget_ms=200).plan(sights, (52.51, 13.35), "walking", forecasts,
+                                                matrix_provider=CountingProvider())
+
+    assert CountingProvider.calls == 1
+    assert [d["day"] for d in week["days"]] == ["mon", "tue"]
+    planned = [s for d in week["days"] for slot in d["tour_plan"].values() for s in slot]
+    assert sorted(s.name for s in planned) == sorted(s.name for s in sights)
+    mon = [s for slot in week["days"][0]["tour_plan"].values() for s in slot]
+    assert all(s.weather_suitability == ["sunny"] for s in mon)
+
+
+def test_heuristic_warm_start_keeps_a_good_tour():
+    dist = _random_matrix(80, seed=4)
+    cold = solve_tsp_heuristic(dist)
+    warm = solve_tsp_heuristic(dist, initial_tour=cold[5:] + cold[:5])
+    assert warm[0] == 0 and abs(tour_length(dist, warm) - tour_length(dist, cold)) < 1e-9
+    assert solve_tsp_anytime(dist, engine="heuristic", initial_tour=[0, 1]).tour[0] == 0  # invalid start ignored
+
+
+def test_incremental_replan_touches_only_the_changed_slot():
+    from planner.incremental import replan_with_delta
+
+    rng = np.random.default_rng(19)
+    sights = [Sight(f"s{i}", Point(13.3 + rng.random() * 0.1, 52.5 + rng.random() * 0.05), "park", ["any"])
+              for i in range(20)]
+    forecast = {"morning": "sunny", "afternoon": "sunny", "evening": "sunny"}
+    plan = {"morning": sights[:7], "afternoon": sights[7:14], "evening": sights[14:]}
+    new = Sight("new", Point(13.35, 52.52), "museum", ["rainy"])
+
+    result = replan_with_delta(plan, {**forecast, "evening": "rainy"}, (52.52, 13.35),
+                               added=[new], removed=["s3"])
+    names = sorted(s.name for slot in result["tour_plan"].values() for s in slot)
+    assert result["method"] == "incremental"
+    assert names == sorted([s.name for s in sights if s.name != "s3"] + ["new"])
+    assert new in result["tour_plan"]["evening"]  # the only slot whose weather suits it
+    assert set(result["affected_slots"]) == {"morning", "evening"}
+    assert result["tour_plan"]["afternoon"] == plan["afternoon"]
+
+    assert replan_with_delta(plan, forecast, (52.52, 13.35))["method"] == "unchanged"
+    large = replan_with_delta(plan, forecast, (52.52, 13.35), removed=[s.name for s in sights[:8]])
+    assert large["method"] == "full" and large["reason"]
+
+
+def test_incremental_replan_with_a_bundled_matrix():
+    from planner.city_bundle import build_city_bundle
+    from planner.incremental import replan_with_delta
+
+    rng = np.random.default_rng(20)
+    sights = SightCollection.from_columns([f"s{i}" for i in range(21)], 52.5 + rng.random(21) * 0.05,
+                                          13.3 + rng.random(21) * 0.1, ["park"] * 21, [["any"]] * 21)
+    bundle = build_city_bundle("Berlin, Germany", (52.52, 13.35), sights)
+    planned, new = [sights[i] for i in range(20)], sights[20]
+    plan = {"morning": planned[:7], "afternoon": planned[7:14], "evening": planned[14:]}
+    forecast = {"morning": "sunny", "afternoon": "sunny", "evening": "sunny"}
+
+    # As /plan/incremental builds it: over every planned sight (removed ones included) plus the added one
+    provider = bundle.matrix_provider(planned + [new])
+    result = replan_with_delta(plan, forecast, (52.52, 13.35), added=[new], removed=["s3"],
+                               matrix_provider=provider)
+    expected = replan_with_delta(plan, forecast, (52.52, 13.35), added=[new], removed=["s3"])
+    assert result["method"] == "incremental"
+    assert result["tour_plan"] == expected["tour_plan"]  # same costs as haversine without a provider
+
+
+def test_plan_cache_key_is_canonical_and_disk_tier_survives_restart(tmp_path):
+    from types import SimpleNamespace
+    from api.plan_cache import PlanCache, plan_cache_key
+
+    sights = [SimpleNamespace(name=f"s{i}", lat=48.85 + i / 100, lon=2.35, category="museum",
+                              weather_suitability=["rainy", "any"]) for i in range(5)]
+    forecast = {"morning": "sunny", "afternoon": "rainy", "evening": "sunny"}
+    key = plan_cache_key("Paris, France", "walking", "haversine", sights, forecast)
+    assert key == plan_cache_key(" paris,  france", "walking", "haversine", sights[::-1], dict(reversed(forecast.items())))
+    assert key != plan_cache_key("Paris, France", "driving", "haversine", sights, forecast)
+    assert key != plan_cache_key("Paris, France", "walking", "haversine", sights[:4], forecast)
+
+    cache = PlanCache(tmp_path / "plans.sqlite", max_entries=1)
+    assert cache.get(key) is None
+    cache.put(key, {"aware_plan": {"morning": []}, "selected_plan_type": "aware"})
+    cache.put("other", {"selected_plan_type": "iterative"})  # pushes key out of the memory LRU
+    assert cache.get(key)["selected_plan_type"] == "aware" and cache.disk_hits == 1
+    cache.close()
+
+    restarted = PlanCache(tmp_path / "plans.sqlite")
+    assert restarted.get(key)["aware_plan"] == {"morning": []}
+    assert restarted.stats()["hits"] == 1 and restarted.stats()["misses"] == 0
+
+
+def test_planning_benchmark_is_reproducible_and_reports_every_stage():
+    import json
+    from tools.benchmark_planning import STAGES, compare, run, synthetic_city
+
+    city = synthetic_city(40, "indoor", seed=3)
+    assert [s.location for s in city] == [s.location for s in synthetic_city(40, "indoor", seed=3)]
+    assert not any("sunny" in s.weather_suitability for s in city)
+
+    report = run(sizes=[12], repeats=1, verbose=False)
+    assert {r["stage"] for r in report["results"]} == set(STAGES)
+    assert all(r["seconds_min"] >= 0 and r["quality"] for r in report["results"])
+    json.dumps(report)
+    slower = {**report, "results": [{**r, "seconds_min": r["seconds_min"] * 10 + 1} for r in report["results"]]}
+    assert len(compare(report, slower)) == len(STAGES) and compare(report, report) == []
+
+
+def test_spans_feed_metrics_trace_file_and_survive_worker_capture(tmp_path, monkeypatch):
+    import json
+    from planner import tracing
+
+    monkeypatch.setattr(tracing, "REGISTRY", tracing.MetricsRegistry())
+    monkeypatch.setenv("TRACE_FILE", str(tmp_path / "trace.jsonl"))
+
+    def worker_job():  # what _timed does in a solver process
+        with tracing.capture() as events:
+            with tracing.span("solve", engine="heuristic") as record:
+                record["attrs"]["status"] = "local_optimum"
+            tracing.inc("planner_solver_results_total", engine="heuristic", status="local_optimum")
+        return events
+
+    events = worker_job()
+    assert tracing.REGISTRY.histogram(tracing.PHASE_METRIC, phase="solve") is None  # nothing recorded yet
+    with tracing.span("http", path="/plan") as root:
+        tracing.replay(events)
+
+    assert tracing.REGISTRY.histogram(tracing.PHASE_METRIC, phase="solve").count == 1
+    assert tracing.REGISTRY.counter_value("planner_solver_results_total",
+                                          engine="heuristic", status="local_optimum") == 1
+    spans = [json.loads(line) for line in (tmp_path / "trace.jsonl").read_text().splitlines()]
+    solve = next(s for s in spans if s["name"] == "solve")
+    assert solve["parent_id"] == root["span_id"] and solve["trace_id"] == root["trace_id"]
+
+    text = tracing.REGISTRY.render([("cache_hit_ratio", "Hits / lookups.", {"cache": "plans"}, 0.5),
+                                    ("solver_in_flight", "Plans.", {}, 0),
+                                    ("cache_hit_ratio", "Hits / lookups.", {"cache": "geocode"}, 1.0)])
+    assert 'planner_phase_seconds_bucket{phase="solve",le="+Inf"} 1' in text
+    assert "# TYPE planner_solver_results_total counter" in text
+    lines = text.splitlines()
+    ratio = [i for i, line in enumerate(lines) if line.startswith("cache_hit_ratio{")]
+    assert ratio == [ratio[0], ratio[0] + 1]  # one family, samples kept together
+
+
+def test_request_profile_merges_worker_stats_and_summarises(tmp_path):
+    import pstats
+    from planner.profiling import RequestProfile, profiled, profiling_requested, request_hash
+
+    assert profiling_requested({"X-Profile": "1"}, {}) and profiling_requested({}, {"profile": "true"})
+    assert not profiling_requested({}, {})
+    assert request_hash({"a": 1, "b": [2]}) == request_hash({"b": [2], "a": 1})
+
+    dist = _random_matrix(60, seed=23)
+    profile = RequestProfile("plan", request_hash({"sights": 60}), directory=tmp_path)
+    with profile.running():
+        tour_length(dist, list(range(60)))
+        tour, raw = profiled(solve_tsp_heuristic, dist)  # as a worker process would
+    profile.add_worker_stats(raw)
+    path = profile.save()
+
+    assert path.parent == tmp_path and path.name.startswith(f"plan_{profile.key}_")
+    functions = {func for (_, _, func) in pstats.Stats(str(path)).stats}
+    assert "solve_tsp_heuristic" in functions and "tour_length" in functions
+    summary = profile.summary(top=5)
+    assert summary["worker_profiles"] == 1 and len(summary["top_cumulative"]) == 5
+    cumtimes = [row["cumtime"] for row in summary["top_cumulative"]]
+    assert cumtimes == sorted(cumtimes, reverse=True)
+
+    # An overlapping profiled request runs unprofiled instead of stealing the first one's hook
+    first, second = RequestProfile("plan", "a", tmp_path), RequestProfile("plan", "b", tmp_path)
+    with first.running():
+        with second.running():
+            tour_length(dist, list(range(60)))
+    assert first.recorded and not second.recorded
+    assert second.save() is None and second.summary()["note"] and not second.summary()["top_cumulative"]
+    with second.running():
+        pass
+    assert second.recorded and second.summary()["note"] is None
+
+
+def test_importing_the_entry_points_loads_no_heavy_dependencies():
+    from tools.benchmark_imports import ROOT, loaded_heavy_modules
+
+    sample_map = ROOT / "tourist_sights_map.html"
+    existed = sample_map.exists()
+    for module in ("planner.sights", "planner.base_planner", "planner.tour_planner_orchestrator", "api.main"):
+        assert loaded_heavy_modules(module) == [], module
+    assert sample_map.exists() == existed  # importing planner.sights no longer renders the demo map
+
+
+def test_batch_shares_one_table_matrix_only_when_it_saves_requests():
+    from api.batch import ndjson, sight_union, table_requests, worth_sharing
+
+    assert [table_requests(n, max_coords=10) for n in (0, 1, 10, 11, 20)] == [0, 1, 1, 9, 16]
+    sights = [Sight(f"S{i}", Point(2.3 + i / 100, 48.8), "museum", ["any"]) for i in range(8)]
+    guest_a, guest_b = sights[:6], sights[2:]
+    union = sight_union([guest_a, guest_b])
+    assert [s.name for s in union] == [s.name for s in sights]
+    assert worth_sharing([guest_a, guest_b], union, max_coords=10)        # 1 request instead of 2
+    assert not worth_sharing([guest_a], union, max_coords=10)
+    assert not worth_sharing([sights[:5], sights[3:]], union, max_coords=6)  # 9 blocks instead of 2
+    moved = Sight("S0", Point(13.4, 52.5), "museum", ["any"])
+    assert sight_union([guest_a, [moved]]) is None                         # same name, different sight
+    assert ndjson({"index": 0, "status": 200}) == b'{"index":0,"status":200}\n'
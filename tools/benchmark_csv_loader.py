@@ -0,0 +1,98 @@
+# tools/benchmark_csv_loader.py
+# Compares the vectorised CSV loader with the former iterrows loader on the
+# shipped data/*.csv files, scaled up by repeating the rows with jittered
+# coordinates and unique names.
+#
+#   python -m tools.benchmark_csv_loader --rows 10000 100000 1000000
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from shapely.geometry import Point
+
+from planner.data_loader import iter_sights_from_csv, load_sights_collection, load_sights_from_csv
+from planner.sights import Sight
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+
+def legacy_load_sights_from_csv(path):
+    """The iterrows loader this benchmark measures against (kept verbatim apart from the name)."""
+    df = pd.read_csv(path)
+
+    sights = []
+    for _, row in df.iterrows():
+        try:
+            name = str(row["name"]) if pd.notna(row["name"]) else "Unnamed Sight"
+            category = str(row["category"]) if pd.notna(row["category"]) else "unknown"
+            description = str(row["description"]) if pd.notna(row.get("description", "")) else ""
+            lat = row['latitude'] if 'latitude' in df.columns else row.get('lat', None)
+            lon = row['longitude'] if 'longitude' in df.columns else row.get('lon', None)
+            if lat is None or lon is None:
+                continue
+            location = Point(lon, lat)
+
+            weather = row.get("weather_suitability", "any")
+            if isinstance(weather, str):
+                weather_suitability = [w.strip() for w in weather.split(",")]
+            else:
+                weather_suitability = ["any"]
+
+            sights.append(Sight(
+                name=name,
+                category=category,
+                description=description,
+                location=location,
+                weather_suitability=weather_suitability
+            ))
+        except Exception as e:
+            print(f"⚠️ Skipping bad row: {row.to_dict()} ({e})")
+    return sights
+
+
+def scaled_csv(rows: int, out_dir: Path, seed: int = 0) -> Path:
+    """Writes a CSV with `rows` rows built from the shipped data files."""
+    base = pd.concat([pd.read_csv(p) for p in sorted(DATA_DIR.glob("*.csv"))], ignore_index=True)
+    rng = np.random.default_rng(seed)
+    df = base.iloc[np.arange(rows) % len(base)].reset_index(drop=True)
+    df["name"] = df["name"].astype(str) + " #" + df.index.astype(str)
+    df["latitude"] = df["latitude"] + rng.normal(0, 0.01, rows)
+    df["longitude"] = df["longitude"] + rng.normal(0, 0.01, rows)
+    path = out_dir / f"sights_{rows}.csv"
+    df.to_csv(path, index=False)
+    return path
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run(rows_list, legacy_max_rows: int = 200_000):
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'rows':>10} {'legacy s':>10} {'collection s':>13} {'sights s':>10} {'chunked s':>10} {'speed-up':>9}")
+        for rows in rows_list:
+            path = scaled_csv(rows, Path(tmp))
+            legacy_s = None
+            if rows <= legacy_max_rows:
+                _, legacy_s = _timed(legacy_load_sights_from_csv, path)
+            collection, collection_s = _timed(load_sights_collection, path)
+            _, sights_s = _timed(load_sights_from_csv, path)
+            chunks, chunked_s = _timed(lambda: sum(len(c) for c in iter_sights_from_csv(path)))
+            assert len(collection) == chunks == rows
+            legacy = f"{legacy_s:10.3f}" if legacy_s is not None else f"{'skipped':>10}"
+            speed_up = f"{legacy_s / collection_s:8.1f}x" if legacy_s is not None else f"{'-':>9}"
+            print(f"{rows:>10} {legacy} {collection_s:13.3f} {sights_s:10.3f} {chunked_s:10.3f} {speed_up}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the CSV sight loaders.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--legacy-max-rows", type=int, default=200_000,
+                        help="Skip the iterrows loader above this size (it takes minutes).")
+    args = parser.parse_args()
+    run(args.rows, args.legacy_max_rows)
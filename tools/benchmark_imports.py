@@ -0,0 +1,89 @@
+# tools/benchmark_imports.py
+# Cold-start cost of the entry points.
+# Every import runs in a fresh interpreter (as a uvicorn worker or a CLI call
+# would), timed from the outside and with -X importtime for the per-module
+# breakdown. Also lists which of the heavy optional stacks got loaded: none of
+# them should be needed just to start the API or the CLI.
+#
+#   python -m tools.benchmark_imports
+#   python -m tools.benchmark_imports --modules api.main --max-seconds 1.0
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_MODULES = ["planner.sights", "planner.base_planner", "api.main", "tourist_planner"]
+# Loaded on first use only (map rendering, exact solver, OSM, weather fetch, LLM narration, frontend)
+HEAVY_MODULES = ["folium", "geopandas", "osmnx", "mip", "meteostat", "pandas", "scipy",
+                 "transformers", "torch", "streamlit"]
+
+
+def _run(code: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    args = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    return subprocess.run(args, cwd=ROOT, capture_output=True, text=True, check=True)
+
+
+def loaded_heavy_modules(module: str) -> List[str]:
+    """HEAVY_MODULES that `import module` pulls in, in a fresh interpreter."""
+    code = (f"import sys, json, {module}\n"
+            f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))")
+    return json.loads(_run(code).stdout.strip().splitlines()[-1])
+
+
+def import_seconds(module: str, repeats: int = 3) -> float:
+    """Best wall time of a fresh interpreter importing module (interpreter start-up included)."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        _run(f"import {module}")
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def slowest_imports(module: str, top: int = 10) -> List[Dict]:
+    """Top modules by cumulative import time from -X importtime."""
+    rows = []
+    # Lines look like "import time:       312 |       1045 |     planner.sights"
+    for line in _run(f"import {module}", importtime=True).stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append({"module": name.strip(), "self_ms": int(self_us) / 1000,
+                     "cumulative_ms": int(cumulative_us) / 1000})
+    return sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[:top]
+
+
+def run(modules: Sequence[str] = DEFAULT_MODULES, repeats: int = 3, top: int = 10) -> List[Dict]:
+    baseline = import_seconds("sys", repeats)  # Interpreter start-up alone
+    results = []
+    for module in modules:
+        seconds = import_seconds(module, repeats)
+        heavy = loaded_heavy_modules(module)
+        results.append({"module": module, "seconds": seconds, "import_seconds": max(0.0, seconds - baseline),
+                        "heavy_modules": heavy, "slowest": slowest_imports(module, top)})
+        print(f"{module:>22} {seconds:7.3f}s ({seconds - baseline:6.3f}s imports)  heavy: {', '.join(heavy) or '-'}")
+        for row in results[-1]["slowest"][:5]:
+            print(f"{'':>24}{row['cumulative_ms']:9.1f} ms  {row['module']}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the cold import time of the entry points.")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imported modules to keep per entry point.")
+    parser.add_argument("--output", type=Path, default=None, help="Also write the results as JSON.")
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="Exit with status 1 if an entry point takes longer than this to import.")
+    args = parser.parse_args()
+
+    results = run(args.modules, args.repeats, args.top)
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2))
+    if args.max_seconds is not None and any(r["seconds"] > args.max_seconds for r in results):
+        sys.exit(1)
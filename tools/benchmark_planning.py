@@ -0,0 +1,218 @@
+# tools/benchmark_planning.py
+# Reproducible timings of the planning pipeline on synthetic cities.
+# A city is a set of clustered sights around a center with a controlled mix of
+# weather suitabilities (seeded, so every run and every commit sees the same
+# input). Each stage is timed on its own - the two planners, the distance
+# matrix, the TSP solver and the group balancing - together with the quality of
+# what it returned, and the results are written as JSON so runs of different
+# commits can be compared offline.
+#
+#   python -m tools.benchmark_planning --sizes 10 100 1000 5000
+#   python -m tools.benchmark_planning --compare benchmarks/planning_1c10b66.json
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from shapely.geometry import Point
+
+from planner.aware_tour import is_weather_suitable
+from planner.base_planner import create_weather_aware_tour
+from planner.incremental import haversine_path_length
+from planner.optimize import one_tree_lower_bound, solve_tsp, tour_length
+from planner.sights import Sight
+from planner.tour_planner_orchestrator import (balance_by_stealing, build_distance_matrix,
+                                               initial_balanced_groups, plan_citytour_iterative)
+
+RESULTS_DIR = Path("benchmarks")
+DEFAULT_SIZES = [10, 50, 200, 1000, 5000]
+CITY_CENTER = (48.8566, 2.3522)
+
+# Share of sights per main weather suitability
+WEATHER_MIXES: Dict[str, Dict[str, float]] = {
+    "balanced": {"sunny": 0.3, "cloudy": 0.2, "rainy": 0.3, "any": 0.2},
+    "outdoor": {"sunny": 0.7, "cloudy": 0.2, "rainy": 0.0, "any": 0.1},
+    "indoor": {"sunny": 0.0, "cloudy": 0.1, "rainy": 0.7, "any": 0.2},
+}
+FORECASTS: Dict[str, Dict[str, str]] = {
+    "mixed": {"morning": "sunny", "afternoon": "rainy", "evening": "cloudy"},
+    "sunny": {"morning": "sunny", "afternoon": "sunny", "evening": "sunny"},
+    "rainy": {"morning": "rainy", "afternoon": "rainy", "evening": "rainy"},
+}
+CATEGORY_BY_WEATHER = {"sunny": "park", "cloudy": "monument", "rainy": "museum", "any": "landmark"}
+
+
+def synthetic_city(n: int, weather_mix: str = "balanced", seed: int = 0,
+                   center=CITY_CENTER, clusters: int = 8, spread_km: float = 4.0) -> List[Sight]:
+    """n sights in gaussian clusters around center (lat, lon), suitabilities drawn from WEATHER_MIXES."""
+    rng = np.random.default_rng(seed)
+    shares = WEATHER_MIXES[weather_mix]
+    weathers = rng.choice(list(shares), size=n, p=np.array(list(shares.values())) / sum(shares.values()))
+    km_lat = 1 / 110.574
+    km_lon = 1 / (111.320 * np.cos(np.radians(center[0])))
+    cluster_centers = rng.normal(0, spread_km / 2, (clusters, 2))
+    offsets = cluster_centers[rng.integers(0, clusters, n)] + rng.normal(0, spread_km / 8, (n, 2))
+    lats = center[0] + offsets[:, 0] * km_lat
+    lons = center[1] + offsets[:, 1] * km_lon
+    return [Sight(name=f"Sight {i:05d}", location=Point(lon, lat), category=CATEGORY_BY_WEATHER[w],
+                  weather_suitability=[str(w)])
+            for i, (lat, lon, w) in enumerate(zip(lats, lons, weathers))]
+
+
+# --------- Benchmarked stages --------------------------------------------------
+# Each takes (sights, forecast) and returns a callable to time plus a function
+# that turns its result into quality figures.
+
+def _plan_quality(forecast):
+    def quality(tour_plan):
+        planned = [s for slot in tour_plan.values() for s in slot]
+        return {
+            "planned_sights": len(planned),
+            "path_km": haversine_path_length(tour_plan),
+            "weather_mismatches": sum(not is_weather_suitable(s, forecast.get(slot, "any"))
+                                      for slot, slot_sights in tour_plan.items() for s in slot_sights),
+        }
+    return quality
+
+
+def _stage_aware(sights, forecast):
+    return (lambda: create_weather_aware_tour(sights, forecast, CITY_CENTER)), _plan_quality(forecast)
+
+
+def _stage_iterative(sights, forecast):
+    return (lambda: plan_citytour_iterative(sights, CITY_CENTER, forecast)), _plan_quality(forecast)
+
+
+def _stage_matrix(sights, forecast):
+    return (lambda: build_distance_matrix(sights)), (lambda dist: {"entries": int(dist.size)})
+
+
+def _stage_tsp(sights, forecast):
+    dist = build_distance_matrix(sights)
+
+    def quality(tour):
+        length = tour_length(dist, tour)
+        bound = one_tree_lower_bound(dist)
+        return {"tour_km": length, "gap_to_bound": (length - bound) / length if length > 0 else 0.0}
+    return (lambda: solve_tsp(dist)), quality
+
+
+def _stage_balance(sights, forecast):
+    slot_counts = Counter(forecast.values())
+    groups = initial_balanced_groups(sights, slot_counts, CITY_CENTER)
+
+    def quality(balanced):
+        total = sum(slot_counts.values())
+        targets = {w: len(sights) * c / total for w, c in slot_counts.items()}
+        return {"max_size_deviation": max(abs(len(balanced.get(w, [])) - t) for w, t in targets.items()),
+                "unsuitable_moves": sum(not is_weather_suitable(s, w)
+                                        for w, group in balanced.items() for s in group)}
+    return (lambda: balance_by_stealing(groups, slot_counts, CITY_CENTER)), quality
+
+
+STAGES: Dict[str, Callable] = {
+    "create_weather_aware_tour": _stage_aware,
+    "plan_citytour_iterative": _stage_iterative,
+    "build_distance_matrix": _stage_matrix,
+    "solve_tsp": _stage_tsp,
+    "balance_by_stealing": _stage_balance,
+}
+
+
+def _time(fn, repeats: int):
+    """(last result, list of seconds); the planners' progress prints are discarded."""
+    seconds = []
+    result = None
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = fn()
+            seconds.append(time.perf_counter() - start)
+    return result, seconds
+
+
+def run(sizes: Sequence[int] = DEFAULT_SIZES, mixes: Sequence[str] = ("balanced",), forecast: str = "mixed",
+        stages: Optional[Sequence[str]] = None, repeats: int = 3, seed: int = 0, verbose: bool = True) -> Dict:
+    """Runs every stage on every (size, mix) city; returns the JSON-ready report."""
+    results = []
+    for weather_mix in mixes:
+        for n in sizes:
+            sights = synthetic_city(n, weather_mix, seed=seed)
+            for stage in stages or STAGES:
+                fn, quality = STAGES[stage](sights, FORECASTS[forecast])
+                result, seconds = _time(fn, repeats)
+                entry = {
+                    "stage": stage, "sights": n, "weather_mix": weather_mix, "forecast": forecast,
+                    "repeats": repeats, "seconds_min": min(seconds),
+                    "seconds_median": statistics.median(seconds), "quality": quality(result),
+                }
+                results.append(entry)
+                if verbose:
+                    print(f"{stage:>26} {n:>6} {weather_mix:>9} {entry['seconds_min']:10.4f}s  {entry['quality']}")
+    return {"meta": _meta(sizes, mixes, forecast, repeats, seed), "results": results}
+
+
+def _meta(sizes, mixes, forecast, repeats, seed) -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "unknown"
+    return {"commit": commit, "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0], "platform": platform.platform(), "numpy": np.__version__,
+            "sizes": list(sizes), "mixes": list(mixes), "forecast": forecast, "repeats": repeats, "seed": seed}
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = 1.25) -> List[Dict]:
+    """Entries of current that are slower than threshold x their baseline (same stage, size and mix)."""
+    def key(entry):
+        return entry["stage"], entry["sights"], entry["weather_mix"], entry["forecast"]
+
+    before = {key(e): e for e in baseline["results"]}
+    regressions = []
+    print(f"{'stage':>26} {'sights':>6} {'mix':>9} {'before s':>10} {'now s':>10} {'ratio':>7}")
+    for entry in current["results"]:
+        old = before.get(key(entry))
+        if old is None:
+            continue
+        ratio = entry["seconds_min"] / old["seconds_min"] if old["seconds_min"] > 0 else 1.0
+        flag = " <-- slower" if ratio > threshold else ""
+        print(f"{entry['stage']:>26} {entry['sights']:>6} {entry['weather_mix']:>9} "
+              f"{old['seconds_min']:10.4f} {entry['seconds_min']:10.4f} {ratio:6.2f}x{flag}")
+        if ratio > threshold:
+            regressions.append({**entry, "baseline_seconds_min": old["seconds_min"], "ratio": ratio})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the planning pipeline on synthetic cities.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--mixes", nargs="+", default=["balanced"], choices=sorted(WEATHER_MIXES))
+    parser.add_argument("--forecast", default="mixed", choices=sorted(FORECASTS))
+    parser.add_argument("--stages", nargs="+", default=None, choices=list(STAGES))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None,
+                        help=f"JSON file for the results (default: {RESULTS_DIR}/planning_<commit>.json).")
+    parser.add_argument("--compare", type=Path, default=None, help="Earlier results file to compare with.")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Slow-down factor reported as a regression by --compare.")
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.mixes, args.forecast, args.stages, args.repeats, args.seed)
+    output = args.output or RESULTS_DIR / f"planning_{report['meta']['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+    if args.compare is not None:
+        regressions = compare(json.loads(args.compare.read_text()), report, args.threshold)
+        sys.exit(1 if regressions else 0)
@@ -2,27 +2,19 @@ import argparse
 from datetime import date
 from typing import Optional
 
-from planner.data_loader import load_sights_from_csv, save_sights_to_csv
-from planner.osm import fetch_osm_sights
+from planner.data_loader import load_sights_collection, load_sights_from_csv, save_sights_to_csv
+from planner.geocoding import geocode
+from planner.city_bundle import BUNDLE_DIR, MAX_MATRIX_SIGHTS, build_city_bundle, bundle_path, city_slug
 from planner.get_route import plot_route_with_sights, plot_full_day_tour
 from planner.base_planner import DayPlanner
 from planner.weather import get_weather_forecast
 from planner.userquiz import quiz_add_sight, quiz_sight_modification
 from planner.display import show_cli_plan
 from planner.genai import narrate
+from planner.profiling import PROFILE_DIR, RequestProfile, print_summary, request_hash
 import unicodedata
 from pathlib import Path
-from slugify import slugify
 from shapely.geometry import Point # Import Point
-import osmnx as ox
-
-def city_slug(city: str) -> str:
-    """Convert 'Berlin, Germany' -> 'berlin'."""
-    first_part = city.split(",")[0].strip().lower()
-    # Fallback if slugify is outdated:
-    # slug = re.sub(r"[^\w]+", "_", city.lower()).strip("_")
-    # return slug
-    return slugify(first_part)
 
 def normalize(text):
     if not isinstance(text, str):
@@ -67,7 +59,7 @@ def get_city_center(city_name: str) -> Point:
         # You'll need to install osmnx (pip install osmnx) if not already
         print(f"Geocoding '{city_name}' using OpenStreetMap...")
         try:
-            lat, lon = ox.geocode(city_name)
+            lat, lon = geocode(city_name)
             CITY_CENTER_DEFAULT_COORDS[city_name] = (lat, lon) # Cache for future runs
         except Exception as e:
             print(f"Error geocoding city: {e}. Defaulting to Paris.")
@@ -78,16 +70,64 @@ def get_city_center(city_name: str) -> Point:
 DEFAULT_DATA_DIR = Path("data")
 CSV_PATH = DEFAULT_DATA_DIR / "sights.csv"
 MODES = ["walking", "cycling", "driving"]
+OSM_TAGS = {
+    "amenity": ["museum", "cafe", "restaurant"],
+    "tourism": ["attraction", "gallery", "viewpoint"]
+}
+
+def build_city_bundle_command(args):
+    """build-city-bundle: precompute a city's planning data for the API and frontend."""
+    center = get_city_center(args.city)
+    if args.use_osm:
+        from planner.osm import fetch_osm_collection  # OSMnx/geopandas only for OSM runs
+        sights = fetch_osm_collection(args.city, OSM_TAGS, refresh=args.refresh_osm)
+    else:
+        csv_path = resolve_csv_path(args.city, args.sight_file)
+        print(f"📁 Loading sights from: {csv_path}")
+        sights = load_sights_collection(csv_path)
+    if not len(sights):
+        raise SystemExit(f"No sights found for {args.city}; not writing a bundle.")
+
+    print(f"Building bundle for {args.city}: {len(sights)} sights, OSRM modes: {args.modes or 'none'}")
+    bundle = build_city_bundle(args.city, (center.y, center.x), sights, modes=args.modes,
+                               max_matrix_sights=args.max_matrix_sights, osrm_base_url=args.osrm_url)
+    path = bundle.save(Path(args.output) if args.output else bundle_path(args.city, Path(args.bundle_dir)))
+    print(f"✅ Saved {bundle} to {path}")
 
 def main():
     # Parse CLI args
-    ap = argparse.ArgumentParser(description="Tour-planner CLI")
-    ap.add_argument("--city", default="Paris, France", help="Place name for OpenStreetMap POI search")
-    ap.add_argument("--use-osm", action="store_true", help="Load sights from OpenStreetMap instead of CSV")
-    ap.add_argument("--refresh-osm", action="store_true", help="Force re-download of OSM data (ignore cache)")
-    ap.add_argument("--sight-file", default=None, help="Path to CSV file with predefined sights")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--city", default="Paris, France", help="Place name for OpenStreetMap POI search")
+    common.add_argument("--use-osm", action="store_true", help="Load sights from OpenStreetMap instead of CSV")
+    common.add_argument("--refresh-osm", action="store_true", help="Force re-download of OSM data (ignore cache)")
+    common.add_argument("--sight-file", default=None, help="Path to CSV file with predefined sights")
+    common.add_argument("--profile", action="store_true",
+                        help=f"cProfile each planning run, save it under {PROFILE_DIR}/ and print the top functions")
+    ap = argparse.ArgumentParser(description="Tour-planner CLI", parents=[common])
+    commands = ap.add_subparsers(dest="command")
+    # python tourist_planner.py build-city-bundle --city "Berlin, Germany" --modes walking cycling
+    bundle_ap = commands.add_parser("build-city-bundle", parents=[common],
+                                    help="Precompute a city's planning bundle and exit")
+    bundle_ap.add_argument("--modes", nargs="*", default=[], choices=MODES,
+                           help="Also bundle OSRM duration matrices for these modes")
+    bundle_ap.add_argument("--bundle-dir", default=str(BUNDLE_DIR), help="Directory the API and frontend load bundles from")
+    bundle_ap.add_argument("--output", default=None, help="Explicit bundle file (overrides --bundle-dir)")
+    bundle_ap.add_argument("--max-matrix-sights", type=int, default=MAX_MATRIX_SIGHTS,
+                           help="Skip the matrices for cities with more sights than this")
+    bundle_ap.add_argument("--osrm-url", default=None, help="OSRM server for the duration matrices")
     args = ap.parse_args()
 
+    if args.command == "build-city-bundle":
+        if args.profile:
+            profile = RequestProfile("bundle", request_hash({"city": args.city, "modes": args.modes}))
+            with profile.running():
+                build_city_bundle_command(args)
+            profile.save()
+            print_summary(profile.summary())
+        else:
+            build_city_bundle_command(args)
+        return
+
     CITY_CENTER_POINT = get_city_center(args.city)
     print(f"Using city center: {CITY_CENTER_POINT.x}, {CITY_CENTER_POINT.y}")
 
@@ -96,11 +136,8 @@ def main():
 
     # Load sights
     if args.use_osm:
-        TAGS = {
-            "amenity": ["museum", "cafe", "restaurant"],
-            "tourism": ["attraction", "gallery", "viewpoint"]
-        }
-        sights = fetch_osm_sights(args.city, TAGS, refresh=args.refresh_osm)
+        from planner.osm import fetch_osm_sights  # OSMnx/geopandas only for OSM runs
+        sights = fetch_osm_sights(args.city, OSM_TAGS, refresh=args.refresh_osm)
         if not sights:
             print("⚠️  No sights found via OSM, falling back to CSV.")
             sights = load_sights_from_csv(CSV_PATH)
@@ -173,7 +210,16 @@ def main():
             tour_sights = tour_sights_candidate[:10]
 
 
-            plan, weather, postcards, tour_plan = planner.plan_all(tour_sights, CITY_CENTER_POINT, mode, forecast)
+            if args.profile:
+                profile = RequestProfile("cli_plan", request_hash(
+                    {"city": args.city, "mode": mode, "sights": sorted(s.name for s in tour_sights),
+                     "forecast": forecast}))
+                with profile.running():
+                    plan, weather, postcards, tour_plan = planner.plan_all(tour_sights, CITY_CENTER_POINT, mode, forecast)
+                profile.save()
+                print_summary(profile.summary())
+            else:
+                plan, weather, postcards, tour_plan = planner.plan_all(tour_sights, CITY_CENTER_POINT, mode, forecast)
 
             slot_postcards: dict[str, str] = {}
             idx = 0